@@ -0,0 +1,3 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
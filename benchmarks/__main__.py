@@ -0,0 +1,11 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import sys
+
+from benchmarks import suite
+
+
+if __name__ == '__main__':
+    sys.exit(suite.main())
@@ -0,0 +1,42 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+"""Compares two benchmark reports:
+
+    python -m benchmarks.compare old.json new.json
+"""
+
+import json
+import sys
+
+from benchmarks import suite
+
+
+def _load(file_path):
+    with open(file_path) as f:
+        report = json.load(f)
+    return report, {(result['name'], suite.format_params(result['params'])):
+                    result for result in report['results']}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        sys.stderr.write('usage: python -m benchmarks.compare OLD NEW\n')
+        return 2
+    (old_report, old), (new_report, new) = _load(argv[0]), _load(argv[1])
+    print('old: {0}\nnew: {1}\n'.format(old_report.get('commit'),
+                                        new_report.get('commit')))
+    print('{0:<10} {1:<40} {2:>12} {3:>12} {4:>8}'.format(
+        'benchmark', 'params', 'old', 'new', 'change'))
+    for key in sorted(set(old) & set(new)):
+        old_rate, new_rate = old[key]['rate'], new[key]['rate']
+        print('{0:<10} {1:<40} {2:>12.2f} {3:>12.2f} {4:>+7.1f}% {5}'.format(
+            key[0], key[1], old_rate, new_rate,
+            (new_rate / old_rate - 1) * 100, new[key]['unit']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
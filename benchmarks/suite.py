@@ -0,0 +1,366 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+"""Benchmarks of dropme commands against a local fake Dropbox API server.
+
+Run from the repository root:
+
+    python -m benchmarks --output results.json
+
+and compare results of two runs (e.g. of two commits) with:
+
+    python -m benchmarks.compare old.json new.json
+"""
+
+import argparse
+import collections
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from dropme import app
+from dropme import client
+from dropme import daemon
+from tests.functional.fake_dropbox import FakeDropbox
+
+
+MEGABYTE = 1024 * 1024
+
+# Runs dropme the way its console script does, including the lookup of
+# a running daemon.
+STARTUP_SCRIPT = ('import sys; from dropme.daemon import main; '
+                  'sys.exit(main())')
+
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(func):
+    """Registers a benchmark function."""
+
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+class Runner(object):
+    """Runs dropme commands against a fresh fake Dropbox server."""
+
+    def __init__(self, options):
+        self.options = options
+        self.results = []
+        self.workdir = None
+        self.server = None
+
+    @contextlib.contextmanager
+    def fake_dropbox(self):
+        self.workdir = tempfile.mkdtemp(prefix='dropme-benchmark-')
+        storage_path = os.path.join(self.workdir, 'server')
+        os.mkdir(storage_path)
+        client.reset()
+        try:
+            with FakeDropbox(storage_path) as server, \
+                    mock.patch.dict(os.environ,
+                                    {'XDG_CACHE_HOME': self.workdir}), \
+                    mock.patch('dropme.client.get_client',
+                               return_value=server.get_client()):
+                server.latency = self.options.latency / 1000.0
+                server.page_size = self.options.page_size
+                self.server = server
+                yield server
+        finally:
+            client.reset()
+            shutil.rmtree(self.workdir)
+            self.workdir = self.server = None
+
+    def path(self, *parts):
+        return os.path.join(self.workdir, *parts)
+
+    @staticmethod
+    def run_command(command):
+        """Runs a dropme command and returns its duration in seconds."""
+
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()):
+            started = time.perf_counter()
+            exit_code = app.main(shlex.split(command))
+            elapsed = time.perf_counter() - started
+        if exit_code:
+            raise RuntimeError("'dropme {0}' failed.".format(command))
+        return elapsed
+
+    @staticmethod
+    def run_process(command):
+        """Runs dropme in a new interpreter and returns its duration."""
+
+        argv = [sys.executable, '-c', STARTUP_SCRIPT] + shlex.split(command)
+        # The daemon is looked up in the fresh cache directory, where none
+        # is running, so every run pays for the failed lookup.
+        env = dict(os.environ)
+        env.pop(daemon.DISABLE_ENV, None)
+        env.pop('XDG_RUNTIME_DIR', None)
+        started = time.perf_counter()
+        exit_code = subprocess.call(argv, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL, env=env)
+        elapsed = time.perf_counter() - started
+        if exit_code:
+            raise RuntimeError("'dropme {0}' failed.".format(command))
+        return elapsed
+
+    def measure(self, name, command, amount, unit, setup=None,
+                run=None, **params):
+        """Runs a command several times and records the best rate.
+
+        :param name: name of the measurement
+        :param command: dropme command line
+        :param amount: amount of work done by the command, e.g. megabytes
+        :param unit: unit of the rate, e.g. 'MB/s'
+        :param setup: function called before every run
+        :param run: function running the command and returning its
+                    duration, defaults to run_command()
+        :param params: parameters of the measurement
+        """
+
+        run = run or self.run_command
+        timings = []
+        for _ in range(self.options.repeat):
+            if setup is not None:
+                setup()
+            timings.append(run(command))
+        result = {'name': name, 'params': params, 'unit': unit,
+                  'rate': amount / min(timings),
+                  'seconds': {'min': min(timings),
+                              'median': statistics.median(timings)}}
+        self.results.append(result)
+        print('{0:<10} {1:<40} {2:>12.2f} {3}'.format(
+            name, format_params(params), result['rate'], unit),
+            file=sys.stderr)
+
+
+def format_params(params):
+    return ' '.join('{0}={1}'.format(key, value)
+                    for key, value in sorted(params.items()))
+
+
+def write_random_file(path, size):
+    with open(path, 'wb') as f:
+        for _ in range(size // MEGABYTE):
+            f.write(os.urandom(MEGABYTE))
+        f.write(os.urandom(size % MEGABYTE))
+
+
+@benchmark
+def put(runner):
+    """Upload throughput of a large file."""
+
+    options = runner.options
+    src = runner.path('large.bin')
+    write_random_file(src, options.file_size * MEGABYTE)
+    for chunk_size in options.chunk_sizes:
+        for workers in sorted({1, options.workers}):
+            if workers > 1 and chunk_size % 4:
+                # Concurrent upload sessions need 4 MB aligned chunks.
+                continue
+            runner.measure(
+                'put', 'put {0} /large.bin --chunk-size {1} --parallel {2}'
+                ''.format(src, chunk_size, workers),
+                options.file_size, 'MB/s',
+                setup=lambda: runner.server.entries.pop('/large.bin', None),
+                chunk_size=chunk_size, parallel=workers)
+
+
+@benchmark
+def get(runner):
+    """Download throughput of a large file."""
+
+    options = runner.options
+    content = os.urandom(options.file_size * MEGABYTE)
+    runner.server.put_file('/large.bin', content)
+    dst = runner.path('large.bin')
+    runner.measure('get', 'get /large.bin {0}'.format(dst),
+                   options.file_size, 'MB/s', parallel=1)
+    if options.workers > 1:
+        for chunk_size in options.chunk_sizes:
+            runner.measure(
+                'get', 'get /large.bin {0} --chunk-size {1} --parallel {2}'
+                ''.format(dst, chunk_size, options.workers),
+                options.file_size, 'MB/s', chunk_size=chunk_size,
+                parallel=options.workers)
+
+
+@benchmark
+def put_small(runner):
+    """Uploads of many small files per second."""
+
+    options = runner.options
+    src = runner.path('small')
+    os.mkdir(src)
+    for i in range(options.small_files):
+        with open(os.path.join(src, 'file{0}.txt'.format(i)), 'wb') as f:
+            f.write(os.urandom(1024))
+
+    def remove_uploaded():
+        for path in [path for path in runner.server.entries
+                     if path.startswith('/small')]:
+            del runner.server.entries[path]
+
+    runner.measure('put_small', 'put {0} / --parallel {1}'.format(
+        src, options.workers), options.small_files, 'files/s',
+        setup=remove_uploaded, files=options.small_files,
+        parallel=options.workers)
+
+
+def _add_entries(runner, count):
+    for i in range(count):
+        runner.server.add_file_metadata('/big/file-{0:06d}.txt'.format(i))
+
+
+@benchmark
+def ls(runner):
+    """Listing rate of a large folder."""
+
+    options = runner.options
+    _add_entries(runner, options.entries)
+    runner.measure('ls', 'ls /big -f value', options.entries, 'entries/s',
+                   entries=options.entries,
+                   page_size=runner.server.page_size)
+
+
+@benchmark
+def find(runner):
+    """Search queries per second in a large folder."""
+
+    options = runner.options
+    _add_entries(runner, options.entries)
+    runner.measure('find', "find /big file-0999 -f value", 1, 'queries/s',
+                   entries=options.entries)
+
+
+@benchmark
+def startup(runner):
+    """Runs per second of commands which do not call the API."""
+
+    for command in ('--version', '--help', 'help whoami'):
+        runner.measure('startup', command, 1, 'runs/s',
+                       run=runner.run_process, args=command)
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmarks of dropme commands against a local fake '
+                    'Dropbox API server.')
+    parser.add_argument(
+        'benchmarks',
+        nargs='*',
+        metavar='BENCHMARK',
+        help='Benchmarks to run: {0}. Defaults to all.'.format(
+            ', '.join(BENCHMARKS))
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='The path of a JSON file to write results to.'
+    )
+    parser.add_argument(
+        '--file-size',
+        type=int,
+        default=64,
+        help='Size of a large file in megabytes. Defaults to 64.'
+    )
+    parser.add_argument(
+        '--chunk-sizes',
+        type=_int_list,
+        default=[4, 8, 16],
+        help='Comma separated chunk sizes in megabytes. '
+             'Defaults to 4,8,16.'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Number of concurrent transfers. Defaults to 4.'
+    )
+    parser.add_argument(
+        '--small-files',
+        type=int,
+        default=1000,
+        help='Number of small files to upload. Defaults to 1000.'
+    )
+    parser.add_argument(
+        '--entries',
+        type=int,
+        default=10 ** 5,
+        help='Number of entries of a listed folder. Defaults to 100000.'
+    )
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        default=2000,
+        help='Number of entries in a page of a folder listing returned by '
+             'the server. Defaults to 2000.'
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0,
+        help='Latency of every request in milliseconds. Defaults to 0.'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='Number of runs of every measurement, the best one is '
+             'reported. Defaults to 3.'
+    )
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    options = parser.parse_args(argv)
+    unknown = set(options.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {0}'.format(
+            ', '.join(sorted(unknown))))
+    runner = Runner(options)
+    started = datetime.datetime.utcnow()
+    for name in options.benchmarks or BENCHMARKS:
+        with runner.fake_dropbox():
+            BENCHMARKS[name](runner)
+    report = {
+        'commit': get_commit(),
+        'started': started.isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': vars(options),
+        'results': runner.results,
+    }
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    return 0
@@ -2,17 +2,59 @@
 #    Copyright 2017 Vitalii Kulanov
 #
 
+import argparse
 import logging
-import pkg_resources
 import sys
 
 from cliff import app
 from cliff.commandmanager import CommandManager
 
+from .common import tracing
+from .common import utils
+
 
 LOG = logging.getLogger(__name__)
 
 
+def get_version():
+    """Returns version of the installed dropme distribution."""
+
+    try:
+        from importlib import metadata
+    except ImportError:  # Python < 3.8
+        import pkg_resources
+        return pkg_resources.get_distribution('dropme').version
+    return metadata.version('dropme')
+
+
+class _VersionAction(argparse.Action):
+    """Prints the version, which is looked up only when requested."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        sys.stdout.write('{0} {1}\n'.format(parser.prog, get_version()))
+        parser.exit()
+
+
+class DropmeCommandManager(CommandManager):
+    """Discovers commands with importlib.metadata instead of pkg_resources.
+    """
+
+    def load_commands(self, namespace):
+        try:
+            from importlib import metadata
+        except ImportError:  # Python < 3.8
+            return super(DropmeCommandManager, self).load_commands(namespace)
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, 'select'):
+            entry_points = entry_points.select(group=namespace)
+        else:
+            entry_points = entry_points.get(namespace, [])
+        for ep in entry_points:
+            cmd_name = (ep.name.replace('_', ' ')
+                        if self.convert_underscores else ep.name)
+            self.commands[cmd_name] = ep
+
+
 class DropboxClient(app.App):
     """Main cliff application class.
 
@@ -22,29 +64,80 @@ class DropboxClient(app.App):
     def __init__(self):
         super(DropboxClient, self).__init__(
             description='CLI tool for managing Dropbox environment.',
-            version=pkg_resources.require('dropme')[0].version,
-            command_manager=CommandManager('dropme', convert_underscores=True),
+            version=None,
+            command_manager=DropmeCommandManager('dropme',
+                                                 convert_underscores=True),
             deferred_help=True
             )
 
     def build_option_parser(self, description, version, argparse_kwargs=None):
+        argparse_kwargs = dict(argparse_kwargs or {},
+                               conflict_handler='resolve')
         option_parser = super(DropboxClient, self).build_option_parser(
             description, version, argparse_kwargs=argparse_kwargs)
+        # Replaces --version of cliff, which needs the version in advance.
+        option_parser.add_argument(
+            '--version',
+            action=_VersionAction,
+            nargs=0,
+            help="Show program's version number and exit."
+        )
         option_parser.add_argument(
             '-t', '--token',
             help='Dropbox access token.'
         )
+        option_parser.add_argument(
+            '--timing',
+            action='store_true',
+            help='Print time spent on API requests and file I/O to stderr.'
+        )
+        option_parser.add_argument(
+            '--trace',
+            metavar='FILE',
+            help='Write API requests and file I/O steps to a file as JSON '
+                 'lines in the Trace Event format.'
+        )
         return option_parser
 
     def run(self, argv):
         return super(DropboxClient, self).run(argv)
 
+    def prepare_to_run_command(self, cmd):
+        if self.options.timing or self.options.trace:
+            tracing.enable(self.options.trace)
+
+    def clean_up(self, cmd, result, err):
+        tracer = tracing.disable()
+        if tracer is not None and self.options.timing:
+            self.stderr.write(format_timing(tracer))
+
     def configure_logging(self):
         super(DropboxClient, self).configure_logging()
         root_logger = logging.getLogger('')
         root_logger.setLevel(logging.WARNING)
 
 
+def format_timing(tracer):
+    """Returns a table of statistics of spans recorded by a tracer."""
+
+    import prettytable
+
+    table = prettytable.PrettyTable(
+        ['operation', 'count', 'bytes', 'total, s', 'p50, ms', 'p95, ms',
+         'p99, ms', 'retries', 'errors'])
+    table.align = 'r'
+    table.align['operation'] = 'l'
+    for row in tracer.get_summary():
+        table.add_row([row['name'], row['count'],
+                       utils.convert_size(row['bytes']),
+                       '{0:.3f}'.format(row['total']),
+                       '{0:.1f}'.format(row['p50'] * 1000),
+                       '{0:.1f}'.format(row['p95'] * 1000),
+                       '{0:.1f}'.format(row['p99'] * 1000),
+                       row['retries'], row['errors']])
+    return '{0}\nElapsed: {1:.3f} s\n'.format(table, tracer.elapsed)
+
+
 def main(argv=sys.argv[1:]):
     dropboxclient_app = DropboxClient()
     return dropboxclient_app.run(argv)
@@ -3,20 +3,231 @@
 #
 
 import os
+import threading
+import time
 
 import dropbox
 
 from . import error
+from .common import throttle
+from .common import tracing
 from .common import utils
 
 
+# Default size of the connection pool shared by all clients, it should
+# not be less than the number of concurrent transfers.
+DEFAULT_MAX_CONNECTIONS = 16
+
+_lock = threading.Lock()
+_clients = {}
+_session = None
+_settings = None
+_throttle = None
+_metadata_ttl = None
+
+
+class Client(dropbox.Dropbox):
+    """Dropbox client with a process-wide retry and throttling layer.
+
+    Retries of the SDK itself are disabled, all requests go through a
+    throttle.Throttle object shared by all clients of the process.
+
+    Optionally results of 'files/get_metadata' are cached for a given
+    time. Any request which may change files drops the whole cache.
+    """
+
+    # Routes which never change files, so they keep cached metadata.
+    READ_ONLY_ROUTES = frozenset([
+        'files/download',
+        'files/get_metadata',
+        'files/get_temporary_link',
+        'files/list_folder',
+        'files/list_folder/continue',
+        'files/list_folder/get_latest_cursor',
+        'files/list_folder/longpoll',
+        'files/list_revisions',
+        'files/search',
+        'users/get_current_account',
+        'users/get_space_usage',
+    ])
+    # Maximum number of cached metadata entries.
+    METADATA_CACHE_SIZE = 10000
+
+    def __init__(self, token, throttle=None, metadata_ttl=None, **kwargs):
+        """
+        :param token: Dropbox access token
+        :param throttle: throttle.Throttle object, the shared one is used
+                         by default
+        :param metadata_ttl: time in seconds file metadata is cached for,
+                             None disables the cache
+        """
+
+        kwargs.setdefault('max_retries_on_error', 0)
+        kwargs.setdefault('max_retries_on_rate_limit', 0)
+        super(Client, self).__init__(token, **kwargs)
+        self.throttle = throttle or get_throttle()
+        self.metadata_ttl = metadata_ttl
+        self._metadata = {}
+        self._metadata_lock = threading.Lock()
+
+    def _request(self, route, namespace, *args, **kwargs):
+        name = '{0}/{1}'.format(namespace, route.name)
+        if route.version > 1:
+            name += '_v{0}'.format(route.version)
+        request_binary = args[1] if len(args) > 1 else None
+        with tracing.span(name, len(request_binary) if isinstance(
+                request_binary, (bytes, bytearray, memoryview)) else 0):
+            return self.throttle.call(super(Client, self).request,
+                                      route, namespace, *args, **kwargs)
+
+    def _clear_metadata(self):
+        with self._metadata_lock:
+            self._metadata.clear()
+
+    def _get_metadata(self, route, namespace, request_arg, *args, **kwargs):
+        key = repr(request_arg)
+        with self._metadata_lock:
+            expires, result = self._metadata.get(key, (0, None))
+        if expires > time.monotonic():
+            return result
+        result = self._request(route, namespace, request_arg,
+                               *args, **kwargs)
+        with self._metadata_lock:
+            if len(self._metadata) >= self.METADATA_CACHE_SIZE:
+                self._metadata.clear()
+            self._metadata[key] = (time.monotonic() + self.metadata_ttl,
+                                   result)
+        return result
+
+    def request(self, route, namespace, *args, **kwargs):
+        if not self.metadata_ttl:
+            return self._request(route, namespace, *args, **kwargs)
+        route_name = '{0}/{1}'.format(namespace, route.name)
+        if route_name == 'files/get_metadata':
+            return self._get_metadata(route, namespace, *args, **kwargs)
+        if route_name in self.READ_ONLY_ROUTES:
+            return self._request(route, namespace, *args, **kwargs)
+        # Metadata fetched while the request is in progress may be stale
+        # too, so the cache is dropped both before and after it.
+        self._clear_metadata()
+        try:
+            return self._request(route, namespace, *args, **kwargs)
+        finally:
+            self._clear_metadata()
+
+
+def _load_settings():
+    """Reads settings once per process."""
+
+    global _settings
+    if _settings is None:
+        _settings = get_settings()
+    return _settings
+
+
+def _get_optional_settings():
+    try:
+        return _load_settings()
+    except error.ClientException:
+        return {}
+
+
+def get_session():
+    """Returns the HTTP session shared by all clients of the process.
+
+    The size of the connection pool and keep-alive are configured with
+    'max_connections' and 'keep_alive' settings. Connections are reused
+    between requests, so TLS handshake is paid for only once per
+    connection.
+    """
+
+    global _session
+    with _lock:
+        if _session is None:
+            settings = _get_optional_settings()
+            session = dropbox.create_session(max_connections=settings.get(
+                'max_connections', DEFAULT_MAX_CONNECTIONS))
+            if not settings.get('keep_alive', True):
+                session.headers['Connection'] = 'close'
+            _session = session
+    return _session
+
+
+def get_throttle():
+    """Returns the retry and throttling layer shared by all clients.
+
+    It is configured with 'max_retries', 'max_connections' and
+    'requests_per_second' settings.
+    """
+
+    global _throttle
+    with _lock:
+        if _throttle is None:
+            settings = _get_optional_settings()
+            _throttle = throttle.Throttle(
+                max_retries=settings.get('max_retries', 5),
+                max_concurrency=settings.get('max_connections',
+                                             DEFAULT_MAX_CONNECTIONS),
+                requests_per_second=settings.get('requests_per_second'))
+    return _throttle
+
+
 def get_client(token=None):
+    """Returns a Dropbox client for a token.
+
+    Clients are cached per token and share a single HTTP session, so it
+    is cheap to call the function many times and the client is safe to
+    be used from worker threads.
+
+    :param token: Dropbox access token, if not specified then it is taken
+                  from DBX_AUTH_TOKEN environment variable or settings
+    """
+
     token = (token or
              os.environ.get('DBX_AUTH_TOKEN') or
-             get_settings().get('token'))
+             _load_settings().get('token'))
     if not token:
         raise ValueError("Token not found.")
-    return dropbox.Dropbox(token)
+    session = get_session()
+    # Taken before the lock, get_throttle() acquires it as well.
+    shared_throttle = get_throttle()
+    with _lock:
+        if token not in _clients:
+            _clients[token] = Client(token, throttle=shared_throttle,
+                                     session=session,
+                                     metadata_ttl=_metadata_ttl)
+        return _clients[token]
+
+
+def set_metadata_ttl(seconds):
+    """Enables caching of file metadata by clients of the process.
+
+    It pays off in long running processes, e.g. the daemon, where the
+    same files are looked up by many commands.
+
+    :param seconds: time metadata is cached for, None disables the cache
+    """
+
+    global _metadata_ttl
+    with _lock:
+        _metadata_ttl = seconds
+        for dbx in _clients.values():
+            dbx.metadata_ttl = seconds
+            dbx._clear_metadata()
+
+
+def reset():
+    """Drops cached settings, clients, the HTTP session and throttle."""
+
+    global _metadata_ttl, _session, _settings, _throttle
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _clients.clear()
+        _metadata_ttl = None
+        _session = None
+        _settings = None
+        _throttle = None
 
 
 def get_settings(file_path=None):
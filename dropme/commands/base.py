@@ -3,13 +3,19 @@
 #
 
 import abc
+import threading
+import time
 
 from cliff import command
 from cliff import lister
 from cliff import show
-from dropbox import files
 
-from .. import client
+from .. import error
+from ..common import fileio
+from ..common import utils
+
+exceptions = utils.lazy_import('dropbox.exceptions')
+files = utils.lazy_import('dropbox.files')
 
 
 class BaseCommand(command.Command):
@@ -17,8 +23,42 @@ class BaseCommand(command.Command):
 
     def __init__(self, *args, **kwargs):
         super(BaseCommand, self).__init__(*args, **kwargs)
-        token = self.app.options.token if self.app else None
-        self.client = client.get_client(token=token)
+        self._client = None
+        self._hash_cache = None
+        self._hash_cache_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Dropbox client, it is created on first use."""
+        if self._client is None:
+            # Imported here as it loads the whole Dropbox SDK.
+            from .. import client
+            token = self.app.options.token if self.app else None
+            self._client = client.get_client(token=token)
+        return self._client
+
+    @property
+    def hash_cache(self):
+        """Local hash cache, it is created on first use.
+
+        It may be first used by worker threads of a transfer, so only one
+        of them creates it.
+        """
+        with self._hash_cache_lock:
+            if self._hash_cache is None:
+                # Imported here as the cache is needed by a few commands.
+                from ..common import hashing
+                self._hash_cache = hashing.HashCache()
+            return self._hash_cache
+
+    def run(self, parsed_args):
+        try:
+            return super(BaseCommand, self).run(parsed_args)
+        finally:
+            with self._hash_cache_lock:
+                if self._hash_cache is not None:
+                    self._hash_cache.close()
+                    self._hash_cache = None
 
     @property
     def stdout(self):
@@ -66,3 +106,182 @@ class FileFolderMixIn(object):
     @staticmethod
     def is_folder(metadata):
         return isinstance(metadata, files.FolderMetadata)
+
+
+class UploadMixIn(object):
+    """MixIn class for commands uploading local files."""
+
+    _journal = None
+
+    @property
+    def journal(self):
+        """Upload journal, it is created on first use."""
+        if self._journal is None:
+            # Imported here as the journal is needed by uploads only.
+            from ..common import journal
+            self._journal = journal.UploadJournal()
+        return self._journal
+
+    @staticmethod
+    def _get_upload_error_reason(err):
+        if hasattr(err, 'is_path') and err.is_path():
+            return getattr(err.get_path(), 'reason', err.get_path())
+        return err
+
+    @staticmethod
+    def _get_session_lookup_error(err):
+        """Returns UploadSessionLookupError of an upload session call."""
+        if isinstance(err, files.UploadSessionFinishError):
+            return err.get_lookup_failed() if err.is_lookup_failed() else None
+        if isinstance(err, (files.UploadSessionLookupError,
+                            files.UploadSessionAppendError)):
+            return err
+        return None
+
+    def _upload_session(self, chunks, file_src, file_dst, commit, resume,
+                        callback=None, sizer=None):
+        """Uploads a file through a sequential upload session.
+
+        Chunks are taken from a ReadAhead of the file, so the next chunks
+        are read while the current one is being sent. The session ID and
+        the offset accepted by Dropbox are recorded in the upload journal
+        after every request. If resume is set, the upload continues from
+        the last offset recorded for the file. If a ChunkSizer is given,
+        the size of the next chunks is adapted after every append.
+        """
+        reader = chunks.reader
+        file_size = reader.size
+        entry = self.journal.get(file_src, file_dst) if resume else None
+        if entry is not None:
+            cursor = files.UploadSessionCursor(
+                session_id=entry['session_id'], offset=entry['offset'])
+        else:
+            data = chunks.read(0)
+            session_start = self.client.files_upload_session_start(data)
+            reader.release(0, len(data))
+            cursor = files.UploadSessionCursor(
+                session_id=session_start.session_id, offset=len(data))
+            self.journal.update(file_src, file_dst, cursor.session_id,
+                                cursor.offset)
+        while True:
+            if callback is not None:
+                callback(cursor.offset)
+            data = chunks.read(cursor.offset)
+            started = time.monotonic()
+            try:
+                if cursor.offset + len(data) >= file_size:
+                    response = self.client.files_upload_session_finish(
+                        data, cursor, commit)
+                    break
+                self.client.files_upload_session_append_v2(data, cursor)
+            except exceptions.ApiError as exc:
+                lookup_error = self._get_session_lookup_error(exc.error)
+                if lookup_error is None:
+                    raise
+                if lookup_error.is_incorrect_offset():
+                    offset = lookup_error.get_incorrect_offset().correct_offset
+                    if offset == cursor.offset:
+                        raise
+                    cursor.offset = offset
+                elif entry is not None and lookup_error.is_not_found():
+                    # Resumed session has expired, start over again.
+                    entry = None
+                    data = chunks.read(0)
+                    session_start = self.client.files_upload_session_start(
+                        data)
+                    cursor = files.UploadSessionCursor(
+                        session_id=session_start.session_id, offset=len(data))
+                else:
+                    raise
+            else:
+                reader.release(cursor.offset, len(data))
+                cursor.offset += len(data)
+                if sizer is not None:
+                    chunks.chunk_size = sizer.observe(
+                        len(data), time.monotonic() - started)
+            self.journal.update(file_src, file_dst, cursor.session_id,
+                                cursor.offset)
+        self.journal.remove(file_src, file_dst)
+        if callback is not None:
+            callback(file_size)
+        return response
+
+    def upload_local_file(self, file_src, file_dst, chunk_size, mode=None,
+                          autorename=False, resume=False,
+                          read_ahead=fileio.ReadAhead.DEPTH, sizer=None,
+                          callback=None):
+        """Uploads a local file in a single request or an upload session.
+
+        :param file_src: path to the local file
+        :param file_dst: destination path in Dropbox
+        :param chunk_size: size of a single chunk in bytes, smaller files
+                           are uploaded in a single request
+        :param mode: dropbox.files.WriteMode, defaults to the API default
+        :param autorename: whether to rename the file on conflict
+        :param resume: whether to continue an interrupted upload session
+        :param read_ahead: number of chunks read ahead of the sent one
+        :param sizer: ChunkSizer adapting the size of chunks
+        :param callback: function called with the number of bytes sent
+        :return: metadata of the uploaded file
+        :raises: dropbox.exceptions.ApiError, OSError
+        """
+
+        options = {'autorename': autorename}
+        if mode is not None:
+            options['mode'] = mode
+        with fileio.ChunkReader(file_src) as reader:
+            if reader.size <= chunk_size:
+                return self.client.files_upload(reader.read(0), file_dst,
+                                                **options)
+            with fileio.ReadAhead(reader, chunk_size, read_ahead) as chunks:
+                return self._upload_session(
+                    chunks, file_src, file_dst,
+                    files.CommitInfo(path=file_dst, **options), resume,
+                    callback, sizer)
+
+
+class BatchJobMixIn(object):
+    """MixIn class for actions performed with batch API calls."""
+
+    # Maximum number of entries in a single batch request.
+    BATCH_SIZE = 1000
+    # Interval in seconds between checks of running batch jobs.
+    BATCH_POLL_INTERVAL = 1
+
+    def run_batch_jobs(self, launch, check, entries):
+        """Performs an action on entries in batches and awaits results.
+
+        All batches are launched first, then async jobs are polled
+        together until every job is complete.
+
+        :param launch: function that starts a batch job for a list of
+                       entries and returns a launch result
+        :param check:  function that returns status of an async job by ID
+        :param entries: list of entries to pass to launch
+        :return: generator of (entry, result entry) tuples
+        :raises: error.ActionException if a batch job failed
+        """
+
+        jobs = []
+        for i in range(0, len(entries), self.BATCH_SIZE):
+            batch = entries[i:i + self.BATCH_SIZE]
+            response = launch(batch)
+            if response.is_complete():
+                yield from zip(batch, response.get_complete().entries)
+            else:
+                jobs.append((response.get_async_job_id(), batch))
+        while jobs:
+            time.sleep(self.BATCH_POLL_INTERVAL)
+            in_progress = []
+            for async_job_id, batch in jobs:
+                status = check(async_job_id)
+                if status.is_complete():
+                    yield from zip(batch, status.get_complete().entries)
+                elif status.is_in_progress():
+                    in_progress.append((async_job_id, batch))
+                else:
+                    raise error.ActionException(
+                        "Batch job '{0}' failed: {1}.".format(
+                            async_job_id, status.get_failed()
+                            if hasattr(status, 'get_failed') else status))
+            jobs = in_progress
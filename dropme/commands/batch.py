@@ -0,0 +1,271 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import shlex
+
+from . import base
+from .. import error
+from ..common import utils
+
+exceptions = utils.lazy_import('dropbox.exceptions')
+files = utils.lazy_import('dropbox.files')
+
+
+class _LineApp(object):
+    """Proxy of the application capturing the output of a single line."""
+
+    def __init__(self, app):
+        self._app = app
+        self.stdout = io.StringIO()
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+
+class _Line(object):
+    """A line of a batch script and the outcome of its command."""
+
+    def __init__(self, number, text):
+        self.number = number
+        self.text = text
+        self.app = None
+        self.command = None
+        self.cmd_name = None
+        self.parsed_args = None
+        self.status = 0
+        self.errors = []
+
+    def fail(self, status, message):
+        self.status = max(self.status, status)
+        self.errors.append(message)
+
+    def get_report(self):
+        return {'line': self.number,
+                'command': self.text,
+                'status': self.status,
+                'output': self.app.stdout.getvalue() if self.app else '',
+                'error': '\n'.join(self.errors) or None}
+
+
+class Batch(base.BaseCommand, base.BatchJobMixIn):
+    """
+    Runs dropme commands from a file, one per line, in a single process.
+
+    Adjacent 'mkdir', 'rm', 'cp' and 'mv' lines are combined into batch
+    requests and adjacent lines of any other command run concurrently,
+    unless a line refers to a Dropbox path which is the same as, inside
+    of or contains a path of a previous line of the group; such a line
+    starts a new group, so it runs after the lines it may depend on.
+    The outcome of every line is printed as a JSON object per line with
+    'line', 'command', 'status' (0 on success, 1 on failure, 2 on invalid
+    command), 'output' and 'error' keys.
+    """
+
+    # Commands whose adjacent lines are combined into batch requests.
+    BATCH_COMMANDS = ('cp', 'mkdir', 'mv', 'rm')
+    # Commands which cannot be run from a batch script.
+    FORBIDDEN_COMMANDS = ('batch', 'daemon')
+
+    def get_parser(self, prog_name):
+        parser = super(Batch, self).get_parser(prog_name)
+        parser.add_argument(
+            'file',
+            help="Path of a file with dropme commands, one per line. Use "
+                 "'-' to read commands from stdin. Empty lines and lines "
+                 "starting with '#' are skipped."
+        )
+        parser.add_argument(
+            '-p', '--parallel',
+            type=int,
+            default=4,
+            help='Number of adjacent lines run concurrently. Defaults to 4.'
+        )
+        return parser
+
+    def _read_lines(self, path):
+        with contextlib.ExitStack() as stack:
+            if path == '-':
+                stream = self.app.stdin
+            else:
+                stream = stack.enter_context(open(path))
+            for number, text in enumerate(stream, 1):
+                text = text.strip()
+                if text and not text.startswith('#'):
+                    yield _Line(number, text)
+
+    def _prepare(self, line):
+        """Finds the command of a line and parses its arguments."""
+
+        try:
+            cmd_factory, cmd_name, sub_argv = (
+                self.app.command_manager.find_command(shlex.split(line.text)))
+        except ValueError as exc:
+            line.fail(2, str(exc))
+            return
+        if cmd_name in self.FORBIDDEN_COMMANDS:
+            line.fail(2, "'{0}' cannot be run in a batch.".format(cmd_name))
+            return
+        line.app = _LineApp(self.app)
+        line.cmd_name = cmd_name
+        line.command = cmd_factory(line.app, self.app_args, cmd_name=cmd_name)
+        parser = line.command.get_parser(cmd_name)
+        usage = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(usage):
+                line.parsed_args = parser.parse_args(sub_argv)
+        except SystemExit:
+            line.fail(2, usage.getvalue().strip())
+
+    @classmethod
+    def _get_group_key(cls, line):
+        if line.status:
+            return 'invalid', line.number
+        args = line.parsed_args
+        if line.cmd_name not in cls.BATCH_COMMANDS or getattr(
+                args, 'allow_shared_folder', False):
+            return 'run', line.cmd_name
+        return ('batch', line.cmd_name,
+                getattr(args, 'auto_rename', False),
+                getattr(args, 'allow_ownership_transfer', False))
+
+    @staticmethod
+    def _get_paths(line):
+        """Returns lower-case Dropbox paths a line refers to."""
+
+        paths = []
+        for name in ('path', 'from_path', 'to_path'):
+            value = getattr(line.parsed_args, name, None)
+            for path in value if isinstance(value, list) else [value]:
+                if isinstance(path, str):
+                    paths.append(
+                        utils.normalize_path(path).rstrip('/').lower())
+        return paths
+
+    @staticmethod
+    def _get_parents(path):
+        while path:
+            path = path.rsplit('/', 1)[0]
+            yield path
+
+    def _iter_groups(self, lines):
+        """Splits lines into groups of adjacent lines run together.
+
+        A line starts a new group if its group key differs from that of
+        the previous line or if one of its paths equals, contains or is
+        inside of a path of a line of the current group.
+
+        :return: generator of (group key, list of lines) tuples
+        """
+
+        key, group = None, []
+        paths, parents = set(), set()
+        for line in lines:
+            line_key = self._get_group_key(line)
+            line_paths = self._get_paths(line) if not line.status else []
+            if group and (line_key != key or any(
+                    path in paths or path in parents or
+                    not paths.isdisjoint(self._get_parents(path))
+                    for path in line_paths)):
+                yield key, group
+                group = []
+                paths, parents = set(), set()
+            key = line_key
+            group.append(line)
+            for path in line_paths:
+                paths.add(path)
+                parents.update(self._get_parents(path))
+        if group:
+            yield key, group
+
+    @staticmethod
+    def _get_entries(line):
+        args = line.parsed_args
+        if line.cmd_name == 'rm':
+            return [files.DeleteArg(utils.normalize_path(path))
+                    for path in args.path]
+        if line.cmd_name == 'mkdir':
+            return [files.CreateFolderArg(utils.normalize_path(args.path))]
+        from_paths = [utils.normalize_path(path) for path in args.from_path]
+        to_path = utils.normalize_path(args.to_path)
+        if len(from_paths) == 1:
+            return [files.RelocationPath(from_paths[0], to_path)]
+        return [files.RelocationPath(from_path, '{0}/{1}'.format(
+            to_path.rstrip('/'), os.path.basename(from_path)))
+            for from_path in from_paths]
+
+    def _get_batch_calls(self, key):
+        """Returns functions launching and checking batch jobs."""
+
+        _, cmd_name, auto_rename, allow_ownership_transfer = key
+        if cmd_name == 'rm':
+            return (self.client.files_delete_batch,
+                    self.client.files_delete_batch_check)
+        if cmd_name == 'mkdir':
+            def launch(batch):
+                return self.client.files_create_folder_batch(
+                    [entry.path for entry in batch], autorename=auto_rename)
+            return launch, self.client.files_create_folder_batch_check
+        if cmd_name == 'cp':
+            def launch(batch):
+                return self.client.files_copy_batch_v2(
+                    batch, autorename=auto_rename)
+            return launch, self.client.files_copy_batch_check_v2
+
+        def launch(batch):
+            return self.client.files_move_batch_v2(
+                batch, autorename=auto_rename,
+                allow_ownership_transfer=allow_ownership_transfer)
+        return launch, self.client.files_move_batch_check_v2
+
+    def _run_batch(self, key, lines):
+        """Runs commands of lines with as few batch requests as possible."""
+
+        entries = []
+        owners = {}
+        for line in lines:
+            for entry in self._get_entries(line):
+                entries.append(entry)
+                owners[id(entry)] = line
+        launch, check = self._get_batch_calls(key)
+        done = set()
+        try:
+            for entry, result in self.run_batch_jobs(launch, check, entries):
+                done.add(id(entry))
+                if result.is_failure():
+                    path = getattr(entry, 'from_path', None) or entry.path
+                    msg = "{0}: cannot process '{1}': {2}.".format(
+                        key[1], path, result.get_failure())
+                    owners[id(entry)].fail(1, msg)
+        except (exceptions.ApiError, error.ActionException) as exc:
+            for entry in entries:
+                if id(entry) not in done:
+                    owners[id(entry)].fail(1, '{0}: {1}'.format(key[1], exc))
+
+    @staticmethod
+    def _run_line(line):
+        try:
+            line.status = line.command.run(line.parsed_args) or 0
+        except Exception as exc:  # reported like cliff does on errors
+            line.fail(1, str(exc))
+
+    def take_action(self, parsed_args):
+        lines = list(self._read_lines(parsed_args.file))
+        for line in lines:
+            self._prepare(line)
+        workers = max(parsed_args.parallel, 1)
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            for key, group in self._iter_groups(lines):
+                if key[0] == 'batch':
+                    self._run_batch(key, group)
+                elif key[0] == 'run':
+                    list(executor.map(self._run_line, group))
+                for line in group:
+                    self.stdout.write(json.dumps(line.get_report()) + '\n')
+                self.stdout.flush()
+        return int(any(line.status for line in lines))
@@ -0,0 +1,59 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+from .base import BaseCommand
+from .. import daemon
+
+
+class Daemon(BaseCommand):
+    """
+    Serves dropme commands over a Unix domain socket with warm connections.
+    """
+
+    def get_parser(self, prog_name):
+        parser = super(Daemon, self).get_parser(prog_name)
+        parser.add_argument(
+            '--socket',
+            help='Path of the socket. Defaults to dropme.sock in '
+                 '$XDG_RUNTIME_DIR or in the cache directory.'
+        )
+        parser.add_argument(
+            '--idle-timeout',
+            type=float,
+            help='Exit after the given number of seconds without commands. '
+                 'By default the daemon runs until it is stopped.'
+        )
+        parser.add_argument(
+            '--metadata-ttl',
+            type=float,
+            default=0,
+            help='Time in seconds file metadata is cached for. Changes '
+                 'made by other clients within that time are not seen, '
+                 'e.g. by --skip-identical. Defaults to 0, which disables '
+                 'the cache.'
+        )
+        parser.add_argument(
+            '--stop',
+            action='store_true',
+            help='Stop a running daemon.'
+        )
+        return parser
+
+    def take_action(self, parsed_args):
+        path = parsed_args.socket or daemon.get_socket_path()
+        if parsed_args.stop:
+            if daemon.stop(path):
+                msg = "dropme daemon on '{0}' was stopped.\n".format(path)
+            else:
+                msg = "dropme daemon is not running on '{0}'.\n".format(path)
+            self.stdout.write(msg)
+            return
+        # Imported here as it loads the whole Dropbox SDK.
+        from .. import client
+        client.set_metadata_ttl(parsed_args.metadata_ttl or None)
+        server = daemon.Server(path, idle_timeout=parsed_args.idle_timeout)
+        self.stdout.write("dropme daemon is listening on "
+                          "'{0}'.\n".format(path))
+        self.stdout.flush()
+        server.serve()
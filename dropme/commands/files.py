@@ -4,26 +4,97 @@
 
 import abc
 import argparse
+import asyncio
+import concurrent.futures
 import datetime
+import json
 import os
-
-from tqdm import tqdm
-
-from dropbox import exceptions
-from dropbox import files
+import time
 
 from . import base
 from .. import error
+from ..common import chunking
+from ..common import engine
+from ..common import fileio
+from ..common import hashing
+from ..common import index
+from ..common import tracing
 from ..common import utils
 
+exceptions = utils.lazy_import('dropbox.exceptions')
+files = utils.lazy_import('dropbox.files')
+tqdm = utils.lazy_import('tqdm')
+
+
+def _progress(**kwargs):
+    """Creates a tqdm progress bar, its updates are traced if enabled."""
+
+    pb = tqdm.tqdm(**kwargs)
+    if tracing.get_tracer() is not None:
+        update = pb.update
+
+        def traced_update(n=1):
+            with tracing.span('progress'):
+                return update(n)
+        pb.update = traced_update
+    return pb
+
+
+def _chunk_size(value):
+    """Parses a chunk size in megabytes or 'auto'."""
+
+    if value == 'auto':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "invalid chunk size: '{0}', expected a number of megabytes or "
+            "'auto'".format(value))
+
+
+class _UploadSourcesAction(argparse.Action):
+    """Splits 'put' positional arguments into sources and a destination.
+
+    The last argument is treated as a destination path in Dropbox if more
+    than one argument is given. The '-' source (stdin) must be the only
+    one and requires a destination.
+    """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        sources, path = values, None
+        if len(values) > 1:
+            sources, path = values[:-1], values[-1]
+        if '-' in sources:
+            if len(sources) > 1 or path is None:
+                parser.error("'-' (stdin) must be the only source and be "
+                             "followed by a destination path")
+            sources = []
+        for source in sources:
+            try:
+                FilePut._get_file_path(source)
+            except argparse.ArgumentTypeError as exc:
+                parser.error(str(exc))
+        setattr(namespace, self.dest, sources or ['-'])
+        namespace.path = path
+
 
-class FilePut(base.BaseCommand):
+class FilePut(base.BaseCommand, base.UploadMixIn):
     """
-    Uploads a file to a specified directory.
+    Uploads files or directories to a specified directory.
 
     If destination directory path doesn't exist it will be created.
+    Multiple files are uploaded concurrently and committed in batches.
     """
 
+    # Data sent to a concurrent upload session must be aligned to 4 MB,
+    # except for the last chunk that closes the session.
+    CONCURRENT_CHUNK_ALIGNMENT = 4 * 1024 * 1024
+    # Maximum number of entries committed by a single finish batch request.
+    FINISH_BATCH_SIZE = 1000
+    # Minimum interval in seconds between checks of a finish batch job.
+    BATCH_POLL_INTERVAL = 1
+
     @staticmethod
     def _get_file_path(file_path):
         if not os.path.lexists(file_path):
@@ -37,55 +108,311 @@ class FilePut(base.BaseCommand):
             return os.path.join('/', os.path.basename(src_path))
         return utils.normalize_path(dst_path)
 
-    def upload_file(self, file_src, file_dst, chunk_size, autorename=False):
+    def upload_file(self, file_src, file_dst, chunk_size, autorename=False,
+                    resume=False, read_ahead=fileio.ReadAhead.DEPTH,
+                    sizer=None):
         file_size = os.path.getsize(file_src)
-        response = None
-        pb = tqdm(total=file_size, unit="B", unit_scale=True,
-                  desc=os.path.basename(file_src), miniters=1,
-                  ncols=80, mininterval=1)
+        pb = _progress(total=file_size, unit="B", unit_scale=True,
+                       desc=os.path.basename(file_src), miniters=1,
+                       ncols=80, mininterval=1)
         try:
-            with open(file_src, 'rb') as f:
-                if file_size <= chunk_size:
-                    response = self.client.files_upload(f.read(), file_dst,
-                                                        autorename=autorename)
-                else:
-                    session_start = self.client.files_upload_session_start(
-                        f.read(chunk_size))
-                    cursor = files.UploadSessionCursor(
-                        session_id=session_start.session_id, offset=f.tell())
-                    commit = files.CommitInfo(path=file_dst,
-                                              autorename=autorename)
-                    while f.tell() < file_size:
-                        pb.update(chunk_size)
-                        if file_size - f.tell() <= chunk_size:
-                            pb.update(file_size - f.tell())
-                            response = self.client.files_upload_session_finish(
-                                f.read(chunk_size), cursor, commit)
-                        else:
-                            self.client.files_upload_session_append_v2(
-                                f.read(chunk_size), cursor)
-                            cursor.offset = f.tell()
+            response = self.upload_local_file(
+                file_src, file_dst, chunk_size, autorename=autorename,
+                resume=resume, read_ahead=read_ahead, sizer=sizer,
+                callback=lambda offset: pb.update(offset - pb.n))
+            if sizer is not None and file_size > chunk_size:
+                sizer.save()
         except exceptions.ApiError as exc:
             msg = "An error occurred while uploading '{0}': {1}.".format(
-                file_src, exc.error.get_path().reason)
+                file_src, self._get_upload_error_reason(exc.error))
             raise error.ActionException(msg) from exc
         finally:
             pb.close()
         return response
 
+    def upload_stream(self, stream, file_dst, chunk_size, autorename=False,
+                      sizer=None):
+        """Uploads data of unknown size read from a binary stream.
+
+        A single chunk is held in memory at a time. A chunk shorter than
+        chunk_size marks the end of the stream and closes the upload
+        session (an empty one if the size is a multiple of chunk_size).
+
+        :param stream: binary stream, e.g. stdin
+        :param file_dst: destination path in Dropbox
+        :param chunk_size: size of a single chunk in bytes
+        :param autorename: whether to rename the file on conflict
+        :param sizer: ChunkSizer adapting the size of chunks
+        :return: metadata of the uploaded file
+        """
+        pb = _progress(unit="B", unit_scale=True, desc='stdin', miniters=1,
+                       ncols=80, mininterval=1)
+        try:
+            data = fileio.read_stream(stream, chunk_size)
+            if len(data) < chunk_size:
+                response = self.client.files_upload(data, file_dst,
+                                                    autorename=autorename)
+                pb.update(len(data))
+                return response
+            session_start = self.client.files_upload_session_start(data)
+            pb.update(len(data))
+            cursor = files.UploadSessionCursor(
+                session_id=session_start.session_id, offset=len(data))
+            commit = files.CommitInfo(path=file_dst, autorename=autorename)
+            while True:
+                data = fileio.read_stream(stream, chunk_size)
+                if len(data) < chunk_size:
+                    response = self.client.files_upload_session_finish(
+                        data, cursor, commit)
+                    pb.update(len(data))
+                    break
+                started = time.monotonic()
+                self.client.files_upload_session_append_v2(data, cursor)
+                cursor.offset += len(data)
+                pb.update(len(data))
+                if sizer is not None:
+                    chunk_size = sizer.observe(len(data),
+                                               time.monotonic() - started)
+            if sizer is not None:
+                sizer.save()
+        except exceptions.ApiError as exc:
+            msg = "An error occurred while uploading stdin: {0}.".format(
+                self._get_upload_error_reason(exc.error))
+            raise error.ActionException(msg) from exc
+        finally:
+            pb.close()
+        return response
+
+    def _upload_chunk(self, reader, session_id, offset, length, close, pb):
+        data = reader.read(offset, length)
+        cursor = files.UploadSessionCursor(session_id=session_id,
+                                           offset=offset)
+        self.client.files_upload_session_append_v2(data, cursor, close=close)
+        reader.release(offset, len(data))
+        pb.update(len(data))
+
+    def upload_file_parallel(self, file_src, file_dst, chunk_size, workers,
+                             autorename=False):
+        """Uploads a file using a concurrent upload session.
+
+        Chunks are read and appended by a pool of worker threads, so up to
+        ``workers`` chunks are in flight and held in memory at the same
+        time. The session is committed once all chunks have been accepted.
+
+        :param file_src: path to the local file
+        :param file_dst: destination path in Dropbox
+        :param chunk_size: size of a single chunk in bytes, rounded down
+                           to a multiple of 4 MB (at least 4 MB), so it
+                           stays within the 150 MB limit of a request
+        :param workers: number of chunks uploaded concurrently
+        :param autorename: whether to rename the file on conflict
+        :return: metadata of the uploaded file
+        """
+        file_size = os.path.getsize(file_src)
+        if file_size <= chunk_size:
+            return self.upload_file(file_src, file_dst, chunk_size,
+                                    autorename=autorename)
+        alignment = self.CONCURRENT_CHUNK_ALIGNMENT
+        chunk_size = max(chunk_size // alignment, 1) * alignment
+        offsets = range(0, file_size, chunk_size)
+        pb = _progress(total=file_size, unit="B", unit_scale=True,
+                       desc=os.path.basename(file_src), miniters=1,
+                       ncols=80, mininterval=1)
+        try:
+            session_start = self.client.files_upload_session_start(
+                b'', session_type=files.UploadSessionType.concurrent)
+            session_id = session_start.session_id
+            with fileio.ChunkReader(file_src) as reader, \
+                    concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                futures = [
+                    executor.submit(self._upload_chunk, reader, session_id,
+                                    offset, chunk_size,
+                                    offset + chunk_size >= file_size, pb)
+                    for offset in offsets]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        future.result()
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            cursor = files.UploadSessionCursor(session_id=session_id,
+                                               offset=file_size)
+            commit = files.CommitInfo(path=file_dst, autorename=autorename)
+            response = self.client.files_upload_session_finish(b'', cursor,
+                                                               commit)
+        except exceptions.ApiError as exc:
+            msg = "An error occurred while uploading '{0}': {1}.".format(
+                file_src, exc.error)
+            raise error.ActionException(msg) from exc
+        finally:
+            pb.close()
+        return response
+
+    def _iter_upload_entries(self, sources, dst_path=None):
+        """Yields (local path, Dropbox path) pairs for all source files.
+
+        Directories are walked recursively and keep their own name under
+        the destination directory.
+        """
+        dst_dir = utils.normalize_path(dst_path) if dst_path else '/'
+        for source in sources:
+            source = os.path.normpath(source)
+            base_name = os.path.basename(os.path.abspath(source))
+            if not os.path.isdir(source):
+                yield source, os.path.join(dst_dir, base_name)
+                continue
+            for file_src in utils.walk_files(source):
+                rel_path = os.path.relpath(file_src, source)
+                yield file_src, os.path.join(
+                    dst_dir, base_name, *rel_path.split(os.sep))
+
+    def _launch_finish_batch(self, batch):
+        """Starts committing a batch of upload sessions.
+
+        :return: tuple of async job id (None if the batch was committed
+                 at once) and a list of result entries (None while the job
+                 is in progress)
+        """
+        launch = self.client.files_upload_session_finish_batch(
+            [finish_arg for _, finish_arg in batch])
+        if launch.is_complete():
+            return None, launch.get_complete().entries
+        return launch.get_async_job_id(), None
+
+    def _check_finish_batch(self, async_job_id):
+        status = self.client.files_upload_session_finish_batch_check(
+            async_job_id)
+        if status.is_complete():
+            return status.get_complete().entries
+        return None
+
+    def _is_identical(self, file_src, file_dst):
+        """Checks whether a Dropbox file has the same content as a local one.
+        """
+        try:
+            metadata = self.client.files_get_metadata(file_dst)
+        except exceptions.ApiError:
+            return False
+        return (isinstance(metadata, files.FileMetadata) and
+                metadata.size == os.path.getsize(file_src) and
+                metadata.content_hash == self.hash_cache.get_content_hash(
+                    file_src))
+
+    def upload_files(self, entries, chunk_size, workers, autorename=False,
+                     skip_identical=False):
+        """Uploads many files concurrently with the transfer engine.
+
+        Every file is uploaded to its own upload session. Closed sessions
+        are committed in groups of up to FINISH_BATCH_SIZE entries; a batch
+        job is polled while the next group is being uploaded, only one job
+        runs at a time.
+
+        :param entries: iterable of (local path, Dropbox path) pairs
+        :param chunk_size: size of a single chunk in bytes
+        :param workers: number of files uploaded concurrently
+        :param autorename: whether to rename files on conflict
+        :param skip_identical: whether to skip files which already exist
+                               in Dropbox with the same content
+        :return: list of (local path, result) tuples, where result is
+                 either FileMetadata, an error or None for skipped files
+        """
+        results = []
+        batch = []
+        job = {'id': None, 'batch': None, 'polled': 0}
+
+        def collect(batch_entries, batch_results):
+            results.extend((file_src, entry.get_success()
+                            if entry.is_success() else entry.get_failure())
+                           for (file_src, _), entry in zip(batch_entries,
+                                                           batch_results))
+
+        async def poll(wait=False):
+            while job['batch'] is not None:
+                now = time.monotonic()
+                if now - job['polled'] < self.BATCH_POLL_INTERVAL:
+                    if not wait:
+                        return
+                    await asyncio.sleep(
+                        self.BATCH_POLL_INTERVAL - now + job['polled'])
+                job['polled'] = time.monotonic()
+                batch_results = await transfer.call(self._check_finish_batch,
+                                                    job['id'])
+                if batch_results is not None:
+                    collect(job['batch'], batch_results)
+                    job['batch'] = None
+
+        async def commit(batch_entries):
+            await poll(wait=True)
+            async_job_id, batch_results = await transfer.call(
+                self._launch_finish_batch, batch_entries)
+            if batch_results is not None:
+                collect(batch_entries, batch_results)
+            else:
+                job.update(id=async_job_id, batch=batch_entries,
+                           polled=time.monotonic())
+
+        async def upload(entry):
+            file_src, file_dst = entry
+            try:
+                if skip_identical and await transfer.call(
+                        self._is_identical, file_src, file_dst):
+                    return file_src, None
+                cursor = await transfer.upload_to_session(file_src,
+                                                          chunk_size)
+            except (exceptions.ApiError, IOError, OSError) as exc:
+                return file_src, exc.error if hasattr(exc, 'error') else exc
+            commit_info = files.CommitInfo(path=file_dst,
+                                           autorename=autorename)
+            return file_src, files.UploadSessionFinishArg(cursor, commit_info)
+
+        async def upload_all():
+            nonlocal batch
+            async for file_src, result in transfer.map_unordered(upload,
+                                                                 entries):
+                pb.update()
+                if isinstance(result, files.UploadSessionFinishArg):
+                    batch.append((file_src, result))
+                else:
+                    results.append((file_src, result))
+                if len(batch) >= self.FINISH_BATCH_SIZE:
+                    await commit(batch[:self.FINISH_BATCH_SIZE])
+                    batch = batch[self.FINISH_BATCH_SIZE:]
+                else:
+                    await poll()
+            if batch:
+                await commit(batch)
+            await poll(wait=True)
+
+        pb = _progress(unit="file", desc='Uploading', miniters=1, ncols=80,
+                       mininterval=1)
+        try:
+            with engine.TransferEngine(self.client, workers) as transfer:
+                transfer.run(upload_all())
+        except exceptions.ApiError as exc:
+            msg = ("An error occurred while committing uploaded files: "
+                   "{0}.".format(exc.error))
+            raise error.ActionException(msg) from exc
+        finally:
+            pb.close()
+        return results
+
     def get_parser(self, prog_name):
         parser = super(FilePut, self).get_parser(prog_name)
         parser.add_argument(
             'file',
-            type=self._get_file_path,
-            help='The path to the file to upload.'
-        )
-        parser.add_argument(
-            'path',
-            nargs='?',
-            help='The path of the directory to upload file,'
-                 'defaults to the root.'
+            nargs='+',
+            metavar='FILE',
+            action=_UploadSourcesAction,
+            help='The paths of files or directories to upload, optionally '
+                 'followed by a destination path in Dropbox (the last '
+                 'argument is used as the destination if more than one '
+                 'is given). For a single file the destination is a path '
+                 'of the file, otherwise it is a directory to upload '
+                 "content into. Defaults to the root. Use '-' followed "
+                 'by a destination path of a file to upload stdin.'
         )
+        parser.set_defaults(path=None)
         parser.add_argument(
             '-r', '--auto-rename',
             action='store_true',
@@ -94,52 +421,162 @@ class FilePut(base.BaseCommand):
         )
         parser.add_argument(
             '--chunk-size',
-            type=int,
+            type=_chunk_size,
             default=10,
             help='Chunk size of a file content to be uploaded per request '
                  'in megabytes. Defaults to 10 MB. Note: A single request '
-                 'should not upload more than 150 MB.'
+                 'should not upload more than 150 MB. With "auto" the '
+                 'size of chunks of a file uploaded sequentially is '
+                 'adapted to the measured throughput, other uploads use '
+                 'the last adapted size on this host.'
+        )
+        parser.add_argument(
+            '-p', '--parallel',
+            type=int,
+            default=1,
+            metavar='N',
+            help='Number of chunks to upload concurrently. Values greater '
+                 'than 1 use a concurrent upload session and round the '
+                 'chunk size down to a multiple of 4 MB. Defaults to 1.'
+        )
+        parser.add_argument(
+            '--read-ahead',
+            type=int,
+            default=fileio.ReadAhead.DEPTH,
+            metavar='N',
+            help='Number of chunks read from the disk in advance while a '
+                 'chunk is being sent, when a file is uploaded '
+                 'sequentially. Use 0 to disable reading ahead. Defaults '
+                 'to {0}.'.format(fileio.ReadAhead.DEPTH)
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted upload of a single file from the '
+                 'last offset accepted by Dropbox, if the file has not been '
+                 'changed since. Implies sequential upload.'
+        )
+        parser.add_argument(
+            '--skip-identical',
+            action='store_true',
+            help='Do not upload files which already exist in Dropbox with '
+                 'the same content hash. Local hashes are cached.'
         )
         return parser
 
+    def _upload_many(self, parsed_args, chunk_size):
+        entries = self._iter_upload_entries(parsed_args.file,
+                                            parsed_args.path)
+        started = time.monotonic()
+        results = self.upload_files(
+            entries, chunk_size, max(parsed_args.parallel, 1),
+            autorename=parsed_args.auto_rename,
+            skip_identical=parsed_args.skip_identical)
+        elapsed = time.monotonic() - started
+        uploaded = [r for _, r in results if isinstance(r, files.Metadata)]
+        skipped = [f for f, r in results if r is None]
+        failed = [(f, r) for f, r in results
+                  if r is not None and not isinstance(r, files.Metadata)]
+        for file_src, reason in failed:
+            self.stdout.write("Could not upload '{0}': {1}.\n".format(
+                file_src, reason))
+        total_size = sum(metadata.size for metadata in uploaded)
+        msg = ("{0} file(s) ({1}) were successfully uploaded to Dropbox "
+               "at {2}\n".format(len(uploaded),
+                                 utils.convert_size(total_size),
+                                 utils.convert_rate(total_size, elapsed)))
+        self.stdout.write(msg)
+        if skipped:
+            self.stdout.write("{0} identical file(s) were skipped.\n".format(
+                len(skipped)))
+        if failed:
+            raise error.ActionException(
+                "{0} file(s) failed to upload.".format(len(failed)))
+
+    def _upload_stdin(self, parsed_args, chunk_size, sizer):
+        dst_path = utils.normalize_path(parsed_args.path)
+        stdin = getattr(self.app.stdin, 'buffer', self.app.stdin)
+        self.stdout.write("Uploading stdin to Dropbox as '{0}'\n".format(
+            dst_path))
+        started = time.monotonic()
+        response = self.upload_stream(stdin, dst_path, chunk_size,
+                                      autorename=parsed_args.auto_rename,
+                                      sizer=sizer)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            "Stdin ({0}) was successfully uploaded to Dropbox as '{1}' at "
+            "{2}\n".format(utils.convert_size(response.size),
+                           response.path_display,
+                           utils.convert_rate(response.size, elapsed)))
+
     def take_action(self, parsed_args):
-        chunk_size = utils.to_megabytes(parsed_args.chunk_size)
-        dst_path = self._build_destination_path(parsed_args.file,
-                                                parsed_args.path)
+        sizer = None
+        if parsed_args.chunk_size == 'auto':
+            sizer = chunking.ChunkSizer()
+            chunk_size = sizer.size
+        else:
+            chunk_size = utils.to_megabytes(parsed_args.chunk_size)
+        if parsed_args.file == ['-']:
+            return self._upload_stdin(parsed_args, chunk_size, sizer)
+        if (len(parsed_args.file) > 1 or
+                os.path.isdir(parsed_args.file[0])):
+            return self._upload_many(parsed_args, chunk_size)
+        file_src = parsed_args.file[0]
+        dst_path = self._build_destination_path(file_src, parsed_args.path)
+        if (parsed_args.skip_identical and
+                self._is_identical(file_src, dst_path)):
+            self.stdout.write("File '{0}' is identical to '{1}' in Dropbox, "
+                              "skipping.\n".format(file_src, dst_path))
+            return
         self.stdout.write("Uploading '{0}' file to Dropbox as '{1}'"
-                          "\n".format(parsed_args.file, dst_path))
-        response = self.upload_file(parsed_args.file, dst_path,
-                                    autorename=parsed_args.auto_rename,
-                                    chunk_size=chunk_size)
+                          "\n".format(file_src, dst_path))
+        started = time.monotonic()
+        if parsed_args.parallel > 1 and not parsed_args.resume:
+            response = self.upload_file_parallel(
+                file_src, dst_path, chunk_size, parsed_args.parallel,
+                autorename=parsed_args.auto_rename)
+        else:
+            response = self.upload_file(file_src, dst_path,
+                                        autorename=parsed_args.auto_rename,
+                                        chunk_size=chunk_size,
+                                        resume=parsed_args.resume,
+                                        read_ahead=parsed_args.read_ahead,
+                                        sizer=sizer)
+        elapsed = time.monotonic() - started
         msg = ("File '{0}' ({1}) was successfully uploaded to Dropbox "
-               "as '{2}'\n".format(parsed_args.file,
-                                   utils.convert_size(response.size),
-                                   response.path_display))
+               "as '{2}' at {3}\n".format(
+                   file_src, utils.convert_size(response.size),
+                   response.path_display,
+                   utils.convert_rate(response.size, elapsed)))
         self.stdout.write(msg)
 
 
-class FileFolderDelete(base.BaseCommand, base.FileFolderMixIn):
+class FileFolderDelete(base.BaseCommand, base.FileFolderMixIn,
+                       base.BatchJobMixIn):
     """
-    Deletes a file or a folder at a given path.
+    Deletes files or folders at given paths.
 
     If the path is a folder, all its content will be deleted too.
+    Multiple paths are deleted with batch requests.
     """
 
     def get_parser(self, prog_name):
         parser = super(FileFolderDelete, self).get_parser(prog_name)
+        parser.fromfile_prefix_chars = '@'
         parser.add_argument(
             'path',
-            help='The path of the file or folder to delete.'
+            nargs='+',
+            help='The paths of files or folders to delete. Use @FILE to '
+                 'read paths from a file, one per line.'
         )
         return parser
 
-    def take_action(self, parsed_args):
-        path = utils.normalize_path(parsed_args.path)
+    def _delete_one(self, path):
         try:
             response = self.client.files_delete_v2(path)
         except exceptions.ApiError as exc:
             msg = "An error occurred while deleting '{0}': {1}.".format(
-                parsed_args.path, exc.error)
+                path, exc.error)
             raise error.ActionException(msg) from exc
         msg = "{0} '{1}' {2}was successfully deleted from '{3}'.\n".format(
             self.get_entity_type(response.metadata).capitalize(),
@@ -148,43 +585,390 @@ class FileFolderDelete(base.BaseCommand, base.FileFolderMixIn):
             response.metadata.path_display)
         self.stdout.write(msg)
 
+    def _delete_many(self, paths):
+        entries = [files.DeleteArg(path) for path in paths]
+        failed = 0
+        try:
+            results = self.run_batch_jobs(self.client.files_delete_batch,
+                                          self.client.files_delete_batch_check,
+                                          entries)
+            for entry, result in results:
+                if result.is_success():
+                    self.stdout.write("'{0}' was successfully deleted.\n"
+                                      "".format(entry.path))
+                else:
+                    failed += 1
+                    self.stdout.write(
+                        "An error occurred while deleting '{0}': {1}.\n"
+                        "".format(entry.path, result.get_failure()))
+        except exceptions.ApiError as exc:
+            msg = "rm: cannot delete paths: {0}.".format(exc.error)
+            raise error.ActionException(msg) from exc
+        if failed:
+            raise error.ActionException(
+                "rm: {0} of {1} path(s) could not be deleted.".format(
+                    failed, len(entries)))
+
+    def take_action(self, parsed_args):
+        paths = [utils.normalize_path(path) for path in parsed_args.path]
+        if len(paths) == 1:
+            self._delete_one(paths[0])
+        else:
+            self._delete_many(paths)
+
 
 class FileGet(base.BaseCommand):
     """
     Downloads a file at a given local path.
+
+    With --recursive downloads all files of a folder tree concurrently.
     """
 
+    # Number of files of a folder tree downloaded concurrently by default.
+    RECURSIVE_WORKERS = 8
+
+    @staticmethod
+    def _load_part_state(state_path, metadata, chunk_size):
+        """Returns offsets of ranges already saved to a partial file.
+
+        The state is discarded if it belongs to another revision of the
+        file or was created with a different chunk size.
+        """
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, IOError, ValueError):
+            return set()
+        if (state.get('rev') != metadata.rev or
+                state.get('size') != metadata.size or
+                state.get('chunk_size') != chunk_size):
+            return set()
+        return set(state.get('done', []))
+
+    @staticmethod
+    def _dump_part_state(state_path, metadata, chunk_size, done):
+        tmp_path = '{0}.tmp'.format(state_path)
+        with open(tmp_path, 'w') as f:
+            json.dump({'rev': metadata.rev, 'size': metadata.size,
+                       'chunk_size': chunk_size, 'done': sorted(done)}, f)
+        os.replace(tmp_path, state_path)
+
+    def download_file_parallel(self, path, dst_path, chunk_size, workers,
+                               rev=None):
+        """Downloads a file by fetching byte ranges concurrently.
+
+        Ranges are written with positional writes to a preallocated
+        '<dst_path>.part' file, which is renamed to dst_path once all
+        ranges are saved and the content hash of the whole file matches.
+        Ranges of an interrupted download of the same revision are not
+        fetched again, a partial file with a wrong content hash is removed.
+
+        :param path: path of the file in Dropbox
+        :param dst_path: local path to save the file
+        :param chunk_size: size of a single range in bytes
+        :param workers: number of ranges fetched concurrently
+        :param rev: revision of the file
+        :return: metadata of the downloaded file
+        """
+        metadata = self.client.files_get_metadata(
+            'rev:{0}'.format(rev) if rev else path)
+        if not isinstance(metadata, files.FileMetadata):
+            raise error.ActionException(
+                "'{0}' is not a file.".format(metadata.path_display))
+        if metadata.size <= chunk_size:
+            return self.client.files_download_to_file(dst_path, path, rev=rev)
+        # A revision identifies exact content of the file.
+        path = 'rev:{0}'.format(metadata.rev)
+        part_path = '{0}.part'.format(dst_path)
+        state_path = '{0}.json'.format(part_path)
+        done = set()
+        if os.path.exists(part_path):
+            done = self._load_part_state(state_path, metadata, chunk_size)
+        offsets = [offset for offset in range(0, metadata.size, chunk_size)
+                   if offset not in done]
+        pb = _progress(total=metadata.size, unit="B", unit_scale=True,
+                       desc=metadata.name, miniters=1, ncols=80, mininterval=1,
+                       initial=sum(min(chunk_size, metadata.size - offset)
+                                   for offset in done))
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not done:
+                os.ftruncate(fd, metadata.size)
+            with engine.TransferEngine(self.client, workers) as transfer:
+                ranges = transfer.map_unordered(
+                    lambda offset: transfer.download_range(
+                        path, fd, offset,
+                        min(chunk_size, metadata.size - offset), pb.update),
+                    offsets, limit=workers)
+                for offset in transfer.iterate(ranges):
+                    done.add(offset)
+                    self._dump_part_state(state_path, metadata, chunk_size,
+                                          done)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+            pb.close()
+        if (metadata.content_hash is not None and metadata.content_hash !=
+                self.hash_cache.get_content_hash(part_path)):
+            os.remove(part_path)
+            os.remove(state_path)
+            raise IOError('Content hash of the downloaded data does not '
+                          'match, the download has to be started over')
+        os.replace(part_path, dst_path)
+        os.remove(state_path)
+        return metadata
+
+    def download_to_stream(self, path, stream, rev=None):
+        """Writes the content of a file to a binary stream.
+
+        The content is written in blocks as it arrives, so it is never
+        held in memory or saved to the disk as a whole.
+
+        :param path: path of the file in Dropbox
+        :param stream: binary stream, e.g. stdout
+        :param rev: revision of the file
+        :return: metadata of the downloaded file
+        """
+        metadata, response = self.client.files_download(path, rev=rev)
+        pb = _progress(total=metadata.size, unit="B", unit_scale=True,
+                       desc=metadata.name, miniters=1, ncols=80, mininterval=1)
+        try:
+            engine.write_response(response, stream.write, metadata.size,
+                                  pb.update)
+            stream.flush()
+        finally:
+            pb.close()
+        return metadata
+
+    def _download_stdout(self, path, rev=None):
+        # Messages go to stderr, stdout carries the content of the file.
+        stdout = getattr(self.app.stdout, 'buffer', self.app.stdout)
+        try:
+            self.app.stdout.flush()
+            response = self.download_to_stream(path, stdout, rev=rev)
+        except (exceptions.ApiError, exceptions.HttpError,
+                IOError, OSError) as exc:
+            msg = ("An error occurred while downloading '{0}' file to "
+                   "stdout: {1}.".format(
+                       path, exc.error if hasattr(exc, 'error') else exc))
+            raise error.ActionException(msg) from exc
+        self.app.stderr.write(
+            "File '{0}' (rev={1}, size {2}) from '{3}' was successfully "
+            "written to stdout.\n".format(
+                response.name, response.rev,
+                utils.convert_size(response.size), response.path_display))
+
+    def _is_local_identical(self, entry, local_path):
+        return (os.path.isfile(local_path) and
+                os.path.getsize(local_path) == entry.size and
+                self.hash_cache.get_content_hash(local_path) ==
+                entry.content_hash)
+
+    def _download_entry(self, entry, local_path):
+        """Downloads a file unless its local copy is identical.
+
+        :return: metadata of the file or None if it was skipped
+        """
+        if self._is_local_identical(entry, local_path):
+            return None
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        metadata = self.client.files_download_to_file(
+            local_path, entry.path_lower, rev=entry.rev)
+        self.hash_cache.set(os.stat(local_path), entry.content_hash)
+        return metadata
+
+    def download_folder(self, path, dst_path, workers):
+        """Downloads a folder tree to a local directory.
+
+        Files are downloaded by the transfer engine while the recursive
+        listing is being fetched, so up to ``workers`` files are fetched at
+        a time over the shared connection pool and entries of the listing
+        are not kept in memory. The total of the progress bar grows with
+        every page of the listing and shrinks with every skipped or failed
+        file. Files whose local copies already have the same content hash
+        are skipped. Hashes of downloaded files are
+        stored in the local hash cache, so they are not read again by the
+        next run.
+
+        :param path: path of the folder in Dropbox, '' for the root
+        :param dst_path: local directory to save the content of the folder
+        :param workers: number of files downloaded concurrently
+        :return: list of (Dropbox path, result) tuples, where result is
+                 either FileMetadata, an error or None for skipped files
+        """
+        offset = len(path) + 1
+
+        def get_local_path(entry):
+            return os.path.join(dst_path,
+                                *entry.path_display[offset:].split('/'))
+
+        async def iter_files():
+            response = await transfer.call(self.client.files_list_folder,
+                                           path, recursive=True)
+            async for entry in transfer.iter_folder(response):
+                if isinstance(entry, files.FolderMetadata):
+                    os.makedirs(get_local_path(entry), exist_ok=True)
+                elif isinstance(entry, files.FileMetadata):
+                    pb.total += entry.size
+                    pb.refresh()
+                    yield entry
+
+        async def download(entry):
+            try:
+                result = await transfer.call(self._download_entry, entry,
+                                             get_local_path(entry))
+            except (exceptions.ApiError, exceptions.HttpError,
+                    IOError, OSError) as exc:
+                result = exc.error if hasattr(exc, 'error') else exc
+            if isinstance(result, files.Metadata):
+                pb.update(entry.size)
+            else:
+                # Only downloaded data is counted.
+                pb.total -= entry.size
+                pb.refresh()
+            return entry.path_display, result
+
+        os.makedirs(dst_path, exist_ok=True)
+        pb = _progress(total=0, unit="B", unit_scale=True, desc='Downloading',
+                       miniters=1, ncols=80, mininterval=1)
+        try:
+            with engine.TransferEngine(self.client, workers) as transfer:
+                return list(transfer.iterate(
+                    transfer.map_unordered(download, iter_files())))
+        finally:
+            pb.close()
+
+    def _download_many(self, parsed_args, path):
+        if parsed_args.revision:
+            raise error.ActionException(
+                '--revision cannot be used with --recursive.')
+        path = '' if path == '/' else path.rstrip('/')
+        dst_path = parsed_args.file or os.path.join(
+            os.getcwd(), os.path.basename(path) or 'Dropbox')
+        workers = parsed_args.parallel or self.RECURSIVE_WORKERS
+        started = time.monotonic()
+        try:
+            results = self.download_folder(path, dst_path, max(workers, 1))
+        except (exceptions.ApiError, exceptions.HttpError,
+                IOError, OSError) as exc:
+            msg = "An error occurred while downloading '{0}': {1}.".format(
+                path or '/', exc.error if hasattr(exc, 'error') else exc)
+            raise error.ActionException(msg) from exc
+        elapsed = time.monotonic() - started
+        downloaded = [r for _, r in results if isinstance(r, files.Metadata)]
+        skipped = [p for p, r in results if r is None]
+        failed = [(p, r) for p, r in results
+                  if r is not None and not isinstance(r, files.Metadata)]
+        for file_path, reason in failed:
+            self.stdout.write("Could not download '{0}': {1}.\n".format(
+                file_path, reason))
+        total_size = sum(metadata.size for metadata in downloaded)
+        self.stdout.write(
+            "{0} file(s) ({1}) were successfully downloaded to '{2}' at "
+            "{3}\n".format(len(downloaded), utils.convert_size(total_size),
+                           dst_path, utils.convert_rate(total_size, elapsed)))
+        if skipped:
+            self.stdout.write("{0} identical file(s) were skipped.\n".format(
+                len(skipped)))
+        if failed:
+            raise error.ActionException(
+                "{0} file(s) failed to download.".format(len(failed)))
+
     def get_parser(self, prog_name):
         parser = super(FileGet, self).get_parser(prog_name)
         parser.add_argument(
             'path',
             metavar='DROPBOX_FILE',
-            help='The path of the file to download.'
+            help='The path of the file to download, or of the folder with '
+                 '--recursive.'
         )
         parser.add_argument(
             'file',
             metavar='LOCAL_FILE',
             nargs='?',
             help='The path of the file to save data, '
-                 'defaults to current working directory.'
+                 "defaults to current working directory. Use '-' to "
+                 'write the content of the file to stdout.'
         )
         parser.add_argument(
             '--revision',
             help='The revision of a file.'
         )
+        parser.add_argument(
+            '-r', '--recursive',
+            action='store_true',
+            help='Download all files of the DROPBOX_FILE folder tree into '
+                 'the LOCAL_FILE directory concurrently. Files whose local '
+                 'copies have the same content hash are skipped.'
+        )
+        parser.add_argument(
+            '-p', '--parallel',
+            type=int,
+            metavar='N',
+            help='Number of byte ranges of a file to download concurrently. '
+                 'Values greater than 1 save data to a partial '
+                 "'LOCAL_FILE.part' file first, an interrupted download "
+                 'is continued from it. Defaults to 1. With --recursive '
+                 'the number of files downloaded concurrently, defaults '
+                 'to {0}.'.format(self.RECURSIVE_WORKERS)
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10,
+            help='Size of a byte range downloaded per request in '
+                 'megabytes, used with --parallel. Defaults to 10 MB.'
+        )
+        parser.add_argument(
+            '--skip-identical',
+            action='store_true',
+            help='Do not download the file if the local file already has '
+                 'the same content hash. Local hashes are cached.'
+        )
         return parser
 
+    def _get_identical(self, path, dst_path, rev=None):
+        """Returns metadata of a Dropbox file if it equals a local file."""
+        if not os.path.isfile(dst_path):
+            return None
+        metadata = self.client.files_get_metadata(
+            'rev:{0}'.format(rev) if rev else path)
+        if (isinstance(metadata, files.FileMetadata) and
+                metadata.size == os.path.getsize(dst_path) and
+                metadata.content_hash == self.hash_cache.get_content_hash(
+                    dst_path)):
+            return metadata
+        return None
+
     def take_action(self, parsed_args):
         path = utils.normalize_path(parsed_args.path)
+        if parsed_args.recursive:
+            return self._download_many(parsed_args, path)
+        if parsed_args.file == '-':
+            return self._download_stdout(path, parsed_args.revision)
         if not parsed_args.file:
             dst_path = os.path.join(os.getcwd(), os.path.basename(path))
         else:
             dst_path = parsed_args.file
 
         try:
-            response = self.client.files_download_to_file(
-                dst_path, path, rev=parsed_args.revision)
-        except (exceptions.ApiError, IOError, OSError) as exc:
+            if parsed_args.skip_identical:
+                response = self._get_identical(path, dst_path,
+                                               parsed_args.revision)
+                if response is not None:
+                    self.stdout.write(
+                        "File '{0}' is identical to '{1}', skipping.\n"
+                        "".format(response.path_display, dst_path))
+                    return
+            if parsed_args.parallel and parsed_args.parallel > 1:
+                response = self.download_file_parallel(
+                    path, dst_path, utils.to_megabytes(parsed_args.chunk_size),
+                    parsed_args.parallel, rev=parsed_args.revision)
+            else:
+                response = self.client.files_download_to_file(
+                    dst_path, path, rev=parsed_args.revision)
+        except (exceptions.ApiError, exceptions.HttpError,
+                IOError, OSError) as exc:
             msg = ("An error occurred while downloading '{0}' file as '{1}': "
                    "{2}.".format(path, dst_path,
                                  exc.error if hasattr(exc, 'error') else exc))
@@ -223,18 +1007,41 @@ class FileFolderStatusShow(base.BaseShowCommand, base.FileFolderMixIn):
             action='store_true',
             help='Indicate whether or not file has any explicit shared members'
         )
+        parser.add_argument(
+            '--cached',
+            action='store_true',
+            help="Read metadata from the local metadata index (see 'index "
+                 "sync') instead of Dropbox. Media info, deleted entries "
+                 "and sharing details are not available."
+        )
         return parser
 
+    @staticmethod
+    def _get_cached_metadata(path):
+        metadata_index = index.MetadataIndex()
+        if metadata_index.is_empty():
+            raise error.ActionException(
+                "status: metadata index is empty, run 'index sync' first.")
+        response = metadata_index.get_metadata(path)
+        if response is None:
+            raise error.ActionException(
+                "status: cannot fetch metadata for '{0}': not found in the "
+                "metadata index.".format(path))
+        return response
+
     def take_action(self, parsed_args):
         path = utils.normalize_path(parsed_args.path)
         has_members = parsed_args.include_has_members
         try:
-            response = self.client.files_get_metadata(
-                path,
-                include_media_info=parsed_args.include_media_info,
-                include_deleted=parsed_args.include_deleted,
-                include_has_explicit_shared_members=has_members
-            )
+            if parsed_args.cached:
+                response = self._get_cached_metadata(path)
+            else:
+                response = self.client.files_get_metadata(
+                    path,
+                    include_media_info=parsed_args.include_media_info,
+                    include_deleted=parsed_args.include_deleted,
+                    include_has_explicit_shared_members=has_members
+                )
         except (exceptions.ApiError, exceptions.BadInputError) as exc:
             msg = "status: cannot fetch metadata for '{0}': {1}.".format(
                 path, exc.error if hasattr(exc, 'error') else exc.message)
@@ -280,11 +1087,14 @@ class FileFolderStatusShow(base.BaseShowCommand, base.FileFolderMixIn):
         return self.columns, data
 
 
-class BaseFileFolderAction(base.BaseCommand, base.FileFolderMixIn):
+class BaseFileFolderAction(base.BaseCommand, base.FileFolderMixIn,
+                           base.BatchJobMixIn):
     """
     Base class to perform move or copy action on files/folders.
     """
 
+    aliases = {'copy': ('cp', 'copied'), 'move': ('mv', 'moved')}
+
     @property
     @abc.abstractmethod
     def action_type(self):
@@ -295,10 +1105,15 @@ class BaseFileFolderAction(base.BaseCommand, base.FileFolderMixIn):
 
     def get_parser(self, prog_name):
         parser = super(BaseFileFolderAction, self).get_parser(prog_name)
+        parser.fromfile_prefix_chars = '@'
         parser.add_argument(
             'from_path',
+            nargs='+',
             help="Path to a file or folder in the user's Dropbox "
-                 "to {0}.".format(self.action_type)
+                 "to {0}. If several paths are given, they are {1} "
+                 "into the destination folder with batch requests. Use "
+                 "@FILE to read paths from a file, one per line.".format(
+                     self.action_type, self.aliases[self.action_type][1])
         )
         parser.add_argument(
             'to_path',
@@ -326,12 +1141,9 @@ class BaseFileFolderAction(base.BaseCommand, base.FileFolderMixIn):
         )
         return parser
 
-    def take_action(self, parsed_args):
+    def _relocate_one(self, from_path, to_path, parsed_args):
         actions = {'copy': self.client.files_copy_v2,
                    'move': self.client.files_move_v2}
-        aliases = {'copy': ('cp', 'copied'), 'move': ('mv', 'moved')}
-        from_path = utils.normalize_path(parsed_args.from_path)
-        to_path = utils.normalize_path(parsed_args.to_path)
         try:
             response = actions[self.action_type](
                 from_path, to_path, autorename=parsed_args.auto_rename,
@@ -340,24 +1152,75 @@ class BaseFileFolderAction(base.BaseCommand, base.FileFolderMixIn):
             )
         except exceptions.ApiError as exc:
             msg = "{0}: cannot {1} from '{2}' to '{3}': {4}.".format(
-                aliases[self.action_type][0], self.action_type, from_path,
-                to_path,  exc.error)
+                self.aliases[self.action_type][0], self.action_type,
+                from_path, to_path,  exc.error)
             raise error.ActionException(msg) from exc
         msg = ("{0} '{1}' {2}was successfully {3} from '{4}' as '{5}'.\n"
                "".format(self.get_entity_type(response.metadata).capitalize(),
                          os.path.basename(from_path),
                          'and all its content ' if self.is_folder(
                              response.metadata) else '',
-                         aliases[self.action_type][1],
+                         self.aliases[self.action_type][1],
                          from_path, response.metadata.path_display))
         self.stdout.write(msg)
 
+    def _relocate_many(self, from_paths, to_path, parsed_args):
+        alias, action_done = self.aliases[self.action_type]
+        if self.action_type == 'copy':
+            def launch(batch):
+                return self.client.files_copy_batch_v2(
+                    batch, autorename=parsed_args.auto_rename)
+            check = self.client.files_copy_batch_check_v2
+        else:
+            def launch(batch):
+                return self.client.files_move_batch_v2(
+                    batch, autorename=parsed_args.auto_rename,
+                    allow_ownership_transfer=(
+                        parsed_args.allow_ownership_transfer))
+            check = self.client.files_move_batch_check_v2
+        entries = [
+            files.RelocationPath(from_path, '{0}/{1}'.format(
+                to_path.rstrip('/'), os.path.basename(from_path)))
+            for from_path in from_paths]
+        failed = 0
+        try:
+            for entry, result in self.run_batch_jobs(launch, check, entries):
+                if result.is_success():
+                    self.stdout.write(
+                        "'{0}' was successfully {1} as '{2}'.\n".format(
+                            entry.from_path, action_done,
+                            result.get_success().path_display))
+                else:
+                    failed += 1
+                    self.stdout.write(
+                        "{0}: cannot {1} from '{2}' to '{3}': {4}.\n".format(
+                            alias, self.action_type, entry.from_path,
+                            entry.to_path, result.get_failure()))
+        except exceptions.ApiError as exc:
+            msg = "{0}: cannot {1} to '{2}': {3}.".format(
+                alias, self.action_type, to_path, exc.error)
+            raise error.ActionException(msg) from exc
+        if failed:
+            raise error.ActionException(
+                "{0}: {1} of {2} path(s) could not be {3}.".format(
+                    alias, failed, len(entries), action_done))
+
+    def take_action(self, parsed_args):
+        from_paths = [utils.normalize_path(path)
+                      for path in parsed_args.from_path]
+        to_path = utils.normalize_path(parsed_args.to_path)
+        if len(from_paths) == 1:
+            self._relocate_one(from_paths[0], to_path, parsed_args)
+        else:
+            self._relocate_many(from_paths, to_path, parsed_args)
+
 
 class FileFolderCopy(BaseFileFolderAction):
     """
     Copies a file or folder to a different location in the user’s Dropbox.
 
     If the source path is a folder all its content will be copied.
+    Multiple paths are copied into a destination folder with batch requests.
     If destination path doesn't exist it will be created.
     """
 
@@ -369,6 +1232,7 @@ class FileFolderMove(BaseFileFolderAction):
     Moves a file or folder to a different location in the user’s Dropbox.
 
     If the source path is a folder all its content will be moved.
+    Multiple paths are moved into a destination folder with batch requests.
     If destination path doesn't exist it will be created.
     """
 
@@ -523,6 +1387,59 @@ class FileRevisionsList(base.BaseListCommand):
         return self.columns, data
 
 
+class FileHashList(base.BaseListCommand):
+    """
+    Shows Dropbox content hashes of local files.
+    """
+
+    columns = ('content_hash', 'path')
+
+    def get_parser(self, prog_name):
+        parser = super(FileHashList, self).get_parser(prog_name)
+        parser.add_argument(
+            'path',
+            nargs='+',
+            help='The paths to local files or directories. Directories are '
+                 'hashed recursively.'
+        )
+        parser.add_argument(
+            '-p', '--parallel',
+            type=int,
+            metavar='N',
+            help='Number of processes used to hash files. Defaults to the '
+                 'number of CPUs.'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Do not use the local hash cache.'
+        )
+        return parser
+
+    def take_action(self, parsed_args):
+        file_paths = []
+        for path in parsed_args.path:
+            if os.path.isdir(path):
+                file_paths.extend(sorted(utils.walk_files(path)))
+            elif os.path.isfile(path):
+                file_paths.append(path)
+            else:
+                msg = ("hash: cannot access '{0}': No such file or "
+                       "directory.".format(path))
+                raise error.ActionException(msg)
+        cache_path = ':memory:' if parsed_args.no_cache else None
+        hash_cache = hashing.HashCache(cache_path)
+        try:
+            hashes = hash_cache.get_content_hashes(
+                file_paths, workers=parsed_args.parallel)
+        finally:
+            hash_cache.close()
+        data = [{'content_hash': hashes[file_path], 'path': file_path}
+                for file_path in file_paths]
+        data = utils.get_display_data_multi(self.columns, data)
+        return self.columns, data
+
+
 class FileRestore(base.BaseCommand):
     """
     Restores file to a specified revision.
@@ -2,14 +2,19 @@
 #    Copyright 2017 Vitalii Kulanov
 #
 
-import os
-
-from dropbox import exceptions
+import collections
+import heapq
+import json
+import time
 
 from . import base
 from .. import error
+from ..common import engine
+from ..common import index
 from ..common import utils
 
+exceptions = utils.lazy_import('dropbox.exceptions')
+
 
 class FolderList(base.BaseListCommand, base.FileFolderMixIn):
     """
@@ -21,6 +26,29 @@ class FolderList(base.BaseListCommand, base.FileFolderMixIn):
     def _get_entry_name_by_type(self, entry):
         return entry.name if self.is_file(entry) else entry.name + '/'
 
+    def _iter_entries(self, path, response):
+        """Yields entries of all pages of a folder listing.
+
+        The next page is fetched by the transfer engine while entries of
+        the previous one are being consumed.
+        """
+        with engine.TransferEngine(self.client, concurrency=1) as transfer:
+            try:
+                yield from transfer.iterate(transfer.iter_folder(response))
+            except exceptions.ApiError as exc:
+                msg = "ls: cannot access '{0}': {1}".format(path, exc.error)
+                raise error.ActionException(msg) from exc
+
+    def _get_entry_data(self, entry, long_listing):
+        if not long_listing:
+            return {'name': self._get_entry_name_by_type(entry)}
+        return {'name': self._get_entry_name_by_type(entry),
+                'type': '-' if self.is_file(entry) else 'd',
+                'size': utils.convert_size(entry.size)
+                if self.is_file(entry) else '',
+                'last_modified': entry.server_modified.isoformat(' ')
+                if self.is_file(entry) else ''}
+
     def get_parser(self, prog_name):
         parser = super(FolderList, self).get_parser(prog_name)
         parser.add_argument(
@@ -34,30 +62,53 @@ class FolderList(base.BaseListCommand, base.FileFolderMixIn):
             action='store_true',
             help='Use a long listing format.'
         )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='The maximum number of entries fetched per request '
+                 '(page size). All pages are listed anyway, smaller pages '
+                 'make the first rows appear sooner. Defaults to the '
+                 'server page size.'
+        )
+        parser.add_argument(
+            '--cached',
+            action='store_true',
+            help="Read directory content from the local metadata index "
+                 "(see 'index sync') instead of Dropbox."
+        )
         return parser
 
+    def _iter_cached_entries(self, path):
+        metadata_index = index.MetadataIndex()
+        if metadata_index.is_empty():
+            raise error.ActionException(
+                "ls: metadata index is empty, run 'index sync' first.")
+        if path and not self.is_folder(metadata_index.get_metadata(path)):
+            raise error.ActionException(
+                "ls: cannot access '{0}': not found in the metadata "
+                "index".format(path))
+        return metadata_index.iter_folder(path)
+
     def take_action(self, parsed_args):
-        path = os.path.join('/', parsed_args.path) if parsed_args.path else ''
+        # The root folder is '' for the API and the metadata index.
+        path = utils.normalize_path(parsed_args.path or '').rstrip('/')
+        if parsed_args.long_listing:
+            self.columns = ('type', 'size', 'last_modified', 'name')
+        if parsed_args.cached:
+            data = (self._get_entry_data(entry, parsed_args.long_listing)
+                    for entry in self._iter_cached_entries(path))
+            return self.columns, utils.iter_display_data_multi(self.columns,
+                                                               data)
+        kwargs = {'limit': parsed_args.limit} if parsed_args.limit else {}
         try:
-            response = self.client.files_list_folder(path)
+            response = self.client.files_list_folder(path, **kwargs)
         except exceptions.ApiError as exc:
             msg = "ls: cannot access '{0}': {1}".format(
                 path, exc.error.get_path())
             raise error.ActionException(msg) from exc
-        if parsed_args.long_listing:
-            self.columns = ('type', 'size', 'last_modified', 'name')
-            data = [
-                {'name': self._get_entry_name_by_type(entry),
-                 'type': '-' if self.is_file(entry) else 'd',
-                 'size': utils.convert_size(entry.size)
-                         if self.is_file(entry) else '',
-                 'last_modified': entry.server_modified.isoformat(' ')
-                         if self.is_file(entry) else ''
-                 } for entry in response.entries]
-        else:
-            data = [{'name': self._get_entry_name_by_type(entry)}
-                    for entry in response.entries]
-        data = utils.get_display_data_multi(self.columns, data)
+        data = (self._get_entry_data(entry, parsed_args.long_listing)
+                for entry in self._iter_entries(path, response))
+        data = utils.iter_display_data_multi(self.columns, data)
         return self.columns, data
 
 
@@ -92,3 +143,197 @@ class FolderCreate(base.BaseCommand):
         msg = "A new folder was successfully created at '{0}'.\n".format(
             response.metadata.path_display)
         self.stdout.write(msg)
+
+
+class FolderSpaceUsageList(base.BaseListCommand, base.FileFolderMixIn):
+    """
+    Shows space used by a folder and its subfolders.
+    """
+
+    columns = ('size', 'files', 'path')
+
+    @staticmethod
+    def aggregate(items, root, max_depth=None):
+        """Rolls file sizes up the directory tree in a single pass.
+
+        :param items:     Iterable of (path, size) tuples of files
+                          located under the root folder
+        :param root:      Path of the root folder, '' for the Dropbox root
+        :param max_depth: Maximum depth of folders to report relative to
+                          the root, None for unlimited
+        :return:          Tuple of two dictionaries mapping folder paths to
+                          the total size and the number of files in them
+        """
+
+        sizes = collections.defaultdict(int)
+        counts = collections.defaultdict(int)
+        root = root.rstrip('/')
+        offset = len(root)
+        for path, size in items:
+            parts = path[offset:].split('/')[1:-1]
+            if max_depth is not None:
+                parts = parts[:max_depth]
+            folder = root or '/'
+            sizes[folder] += size
+            counts[folder] += 1
+            folder = root
+            for part in parts:
+                folder = '{0}/{1}'.format(folder, part)
+                sizes[folder] += size
+                counts[folder] += 1
+        return sizes, counts
+
+    def _iter_file_sizes(self, path):
+        try:
+            response = self.client.files_list_folder(path, recursive=True)
+            while True:
+                for entry in response.entries:
+                    if self.is_file(entry):
+                        yield entry.path_display, entry.size
+                if not response.has_more:
+                    break
+                response = self.client.files_list_folder_continue(
+                    response.cursor)
+        except exceptions.ApiError as exc:
+            msg = "du: cannot access '{0}': {1}".format(path, exc.error)
+            raise error.ActionException(msg) from exc
+
+    @staticmethod
+    def _iter_cached_file_sizes(path):
+        metadata_index = index.MetadataIndex()
+        if metadata_index.is_empty():
+            raise error.ActionException(
+                "du: metadata index is empty, run 'index sync' first.")
+        return metadata_index.iter_file_sizes(path)
+
+    def get_parser(self, prog_name):
+        parser = super(FolderSpaceUsageList, self).get_parser(prog_name)
+        parser.add_argument(
+            'path',
+            nargs='?',
+            help='The path of the directory to summarize. '
+                 'Defaults to the root.'
+        )
+        parser.add_argument(
+            '-d', '--max-depth',
+            type=int,
+            help='Show totals for folders only N or fewer levels below '
+                 'the path. Defaults to unlimited.'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            metavar='N',
+            help='Show only N largest folders sorted by size.'
+        )
+        parser.add_argument(
+            '--cached',
+            action='store_true',
+            help="Read file sizes from the local metadata index "
+                 "(see 'index sync') instead of Dropbox."
+        )
+        return parser
+
+    def take_action(self, parsed_args):
+        path = ''
+        if parsed_args.path:
+            path = utils.normalize_path(parsed_args.path).rstrip('/')
+        if parsed_args.cached:
+            items = self._iter_cached_file_sizes(path)
+        else:
+            items = self._iter_file_sizes(path)
+        sizes, counts = self.aggregate(items, path, parsed_args.max_depth)
+        if parsed_args.top:
+            folders = heapq.nlargest(parsed_args.top, sizes, key=sizes.get)
+        else:
+            folders = sorted(sizes)
+        data = ({'size': utils.convert_size(sizes[folder]),
+                 'files': counts[folder],
+                 'path': folder} for folder in folders)
+        return self.columns, utils.iter_display_data_multi(self.columns, data)
+
+
+class FolderWatch(base.BaseCommand, base.FileFolderMixIn):
+    """
+    Watches a folder for changes and prints them as JSON lines.
+
+    Changes are awaited with long polling, so no requests are made
+    until Dropbox signals that the folder content has changed.
+    """
+
+    def _get_entry_data(self, entry):
+        data = {'type': self.get_entity_type(entry),
+                'name': entry.name,
+                'path': entry.path_display or entry.path_lower}
+        if self.is_file(entry):
+            data.update({'id': entry.id,
+                         'size': entry.size,
+                         'revision': entry.rev,
+                         'content_hash': entry.content_hash,
+                         'server_modified': entry.server_modified.isoformat()})
+        elif self.is_folder(entry):
+            data['id'] = entry.id
+        return data
+
+    def _write_changes(self, cursor):
+        """Fetches all changes since the cursor and writes them out.
+
+        :return: the latest cursor
+        """
+        has_more = True
+        while has_more:
+            response = self.client.files_list_folder_continue(cursor)
+            for entry in response.entries:
+                self.stdout.write(json.dumps(self._get_entry_data(entry)))
+                self.stdout.write('\n')
+            self.stdout.flush()
+            cursor, has_more = response.cursor, response.has_more
+        return cursor
+
+    def get_parser(self, prog_name):
+        parser = super(FolderWatch, self).get_parser(prog_name)
+        parser.add_argument(
+            'path',
+            nargs='?',
+            help='The path of the directory to watch. Defaults to the root.'
+        )
+        parser.add_argument(
+            '-r', '--recursive',
+            action='store_true',
+            help='Watch for changes in all subfolders too.'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=30,
+            help='Maximum time in seconds a single long polling request '
+                 'waits for changes (from 30 to 480). Defaults to 30.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit after the first set of changes has been printed.'
+        )
+        return parser
+
+    def take_action(self, parsed_args):
+        path = ''
+        if parsed_args.path:
+            path = utils.normalize_path(parsed_args.path).rstrip('/')
+        try:
+            cursor = self.client.files_list_folder_get_latest_cursor(
+                path, recursive=parsed_args.recursive).cursor
+            while True:
+                response = self.client.files_list_folder_longpoll(
+                    cursor, timeout=parsed_args.timeout)
+                if response.changes:
+                    cursor = self._write_changes(cursor)
+                    if parsed_args.once:
+                        break
+                if response.backoff:
+                    time.sleep(response.backoff)
+        except exceptions.ApiError as exc:
+            msg = "watch: cannot watch '{0}': {1}".format(path, exc.error)
+            raise error.ActionException(msg) from exc
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,47 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import time
+
+from . import base
+from .. import error
+from ..common import index
+from ..common import utils
+
+exceptions = utils.lazy_import('dropbox.exceptions')
+
+
+class IndexSync(base.BaseCommand):
+    """
+    Synchronizes the local metadata index with Dropbox.
+
+    The first run lists the whole Dropbox, the next ones fetch only changes.
+    """
+
+    def get_parser(self, prog_name):
+        parser = super(IndexSync, self).get_parser(prog_name)
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Drop the local index and build it from scratch.'
+        )
+        return parser
+
+    def take_action(self, parsed_args):
+        metadata_index = index.MetadataIndex()
+        started = time.monotonic()
+        try:
+            if parsed_args.reset:
+                metadata_index.reset()
+            applied = metadata_index.sync(self.client)
+        except exceptions.ApiError as exc:
+            msg = "index: cannot synchronize metadata index: {0}.".format(
+                exc.error)
+            raise error.ActionException(msg) from exc
+        finally:
+            metadata_index.close()
+        msg = ("Metadata index was successfully synchronized: {0} change(s) "
+               "applied in {1:.2f}s.\n".format(applied,
+                                               time.monotonic() - started))
+        self.stdout.write(msg)
@@ -0,0 +1,239 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import os
+import time
+
+from . import base
+from .. import error
+from ..common import engine
+from ..common import utils
+
+exceptions = utils.lazy_import('dropbox.exceptions')
+files = utils.lazy_import('dropbox.files')
+
+
+class Sync(base.BaseCommand, base.FileFolderMixIn, base.UploadMixIn):
+    """
+    Synchronizes content of a local directory and a Dropbox folder.
+
+    By default changes are uploaded from the local directory to Dropbox,
+    use --download to synchronize in the reverse direction. Only files
+    that are missing or differ by size or content hash are transferred.
+    """
+
+    def _list_remote(self, path):
+        """Returns files of a Dropbox folder tree.
+
+        :return: dictionary mapping lower-case relative paths to
+                 (path, size, content hash) tuples
+        """
+        entries = {}
+        offset = len(path) + 1
+        try:
+            response = self.client.files_list_folder(path, recursive=True)
+            while True:
+                for entry in response.entries:
+                    if self.is_file(entry):
+                        entries[entry.path_lower[offset:]] = (
+                            entry.path_display, entry.size,
+                            entry.content_hash)
+                if not response.has_more:
+                    break
+                response = self.client.files_list_folder_continue(
+                    response.cursor)
+        except exceptions.ApiError as exc:
+            lookup_error = (exc.error.get_path()
+                            if isinstance(exc.error, files.ListFolderError)
+                            and exc.error.is_path() else None)
+            if lookup_error is None or not lookup_error.is_not_found():
+                msg = "sync: cannot access '{0}': {1}.".format(path,
+                                                               exc.error)
+                raise error.ActionException(msg) from exc
+        return entries
+
+    @staticmethod
+    def _list_local(path):
+        """Returns files of a local directory tree.
+
+        :return: dictionary mapping lower-case relative paths to
+                 (path, size) tuples
+        """
+        entries = {}
+        if not os.path.isdir(path):
+            return entries
+        for file_path in utils.walk_files(path):
+            rel_path = os.path.relpath(file_path, path).replace(os.sep, '/')
+            entries[rel_path.lower()] = (file_path,
+                                         os.path.getsize(file_path))
+        return entries
+
+    def _get_local_hashes(self, local, remote):
+        """Returns content hashes of local files having a remote match.
+
+        Only files of the same size as their remote counterpart are hashed,
+        hashes of unchanged files are taken from the local hash cache.
+        """
+
+        candidates = [path for key, (path, size) in local.items()
+                      if key in remote and remote[key][1] == size]
+        return self.hash_cache.get_content_hashes(candidates)
+
+    def get_plan(self, local_path, remote_path, download=False, delete=False):
+        """Compares both sides and returns a list of actions to perform.
+
+        :param local_path: path to the local directory
+        :param remote_path: path of the Dropbox folder, '' for the root
+        :param download: whether to synchronize from Dropbox to local
+        :param delete: whether to delete files missing on the source side
+        :return: list of (action, source, destination) tuples, where
+                 action is 'upload', 'download' or 'delete' and destination
+                 is None for deletes
+        """
+        local = self._list_local(local_path)
+        remote = self._list_remote(remote_path)
+        hashes = self._get_local_hashes(local, remote)
+        plan = []
+        if download:
+            for key, (path, size, content_hash) in sorted(remote.items()):
+                rel_path = path[len(remote_path) + 1:]
+                if key not in local:
+                    plan.append(('download', path, os.path.join(
+                        local_path, *rel_path.split('/'))))
+                elif hashes.get(local[key][0]) != content_hash:
+                    plan.append(('download', path, local[key][0]))
+            if delete:
+                plan.extend(('delete', path, None) for key, (path, _)
+                            in sorted(local.items()) if key not in remote)
+        else:
+            for key, (path, size) in sorted(local.items()):
+                rel_path = os.path.relpath(path, local_path)
+                if key in remote and hashes.get(path) == remote[key][2]:
+                    continue
+                plan.append(('upload', path, '{0}/{1}'.format(
+                    remote_path, rel_path.replace(os.sep, '/'))))
+            if delete:
+                plan.extend(('delete', path, None) for key, (path, _, _)
+                            in sorted(remote.items()) if key not in local)
+        return plan
+
+    def _upload(self, src, dst, chunk_size):
+        return self.upload_local_file(src, dst, chunk_size,
+                                      mode=files.WriteMode.overwrite)
+
+    def _download(self, src, dst):
+        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+        return self.client.files_download_to_file(dst, src)
+
+    def _delete(self, path, download):
+        if download:
+            os.remove(path)
+        else:
+            self.client.files_delete_v2(path)
+
+    def _perform(self, action, src, dst, chunk_size, download):
+        if action == 'upload':
+            self._upload(src, dst, chunk_size)
+        elif action == 'download':
+            self._download(src, dst)
+        else:
+            self._delete(src, download)
+
+    @staticmethod
+    def _describe(action, src, dst):
+        if dst is None:
+            return "{0}: '{1}'".format(action, src)
+        return "{0}: '{1}' -> '{2}'".format(action, src, dst)
+
+    def get_parser(self, prog_name):
+        parser = super(Sync, self).get_parser(prog_name)
+        parser.add_argument(
+            'local',
+            metavar='LOCAL_DIR',
+            help='The path of the local directory.'
+        )
+        parser.add_argument(
+            'remote',
+            metavar='DROPBOX_DIR',
+            nargs='?',
+            help='The path of the Dropbox folder. Defaults to the root.'
+        )
+        parser.add_argument(
+            '--download',
+            action='store_true',
+            help='Synchronize from Dropbox to the local directory instead '
+                 'of uploading local changes.'
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete files that do not exist on the source side.'
+        )
+        parser.add_argument(
+            '-n', '--dry-run',
+            action='store_true',
+            help='Only show what would be transferred or deleted.'
+        )
+        parser.add_argument(
+            '-p', '--parallel',
+            type=int,
+            default=4,
+            metavar='N',
+            help='Number of files transferred concurrently. Defaults to 4.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10,
+            help='Chunk size of a file content to be uploaded per request '
+                 'in megabytes. Defaults to 10 MB.'
+        )
+        return parser
+
+    def take_action(self, parsed_args):
+        local_path = os.path.normpath(parsed_args.local)
+        remote_path = ''
+        if parsed_args.remote:
+            remote_path = utils.normalize_path(parsed_args.remote).rstrip('/')
+        if not parsed_args.download and not os.path.isdir(local_path):
+            raise error.ActionException(
+                "sync: '{0}' is not a directory.".format(parsed_args.local))
+        started = time.monotonic()
+        plan = self.get_plan(local_path, remote_path,
+                             download=parsed_args.download,
+                             delete=parsed_args.delete)
+        if parsed_args.dry_run:
+            for action, src, dst in plan:
+                self.stdout.write(self._describe(action, src, dst) + '\n')
+            self.stdout.write("{0} action(s) planned.\n".format(len(plan)))
+            return
+        chunk_size = utils.to_megabytes(parsed_args.chunk_size)
+        download = parsed_args.download
+
+        async def perform(item):
+            try:
+                await transfer.call(self._perform, *item,
+                                    chunk_size=chunk_size, download=download)
+            except (exceptions.ApiError, IOError, OSError) as exc:
+                return item, exc.error if hasattr(exc, 'error') else exc
+            return item, None
+
+        failed = 0
+        with engine.TransferEngine(self.client,
+                                   max(parsed_args.parallel, 1)) as transfer:
+            for item, reason in transfer.iterate(
+                    transfer.map_unordered(perform, plan)):
+                description = self._describe(*item)
+                if reason is not None:
+                    failed += 1
+                    self.stdout.write("{0} failed: {1}\n".format(
+                        description, reason))
+                else:
+                    self.stdout.write(description + '\n')
+        self.stdout.write("{0} action(s) performed in {1:.2f}s.\n".format(
+            len(plan) - failed, time.monotonic() - started))
+        if failed:
+            msg = "sync: {0} of {1} action(s) failed.".format(failed,
+                                                              len(plan))
+            raise error.ActionException(msg)
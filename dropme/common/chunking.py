@@ -0,0 +1,96 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import logging
+import socket
+
+from . import utils
+
+LOG = logging.getLogger(__name__)
+
+
+class ChunkSizer(object):
+    """Adapts the size of uploaded chunks to the measured throughput.
+
+    Large chunks amortize the latency of every request on fast links,
+    small ones limit the amount of data resent by a retry on lossy ones.
+    After every request the size of the next chunk is set to the amount
+    of data the link is expected to transfer in TARGET_DURATION seconds,
+    judging by the smoothed throughput of previous requests (including
+    their latency and retries). The size changes at most twice per
+    request and stays a multiple of 4 MB within the limits of the API.
+
+    The last size is stored per host in a local file, so later uploads
+    start near the best value.
+    """
+
+    # Requests of all sizes are aligned to, as chunks of concurrent
+    # upload sessions must be.
+    ALIGNMENT = 4 * 1024 * 1024
+    MIN_CHUNK_SIZE = ALIGNMENT
+    # The largest aligned size below the 150 MB limit of a request.
+    MAX_CHUNK_SIZE = 148 * 1024 * 1024
+    # Chunk size used if there is no stored one.
+    DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+    # Duration of a single request in seconds the size aims at.
+    TARGET_DURATION = 4.0
+    # Weight of the last measurement in the smoothed throughput.
+    SMOOTHING = 0.5
+
+    def __init__(self, file_path=None, host=None):
+        """
+        :param file_path: path of a file with stored chunk sizes
+        :param host: name of the host sizes are stored for, defaults to
+                     the host name of the machine
+        """
+
+        self.file_path = file_path or utils.get_cache_path(
+            'chunk_sizes.json')
+        self.host = host or socket.gethostname()
+        self.throughput = None
+        self.size = self._align(self._load().get(self.host,
+                                                 self.DEFAULT_CHUNK_SIZE))
+
+    def _load(self):
+        return utils.load_json_dict(self.file_path)
+
+    def save(self):
+        """Stores the current chunk size for the host.
+
+        Sizes are reloaded and merged under a file lock, so concurrent
+        uploads keep sizes stored by each other. The size is only a hint
+        for later uploads, so a failure to store it is logged and ignored.
+        """
+
+        try:
+            with utils.file_lock(self.file_path):
+                sizes = self._load()
+                sizes[self.host] = self.size
+                utils.dump_json(self.file_path, sizes)
+        except OSError as exc:
+            LOG.warning("Could not store the chunk size: %s.", exc)
+
+    def _align(self, size):
+        size = int(round(size / float(self.ALIGNMENT))) * self.ALIGNMENT
+        return min(max(size, self.MIN_CHUNK_SIZE), self.MAX_CHUNK_SIZE)
+
+    def observe(self, nbytes, duration):
+        """Sets the size of the next chunk after a request.
+
+        :param nbytes: number of bytes sent by the request
+        :param duration: duration of the request in seconds
+        :return: size of the next chunk in bytes
+        """
+
+        if nbytes <= 0 or duration <= 0:
+            return self.size
+        throughput = nbytes / duration
+        if self.throughput is None:
+            self.throughput = throughput
+        else:
+            self.throughput += self.SMOOTHING * (throughput - self.throughput)
+        size = self.throughput * self.TARGET_DURATION
+        self.size = self._align(min(max(size, self.size / 2.0),
+                                    self.size * 2.0))
+        return self.size
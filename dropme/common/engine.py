@@ -0,0 +1,283 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import os
+import time
+
+from . import fileio
+from . import tracing
+from . import utils
+
+files = utils.lazy_import('dropbox.files')
+
+
+class TransferEngine(object):
+    """Runs bulk transfers concurrently on an asyncio event loop.
+
+    The Dropbox SDK is blocking, so API calls are executed by a bounded
+    pool of threads sharing the connection pool of the client, while
+    scheduling and back-pressure are done by the event loop. Commands stay
+    synchronous and hand work over with run() and iterate():
+
+        with TransferEngine(client, concurrency=8) as engine:
+            for result in engine.iterate(engine.map_unordered(func, items)):
+                ...
+    """
+
+    # Size of a block of a downloaded file written at once.
+    DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, client, concurrency=8):
+        """
+        :param client: Dropbox client
+        :param concurrency: maximum number of API calls in flight
+        """
+
+        self.client = client
+        self.concurrency = max(concurrency, 1)
+        self._loop = None
+        self._executor = None
+        self._buffers = None
+
+    def __enter__(self):
+        self._loop = asyncio.new_event_loop()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            self.concurrency)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self._loop.run_until_complete(
+                    asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        finally:
+            self._loop.close()
+            self._executor.shutdown(wait=True)
+            self._loop = self._executor = self._buffers = None
+
+    def run(self, coroutine):
+        """Runs a coroutine to completion and returns its result."""
+
+        return self._loop.run_until_complete(coroutine)
+
+    def iterate(self, iterator):
+        """Yields items of an asynchronous iterator synchronously."""
+
+        iterator = iterator.__aiter__()
+        while True:
+            try:
+                yield self.run(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+
+    async def call(self, func, *args, **kwargs):
+        """Runs a blocking function in the pool of worker threads."""
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    async def map_unordered(self, func, items, limit=None):
+        """Applies a coroutine function to items concurrently.
+
+        Items are taken lazily and at most 'limit' of them are processed
+        at a time, so memory use does not depend on the number of items.
+
+        :param func: coroutine function taking a single item
+        :param items: iterable or asynchronous iterable of items, e.g. of
+                      iter_folder()
+        :param limit: maximum number of items in progress, defaults to
+                      twice the concurrency
+        :return: asynchronous iterator of results in completion order
+        """
+
+        limit = limit or self.concurrency * 2
+        if hasattr(items, '__aiter__'):
+            items = items.__aiter__()
+        else:
+            items = _AsyncIterator(items)
+        pending = set()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < limit:
+                    try:
+                        item = await items.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                    else:
+                        pending.add(asyncio.ensure_future(func(item)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def upload_to_session(self, file_src, chunk_size):
+        """Uploads file content to a new upload session and closes it.
+
+        A chunk is read only when it can be sent right away and at most
+        'concurrency' chunks of all uploads are held in memory at a time.
+
+        :return: cursor pointing to the end of the uploaded data
+        """
+
+        if self._buffers is None:
+            # Created here to be bound to the loop of the engine.
+            self._buffers = asyncio.Semaphore(self.concurrency)
+        with fileio.ChunkReader(file_src) as reader:
+            cursor = None
+            close = False
+            while not close:
+                offset = 0 if cursor is None else cursor.offset
+                async with self._buffers:
+                    data = await self.call(reader.read, offset, chunk_size)
+                    # The session is closed at the end of a truncated file
+                    # too, the commit then fails on the size mismatch.
+                    close = (not data or
+                             offset + len(data) >= reader.size)
+                    if cursor is None:
+                        session_start = await self.call(
+                            self.client.files_upload_session_start, data,
+                            close=close)
+                        cursor = files.UploadSessionCursor(
+                            session_id=session_start.session_id, offset=0)
+                    else:
+                        await self.call(
+                            self.client.files_upload_session_append_v2,
+                            data, cursor, close=close)
+                reader.release(offset, len(data))
+                cursor.offset += len(data)
+        return cursor
+
+    def _download_range(self, path, fd, offset, length, callback):
+        headers = {'Range': 'bytes={0}-{1}'.format(offset,
+                                                   offset + length - 1)}
+        _, response = self.client.files_download(path, extra_headers=headers)
+        start, end = offset, offset + length
+        if response.status_code != 206:
+            response.close()
+            raise IOError('Byte range {0}-{1} of {2} was not returned, got '
+                          'HTTP status {3}'.format(start, end - 1, path,
+                                                   response.status_code))
+
+        def write(block):
+            nonlocal offset
+            if offset + len(block) > end:
+                raise IOError('Byte range {0}-{1} of {2} got more data than '
+                              'requested'.format(start, end - 1, path))
+            os.pwrite(fd, block, offset)
+            offset += len(block)
+
+        write_response(response, write, length, callback,
+                       self.DOWNLOAD_BLOCK_SIZE)
+        if offset != end:
+            raise IOError('Byte range {0}-{1} of {2} got {3} bytes only'
+                          ''.format(start, end - 1, path, offset - start))
+
+    async def download_range(self, path, fd, offset, length, callback=None):
+        """Downloads a byte range of a file to an open file descriptor.
+
+        IOError is raised unless the server returns the range (HTTP 206)
+        with exactly 'length' bytes.
+
+        :param path: path or 'rev:<revision>' of the file in Dropbox
+        :param fd: file descriptor to write data to at the same offset
+        :param offset: offset of the range in bytes
+        :param length: length of the range in bytes
+        :param callback: function called with the size of every written
+                         block
+        :return: offset of the range
+        """
+
+        await self.call(self._download_range, path, fd, offset, length,
+                        callback)
+        return offset
+
+    async def download_to_file(self, dst_path, path, rev=None):
+        """Downloads a file at once and returns its metadata."""
+
+        return await self.call(self.client.files_download_to_file,
+                               dst_path, path, rev=rev)
+
+    async def iter_folder(self, response):
+        """Yields entries of all pages of a folder listing.
+
+        The next page is requested while entries of the current one are
+        being consumed. The request runs in a worker thread, so it goes on
+        even when the event loop is idle between iterations.
+
+        :param response: the first page of the listing
+        """
+
+        while True:
+            next_page = None
+            if response.has_more:
+                next_page = asyncio.ensure_future(self.call(
+                    self.client.files_list_folder_continue, response.cursor))
+            for entry in response.entries:
+                yield entry
+            if next_page is None:
+                return
+            response = await next_page
+
+
+class _AsyncIterator(object):
+    """Asynchronous iterator over items of a regular iterable."""
+
+    def __init__(self, items):
+        self._items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def write_response(response, write, length, callback=None,
+                   block_size=TransferEngine.DOWNLOAD_BLOCK_SIZE):
+    """Writes the body of a download response block by block.
+
+    Time spent waiting for the network and writing blocks is recorded as
+    'network.read' and 'file.write' spans.
+
+    :param response: streamed HTTP response of a download request
+    :param write: function writing a block of data
+    :param length: expected length of the body in bytes
+    :param callback: function called with the size of every written block
+    :param block_size: size of a block in bytes
+    """
+
+    started = time.perf_counter()
+    network = disk = 0.0
+    with contextlib.closing(response):
+        blocks = iter(response.iter_content(block_size))
+        while True:
+            before_read = time.perf_counter()
+            block = next(blocks, None)
+            before_write = time.perf_counter()
+            network += before_write - before_read
+            if block is None:
+                break
+            write(block)
+            disk += time.perf_counter() - before_write
+            if callback is not None:
+                callback(len(block))
+    tracing.record('network.read', started, network, length)
+    tracing.record('file.write', started, disk, length)
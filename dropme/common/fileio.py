@@ -0,0 +1,229 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+"""Reading of local files uploaded in chunks.
+
+Chunks are read with positional reads of an unbuffered file descriptor
+straight into the bytes object passed to the Dropbox SDK, so a chunk is
+copied only once in user space and no buffered copy of it is kept. The
+SDK accepts nothing but bytes as a request body, so memory mappings and
+memoryview slices would have to be copied into bytes anyway.
+
+The kernel is advised that files are read sequentially, and pages of
+chunks which have been sent are dropped from the page cache, so uploading
+huge files does not evict data of other processes from it.
+
+ReadAhead overlaps reading of the next chunks with sending of the current
+one, so sequential uploads from slow disks or network storage run at the
+speed of the slower of the two.
+"""
+
+import os
+import queue
+import threading
+
+from . import tracing
+
+
+def _advise(fd, offset, length, advice):
+    # posix_fadvise is not available e.g. on macOS, hints are only an
+    # optimization, so their failures are ignored as well.
+    advice = getattr(os, advice, None)
+    if advice is not None and hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, offset, length, advice)
+        except OSError:
+            pass
+
+
+class ChunkReader(object):
+    """Reads chunks of a file at arbitrary offsets.
+
+    Reads do not move a shared file position, so a reader can be used by
+    many threads at the same time:
+
+        with ChunkReader(path) as reader:
+            data = reader.read(offset, chunk_size)
+            ...
+            reader.release(offset, len(data))
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        try:
+            self.size = os.fstat(self.fd).st_size
+        except OSError:
+            os.close(self.fd)
+            raise
+        _advise(self.fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def read(self, offset, length=None):
+        """Reads a chunk recording a 'file.read' span.
+
+        :param offset: offset of the chunk in bytes
+        :param length: maximum length of the chunk, defaults to the rest
+                       of the file
+        :return: bytes, shorter than length only at the end of the file
+        """
+
+        if length is None:
+            length = max(self.size - offset, 0)
+        with tracing.span('file.read') as current:
+            data = os.pread(self.fd, length, offset)
+            # Reads of regular files are short only at the end of file or
+            # for lengths over 2 GB on Linux.
+            if 0 < len(data) < length:
+                parts = [data]
+                read = len(data)
+                while read < length:
+                    part = os.pread(self.fd, length - read, offset + read)
+                    if not part:
+                        break
+                    parts.append(part)
+                    read += len(part)
+                data = b''.join(parts)
+            if current is not None:
+                current.bytes = len(data)
+        return data
+
+    def release(self, offset, length):
+        """Drops pages of a chunk which has been sent from the page cache."""
+
+        if length:
+            _advise(self.fd, offset, length, 'POSIX_FADV_DONTNEED')
+
+
+def read_stream(stream, size):
+    """Reads a chunk of a binary stream recording a 'file.read' span.
+
+    :return: bytes, shorter than size only at the end of the stream
+    """
+
+    with tracing.span('file.read') as current:
+        parts = []
+        read = 0
+        # Reads of pipes and sockets may return less than requested.
+        while read < size:
+            part = stream.read(size - read)
+            if not part:
+                break
+            parts.append(part)
+            read += len(part)
+        data = parts[0] if len(parts) == 1 else b''.join(parts)
+        if current is not None:
+            current.bytes = len(data)
+    return data
+
+
+class ReadAhead(object):
+    """Prefetches sequential chunks of a file in a background thread.
+
+    Up to 'depth' chunks are read ahead of the chunk which is being sent,
+    so at most depth + 2 chunks are held in memory. Chunks are requested
+    by offset; a request of an offset other than the end of the previous
+    chunk (e.g. after a retry) restarts reading ahead from that offset:
+
+        with ReadAhead(reader, chunk_size) as chunks:
+            data = chunks.read(offset)
+
+    Time the consumer waits for chunks is recorded as 'readahead.wait'
+    spans, reads themselves as 'file.read' spans of the reader.
+    """
+
+    # Number of chunks read ahead by default.
+    DEPTH = 2
+
+    def __init__(self, reader, chunk_size, depth=DEPTH):
+        """
+        :param reader: ChunkReader of the file
+        :param chunk_size: size of a chunk in bytes
+        :param depth: maximum number of prefetched chunks, 0 to read
+                      chunks only when they are requested
+        """
+
+        self.reader = reader
+        self.chunk_size = chunk_size
+        self.depth = max(depth, 0)
+        self._queue = None
+        self._stopped = None
+        self._thread = None
+        self._next_offset = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _produce(self, offset, chunks, stopped):
+        try:
+            while not stopped.is_set():
+                data = b''
+                if offset < self.reader.size:
+                    data = self.reader.read(offset, self.chunk_size)
+                chunks.put(data)
+                if not data:
+                    return
+                offset += len(data)
+        except Exception as exc:
+            chunks.put(exc)
+
+    def _start(self, offset):
+        self.close()
+        self._queue = queue.Queue(self.depth)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._produce, args=(offset, self._queue, self._stopped),
+            name='dropme-read-ahead', daemon=True)
+        self._thread.start()
+        self._next_offset = offset
+
+    def close(self):
+        """Stops reading ahead and drops prefetched chunks."""
+
+        if self._thread is None:
+            return
+        self._stopped.set()
+        # The thread may be blocked on the full queue.
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        self._thread.join()
+        self._queue = self._stopped = self._thread = None
+        self._next_offset = None
+
+    def read(self, offset):
+        """Returns the chunk at an offset, b'' at the end of the file."""
+
+        if self.depth == 0:
+            return self.reader.read(offset, self.chunk_size)
+        if offset != self._next_offset:
+            self._start(offset)
+        with tracing.span('readahead.wait') as current:
+            data = self._queue.get()
+            if current is not None and isinstance(data, bytes):
+                current.bytes = len(data)
+        if isinstance(data, Exception):
+            self.close()
+            raise data
+        if not data:
+            # The thread has finished at the end of the file.
+            self.close()
+        else:
+            self._next_offset = offset + len(data)
+        return data
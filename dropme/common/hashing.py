@@ -0,0 +1,145 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import threading
+
+from . import utils
+
+
+# Dropbox content hash is computed over blocks of 4 MB.
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def content_hash(file_path, block_size=BLOCK_SIZE):
+    """Computes Dropbox content hash of a local file.
+
+    The file is split into 4 MB blocks, each block is hashed with SHA-256
+    and the concatenation of the block hashes is hashed with SHA-256 again.
+    The file is read block by block, so memory use does not depend on its
+    size.
+
+    :param file_path: path to the local file
+    :param block_size: size of a block in bytes
+    :return: hex digest of the content hash
+    """
+
+    overall = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            overall.update(hashlib.sha256(block).digest())
+    return overall.hexdigest()
+
+
+class HashCache(object):
+    """Persistent cache of content hashes of local files.
+
+    Hashes are keyed by device and inode of a file and are valid only
+    while the size and the modification time of the file stay the same,
+    so unchanged files are never read again.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS hashes (
+        device INTEGER NOT NULL,
+        inode INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        content_hash TEXT NOT NULL,
+        PRIMARY KEY (device, inode)
+    );
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path or utils.get_cache_path('hashes.sqlite')
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.file_path,
+                                               check_same_thread=False)
+            self._connection.executescript(self.SCHEMA)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def get(self, stat):
+        """Returns a cached content hash of a file or None.
+
+        :param stat: os.stat_result of the file
+        """
+
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT content_hash FROM hashes WHERE device = ? AND "
+                "inode = ? AND size = ? AND mtime_ns = ?",
+                (stat.st_dev, stat.st_ino, stat.st_size,
+                 stat.st_mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def set(self, stat, value):
+        """Stores a content hash of a file.
+
+        :param stat: os.stat_result of the file
+        :param value: content hash of the file
+        """
+
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+                (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                 value))
+
+    def get_content_hash(self, file_path):
+        """Returns a content hash of a file, computing it if needed."""
+
+        stat = os.stat(file_path)
+        value = self.get(stat)
+        if value is None:
+            value = content_hash(file_path)
+            self.set(stat, value)
+        return value
+
+    def get_content_hashes(self, file_paths, workers=None):
+        """Returns content hashes of many files.
+
+        Files which are not cached are hashed by a pool of worker
+        processes, so large trees are hashed on all CPU cores.
+
+        :param file_paths: iterable of paths to local files
+        :param workers: number of worker processes, defaults to the
+                        number of CPUs
+        :return: dictionary mapping file paths to their content hashes
+        """
+
+        hashes = {}
+        cold = []
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            value = self.get(stat)
+            if value is None:
+                cold.append((file_path, stat))
+            else:
+                hashes[file_path] = value
+        if len(cold) == 1 or workers == 1:
+            values = [content_hash(file_path) for file_path, _ in cold]
+        elif cold:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                values = list(executor.map(
+                    content_hash, [file_path for file_path, _ in cold],
+                    chunksize=16))
+        else:
+            values = []
+        for (file_path, stat), value in zip(cold, values):
+            self.set(stat, value)
+            hashes[file_path] = value
+        return hashes
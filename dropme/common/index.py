@@ -0,0 +1,211 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import datetime
+import posixpath
+import sqlite3
+
+from . import utils
+
+exceptions = utils.lazy_import('dropbox.exceptions')
+files = utils.lazy_import('dropbox.files')
+
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path_lower TEXT PRIMARY KEY,
+    parent_lower TEXT NOT NULL,
+    path_display TEXT,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    id TEXT,
+    size INTEGER,
+    rev TEXT,
+    content_hash TEXT,
+    client_modified TEXT,
+    server_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent_lower);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _format_datetime(value):
+    return value.strftime(DATETIME_FORMAT) if value else None
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    return datetime.datetime.strptime(value, DATETIME_FORMAT)
+
+
+class MetadataIndex(object):
+    """Local SQLite index of metadata of all files and folders.
+
+    The index is built with a recursive folder listing once and then kept
+    up to date by applying only changes returned for the stored cursor.
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path or utils.get_cache_path('metadata.sqlite')
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.file_path)
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @staticmethod
+    def _get_parent(path_lower):
+        return posixpath.dirname(path_lower)
+
+    @property
+    def cursor(self):
+        """Cursor of the last applied listing page or None."""
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE key = 'cursor'").fetchone()
+        return row[0] if row else None
+
+    def is_empty(self):
+        return self.cursor is None
+
+    def reset(self):
+        """Removes all entries and the cursor from the index."""
+        with self.connection:
+            self.connection.execute("DELETE FROM entries")
+            self.connection.execute("DELETE FROM state")
+
+    def _apply_entry(self, entry):
+        path_lower = entry.path_lower
+        if isinstance(entry, files.DeletedMetadata):
+            self.connection.execute(
+                "DELETE FROM entries WHERE path_lower = ? "
+                "OR path_lower LIKE ? ESCAPE '\\'",
+                (path_lower, self._escape_like(path_lower) + '/%'))
+            return
+        is_file = isinstance(entry, files.FileMetadata)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO entries VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path_lower, self._get_parent(path_lower), entry.path_display,
+             entry.name, 'file' if is_file else 'folder', entry.id,
+             entry.size if is_file else None,
+             entry.rev if is_file else None,
+             entry.content_hash if is_file else None,
+             _format_datetime(entry.client_modified) if is_file else None,
+             _format_datetime(entry.server_modified) if is_file else None))
+
+    @staticmethod
+    def _escape_like(value):
+        return (value.replace('\\', '\\\\').replace('%', '\\%')
+                .replace('_', '\\_'))
+
+    def apply(self, response):
+        """Applies a page of a folder listing and stores its cursor.
+
+        :param response: ListFolderResult object
+        :return: number of applied entries
+        """
+
+        with self.connection:
+            for entry in response.entries:
+                self._apply_entry(entry)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO state VALUES ('cursor', ?)",
+                (response.cursor,))
+        return len(response.entries)
+
+    def sync(self, client):
+        """Brings the index up to date.
+
+        The first sync lists the whole Dropbox recursively, the next ones
+        apply only changes made since the stored cursor. The index is
+        rebuilt if the cursor has been invalidated by the server.
+
+        :param client: Dropbox client
+        :return: number of applied entries
+        """
+
+        cursor = self.cursor
+        if cursor is not None:
+            try:
+                response = client.files_list_folder_continue(cursor)
+            except exceptions.ApiError as exc:
+                if not (isinstance(exc.error, files.ListFolderContinueError)
+                        and exc.error.is_reset()):
+                    raise
+                cursor = None
+        if cursor is None:
+            self.reset()
+            response = client.files_list_folder('', recursive=True)
+        applied = self.apply(response)
+        while response.has_more:
+            response = client.files_list_folder_continue(response.cursor)
+            applied += self.apply(response)
+        return applied
+
+    @staticmethod
+    def _to_metadata(row):
+        (path_lower, _, path_display, name, entry_type, entry_id, size, rev,
+         content_hash, client_modified, server_modified) = row
+        if entry_type == 'folder':
+            return files.FolderMetadata(name=name, id=entry_id,
+                                        path_lower=path_lower,
+                                        path_display=path_display)
+        return files.FileMetadata(
+            name=name, id=entry_id, path_lower=path_lower,
+            path_display=path_display, size=size, rev=rev,
+            content_hash=content_hash,
+            client_modified=_parse_datetime(client_modified),
+            server_modified=_parse_datetime(server_modified))
+
+    def get_metadata(self, path):
+        """Returns metadata of a file or folder or None if it is unknown.
+
+        :param path: path in Dropbox
+        """
+
+        row = self.connection.execute(
+            "SELECT * FROM entries WHERE path_lower = ?",
+            (path.lower().rstrip('/'),)).fetchone()
+        return self._to_metadata(row) if row else None
+
+    def iter_folder(self, path):
+        """Yields metadata of entries of a folder ordered by name.
+
+        :param path: path of the folder in Dropbox, '' or '/' for the root
+        """
+
+        parent = path.lower().rstrip('/') or '/'
+        rows = self.connection.execute(
+            "SELECT * FROM entries WHERE parent_lower = ? ORDER BY name",
+            (parent,))
+        for row in rows:
+            yield self._to_metadata(row)
+
+    def iter_file_sizes(self, path):
+        """Yields (display path, size) tuples of all files under a folder.
+
+        :param path: path of the folder in Dropbox, '' or '/' for the root
+        """
+
+        path = path.lower().rstrip('/')
+        rows = self.connection.execute(
+            "SELECT path_display, size FROM entries WHERE type = 'file' "
+            "AND path_lower LIKE ? ESCAPE '\\'",
+            (self._escape_like(path) + '/%',))
+        yield from rows
@@ -0,0 +1,95 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import os
+
+from . import utils
+
+
+class UploadJournal(object):
+    """Keeps track of unfinished upload sessions in a local file.
+
+    Every entry is identified by the absolute path of a local file and
+    its destination in Dropbox and stores the upload session ID, the
+    offset committed by Dropbox and the identity (size, mtime, inode) of
+    the local file, so an interrupted upload can be continued only if the
+    file has not been changed since.
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path or utils.get_cache_path('uploads.json')
+
+    @staticmethod
+    def _get_key(file_src, file_dst):
+        return '{0}:{1}'.format(os.path.abspath(file_src), file_dst)
+
+    @staticmethod
+    def get_file_identity(file_src):
+        """Returns identity of a local file as a dictionary.
+
+        :param file_src: path to the local file
+        """
+
+        stat = os.stat(file_src)
+        return {'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'inode': stat.st_ino}
+
+    def _locked(self):
+        """Serializes access to the journal file of all processes.
+
+        Every change is made to entries loaded from the file under the
+        lock, so concurrent uploads (also of other journal objects and
+        processes) do not overwrite each other's entries.
+        """
+
+        return utils.file_lock(self.file_path)
+
+    def _load(self):
+        return utils.load_json_dict(self.file_path)
+
+    def _dump(self, entries):
+        utils.dump_json(self.file_path, entries)
+
+    def get(self, file_src, file_dst):
+        """Returns a journal entry of an unfinished upload.
+
+        :param file_src: path to the local file
+        :param file_dst: destination path in Dropbox
+        :return: dictionary with 'session_id' and 'offset' keys or None if
+                 there is no entry or the local file has been changed
+        """
+
+        with self._locked():
+            entry = self._load().get(self._get_key(file_src, file_dst))
+        if entry is None or entry['file'] != self.get_file_identity(
+                file_src):
+            return None
+        return entry
+
+    def update(self, file_src, file_dst, session_id, offset):
+        """Records the offset committed to an upload session.
+
+        :param file_src: path to the local file
+        :param file_dst: destination path in Dropbox
+        :param session_id: ID of the upload session
+        :param offset: number of bytes accepted by Dropbox
+        """
+
+        entry = {'session_id': session_id,
+                 'offset': offset,
+                 'destination': file_dst,
+                 'file': self.get_file_identity(file_src)}
+        with self._locked():
+            entries = self._load()
+            entries[self._get_key(file_src, file_dst)] = entry
+            self._dump(entries)
+
+    def remove(self, file_src, file_dst):
+        """Removes an entry of a finished upload from the journal."""
+
+        with self._locked():
+            entries = self._load()
+            if entries.pop(self._get_key(file_src, file_dst), None):
+                self._dump(entries)
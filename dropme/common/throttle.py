@@ -0,0 +1,175 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import logging
+import random
+import threading
+import time
+
+import requests
+from dropbox import exceptions
+
+from . import tracing
+
+
+LOG = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """Token bucket shared by all threads of the process.
+
+    Every request takes a token, tokens are refilled at a given rate. When
+    the server asks to retry after some delay the bucket is paused, so all
+    workers wait together instead of retrying at the same moment.
+    """
+
+    def __init__(self, rate=None, capacity=None):
+        """
+        :param rate: number of tokens added per second, None for unlimited
+        :param capacity: maximum number of tokens, defaults to the rate
+        """
+
+        self.rate = rate
+        self.capacity = capacity or rate or 1
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens +
+                               (now - self._updated) * self.rate)
+        self._updated = now
+
+    def get_delay(self):
+        """Takes a token and returns time in seconds to wait before use."""
+
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self._paused_until - now, 0)
+            if not self.rate:
+                return delay
+            self._refill(now)
+            self._tokens -= 1
+            if self._tokens < 0:
+                delay = max(delay, -self._tokens / self.rate)
+            return delay
+
+    def acquire(self):
+        delay = self.get_delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """Stops giving out tokens for a given number of seconds."""
+
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._refill(now)
+            self._tokens = min(self._tokens, 0)
+
+
+class AIMDLimiter(object):
+    """Limits the number of requests in flight.
+
+    The limit grows by one after every 'limit' successful requests and is
+    halved whenever the server throttles a request (additive increase,
+    multiplicative decrease), so it settles at the highest concurrency the
+    API allows.
+    """
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max(max_limit, min_limit)
+        self.min_limit = min_limit
+        self.limit = self.max_limit
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self._successes = 0
+                self.limit += 1
+                self._condition.notify()
+
+    def on_throttle(self):
+        with self._condition:
+            self._successes = 0
+            self.limit = max(self.limit // 2, self.min_limit)
+
+
+class Throttle(object):
+    """Retries requests failed with transient errors.
+
+    Rate limit errors are retried after the delay requested by the server,
+    internal server errors and connection errors with jittered exponential
+    backoff.
+    """
+
+    # Delay in seconds used when the server does not specify one.
+    DEFAULT_RETRY_AFTER = 5.0
+    # Base and maximum of the exponential backoff in seconds.
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 30.0
+
+    def __init__(self, max_retries=5, max_concurrency=16,
+                 requests_per_second=None):
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(requests_per_second)
+        self.limiter = AIMDLimiter(max_concurrency)
+
+    def get_backoff(self, attempt):
+        """Returns a full jitter exponential backoff for an attempt."""
+
+        return random.uniform(0, min(self.BACKOFF_MAX,
+                                     self.BACKOFF_BASE * 2 ** attempt))
+
+    def call(self, func, *args, **kwargs):
+        """Calls a function retrying it on transient errors."""
+
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.limiter.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except exceptions.RateLimitError as exc:
+                if attempt >= self.max_retries:
+                    raise
+                self.limiter.on_throttle()
+                backoff = exc.backoff
+                if backoff is None:
+                    backoff = self.DEFAULT_RETRY_AFTER
+                delay = backoff + random.uniform(0, self.BACKOFF_BASE)
+                self.bucket.pause(delay)
+                LOG.info("Rate limited, retrying in %.1f seconds.", delay)
+            except (exceptions.InternalServerError,
+                    requests.exceptions.ConnectionError) as exc:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.get_backoff(attempt)
+                LOG.info("%s, retrying in %.1f seconds.", exc, delay)
+                time.sleep(delay)
+            else:
+                self.limiter.on_success()
+                return result
+            finally:
+                self.limiter.release()
+            attempt += 1
+            tracing.add_retry()
@@ -0,0 +1,195 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+"""Tracing of API requests and file I/O of commands.
+
+Spans are recorded only while a tracer is enabled (with the --timing or
+--trace options), otherwise span() costs a single global lookup. Every
+span records an operation name (e.g. 'files/upload' or 'file.read'),
+the number of bytes, latency, retries and the final status.
+
+Trace files contain a JSON object per line in the "complete event"
+format of the Trace Event specification, so after wrapping the lines in
+a JSON array (e.g. with 'jq -s .') they can be loaded by Perfetto or
+chrome://tracing.
+"""
+
+import collections
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+
+
+_tracer = None
+_local = threading.local()
+
+
+class Span(object):
+    """A timed operation."""
+
+    __slots__ = ('name', 'bytes', 'start', 'duration', 'retries', 'status',
+                 'thread')
+
+    def __init__(self, name, nbytes=0, start=None):
+        self.name = name
+        self.bytes = nbytes
+        self.start = time.perf_counter() if start is None else start
+        self.duration = 0.0
+        self.retries = 0
+        self.status = 'ok'
+        self.thread = threading.get_ident()
+
+
+class Tracer(object):
+    """Collects spans and optionally writes them to a trace file."""
+
+    def __init__(self, trace_path=None):
+        """
+        :param trace_path: path of a file spans are written to as JSON
+                           lines
+        """
+
+        self.spans = []
+        self.started = time.perf_counter()
+        self._trace_file = open(trace_path, 'w') if trace_path else None
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    @property
+    def elapsed(self):
+        """Time in seconds since the tracer was created."""
+        return time.perf_counter() - self.started
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+            if self._trace_file is not None:
+                self._trace_file.write(json.dumps(self._to_event(span)))
+                self._trace_file.write('\n')
+
+    def _to_event(self, span):
+        return {'name': span.name,
+                'cat': span.name.split('/')[0].split('.')[0],
+                'ph': 'X',
+                'ts': round((span.start - self.started) * 1e6, 1),
+                'dur': round(span.duration * 1e6, 1),
+                'pid': os.getpid(),
+                'tid': span.thread,
+                'args': {'bytes': span.bytes,
+                         'retries': span.retries,
+                         'status': span.status}}
+
+    def get_summary(self):
+        """Returns statistics of spans grouped by operation.
+
+        :return: list of dicts with 'name', 'count', 'bytes', 'total',
+                 'p50', 'p95', 'p99' (in seconds), 'retries' and 'errors'
+                 keys, ordered by the total time
+        """
+
+        groups = collections.defaultdict(list)
+        with self._lock:
+            for span in self.spans:
+                groups[span.name].append(span)
+        summary = []
+        for name, spans in groups.items():
+            durations = sorted(span.duration for span in spans)
+            summary.append({
+                'name': name,
+                'count': len(spans),
+                'bytes': sum(span.bytes for span in spans),
+                'total': sum(durations),
+                'p50': percentile(durations, 50),
+                'p95': percentile(durations, 95),
+                'p99': percentile(durations, 99),
+                'retries': sum(span.retries for span in spans),
+                'errors': sum(span.status != 'ok' for span in spans),
+            })
+        summary.sort(key=lambda row: row['total'], reverse=True)
+        return summary
+
+
+def percentile(values, percent):
+    """Returns a nearest-rank percentile of sorted values."""
+
+    if not values:
+        return 0.0
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def enable(trace_path=None):
+    """Starts recording spans of all threads with a new tracer."""
+
+    global _tracer
+    _tracer = Tracer(trace_path)
+    return _tracer
+
+
+def disable():
+    """Stops recording spans, closes and returns the tracer."""
+
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+@contextlib.contextmanager
+def span(name, nbytes=0):
+    """Records the duration of a block of code as a span.
+
+    :param name: name of the operation
+    :param nbytes: number of transferred bytes, it can be updated with
+                   the 'bytes' attribute of the yielded span
+    :return: context manager yielding a Span or None if tracing is off
+    """
+
+    tracer = _tracer
+    if tracer is None:
+        yield None
+        return
+    current = Span(name, nbytes)
+    parent = getattr(_local, 'span', None)
+    _local.span = current
+    try:
+        yield current
+    except BaseException as exc:
+        current.status = type(exc).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _local.span = parent
+        tracer.add(current)
+
+
+def record(name, start, duration, nbytes=0):
+    """Records a span measured by the caller, e.g. a sum of many steps."""
+
+    tracer = _tracer
+    if tracer is not None:
+        current = Span(name, nbytes, start)
+        current.duration = duration
+        tracer.add(current)
+
+
+def add_retry():
+    """Counts a retry of the innermost span of the current thread."""
+
+    current = getattr(_local, 'span', None)
+    if current is not None:
+        current.retries += 1
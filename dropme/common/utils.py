@@ -2,10 +2,122 @@
 #    Copyright 2017 Vitalii Kulanov
 #
 
+import contextlib
+import fcntl
+import importlib
+import json
 import math
 import os
+import tempfile
+import types
 
-import yaml
+
+class _LazyModule(types.ModuleType):
+    """Module which is imported on first access to its attributes."""
+
+    def __getattr__(self, name):
+        return getattr(importlib.import_module(self.__name__), name)
+
+
+def lazy_import(name):
+    """Returns a module which is imported only when it is used.
+
+    Heavy dependencies (e.g. the Dropbox SDK) are imported this way, so
+    that loading commands, e.g. for 'dropme --help', stays fast.
+
+    :param name: absolute name of the module
+    """
+
+    return _LazyModule(name)
+
+
+yaml = lazy_import('yaml')
+
+
+@contextlib.contextmanager
+def file_lock(file_path):
+    """Serializes access to a file of all processes.
+
+    An exclusive flock is held on a '.lock' file next to the file, so
+    read-modify-write cycles of concurrent writers do not overwrite each
+    other's changes.
+
+    :param file_path: path of the guarded file
+    """
+
+    with open('{0}.lock'.format(file_path), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_json_dict(file_path):
+    """Returns a dictionary stored in a JSON file, {} if it is unreadable."""
+
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+    except (OSError, IOError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def dump_json(file_path, data):
+    """Replaces a JSON file atomically.
+
+    Data is written to a unique temporary file in the same directory, so
+    concurrent writers never share or remove each other's temporary files.
+    """
+
+    fd, tmp_path = tempfile.mkstemp(
+        prefix='{0}.'.format(os.path.basename(file_path)),
+        suffix='.tmp', dir=os.path.dirname(file_path) or '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def get_cache_path(file_name, create=True):
+    """Returns path to a file in the dropme cache directory.
+
+    The directory ($XDG_CACHE_HOME/dropme or ~/.cache/dropme) is created
+    if it doesn't exist, unless create is False.
+
+    :param file_name: name of the file
+    :param create: whether to create the directory
+    """
+
+    cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
+    cache_dir = os.path.join(cache_home, 'dropme')
+    if create:
+        os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, file_name)
+
+
+def walk_files(path):
+    """Yields paths of all regular files under a directory tree.
+
+    Symbolic links to directories are not followed.
+
+    :param path: path to the directory
+    """
+
+    directories = [path]
+    while directories:
+        with os.scandir(directories.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
 
 
 def read_yaml_file(file_path):
@@ -54,6 +166,22 @@ def get_display_data_multi(fields, data, sort_by=None):
     return data
 
 
+def iter_display_data_multi(fields, data):
+    """Lazily performs slice of data by set of given fields.
+
+    Unlike get_display_data_multi() items are processed one by one as they
+    are consumed, so data can be an iterator of unknown length.
+
+    :param fields:  Iterable containing names of fields to be retrieved
+                    from data
+    :param data:    Iterable of objects representing some external entities
+    :return:        Generator of the collections of values of the
+                    supplied attributes
+    """
+
+    return (get_display_data_single(fields, elem) for elem in data)
+
+
 def convert_size(size_bytes):
     """
     Convert size in bytes to a human-readable form.
@@ -68,6 +196,17 @@ def convert_size(size_bytes):
     return "{} {}".format(s, size_name[i])
 
 
+def convert_rate(size_bytes, seconds):
+    """
+    Convert amount of bytes transferred in a given time to a human-readable
+    transfer rate.
+    """
+
+    if seconds <= 0:
+        return "{}/s".format(convert_size(size_bytes))
+    return "{}/s".format(convert_size(int(size_bytes / seconds)))
+
+
 def to_megabytes(size_bytes):
     """
     Convert size in bytes to megabytes
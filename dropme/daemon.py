@@ -0,0 +1,377 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+"""Daemon serving dropme commands over a Unix domain socket.
+
+'dropme daemon' keeps imported modules, parsed settings, Dropbox clients
+with their connection pools and a file metadata cache alive between
+commands. The 'dropme' console script passes command lines to a running
+daemon and falls back to running them in-process when there is none.
+
+Every request is a single JSON line with the command line, the working
+directory and forwarded environment variables. The daemon replies with
+JSON lines carrying chunks of stdout and stderr and finally the exit
+code of the command. Commands are run one at a time, so the working
+directory and environment of the daemon can be switched for each one.
+Long-running and streaming commands are therefore never forwarded, and
+a client falls back to running a command in-process if the daemon does
+not start it in time, e.g. as it is busy with another one. A command is
+interrupted when its client disconnects.
+"""
+
+import contextlib
+import io
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+from . import error
+from .common import utils
+
+
+# Environment variable disabling the use of a running daemon.
+DISABLE_ENV = 'DROPME_NO_DAEMON'
+# Environment variables of the client used by commands run by the daemon.
+FORWARDED_ENV = ('DBX_AUTH_TOKEN',)
+# Commands which run long or stream data, they would keep the daemon from
+# serving other commands.
+LOCAL_COMMANDS = ('batch', 'daemon', 'sync', 'watch')
+# Options of recursive and parallel transfers.
+LOCAL_OPTIONS = ('-r', '--recursive', '-p', '--parallel')
+# Time in seconds a client waits for the daemon to start a command.
+TIMEOUT = 1.0
+# Exit code of a command interrupted as its client has disconnected.
+INTERRUPTED_EXIT_CODE = 130
+
+
+def get_socket_path():
+    """Returns the default path of the socket of the daemon.
+
+    It is 'dropme.sock' in $XDG_RUNTIME_DIR if set, otherwise in the cache
+    directory of dropme. The directory is not created, as every call of
+    the console script looks the socket up; the daemon creates it.
+    """
+
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'dropme.sock')
+    return utils.get_cache_path('dropme.sock', create=False)
+
+
+def _connect(path, timeout=None):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def call(argv, path=None, stdout=None, stderr=None, timeout=TIMEOUT):
+    """Runs a command in a running daemon.
+
+    :param argv: command line arguments
+    :param path: path of the socket of the daemon
+    :param stdout: stream the output of the command is written to
+    :param stderr: stream the errors of the command are written to
+    :param timeout: time in seconds to wait for the daemon to connect and
+                    to start the command
+    :return: exit code of the command or None if no daemon is running or
+             it has not started the command in time
+    """
+
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    sock = _connect(path or get_socket_path(), timeout)
+    if sock is None:
+        return None
+    # The socket is not shut down for writing, so the daemon notices when
+    # the client goes away and interrupts the command.
+    with sock, sock.makefile('rb') as response:
+        try:
+            _send(sock, {'argv': argv,
+                         'cwd': os.getcwd(),
+                         'env': {name: os.environ.get(name)
+                                 for name in FORWARDED_ENV}})
+            started = response.readline()
+        except OSError:
+            return None
+        if not started:
+            return None
+        sock.settimeout(None)
+        for line in response:
+            message = json.loads(line.decode('utf-8'))
+            if 'exit' in message:
+                return message['exit']
+            stream = stdout if 'stdout' in message else stderr
+            stream.write(message.get('stdout', message.get('stderr')))
+            stream.flush()
+    stderr.write('Connection to dropme daemon was lost.\n')
+    return 1
+
+
+def stop(path=None):
+    """Stops a running daemon.
+
+    :return: True if the daemon was running
+    """
+
+    sock = _connect(path or get_socket_path())
+    if sock is None:
+        return False
+    with sock, sock.makefile('rb') as response:
+        _send(sock, {'stop': True})
+        sock.shutdown(socket.SHUT_WR)
+        response.read()
+    return True
+
+
+def _is_forwarded(argv):
+    # The interactive mode, commands reading stdin, long-running commands
+    # and commands managing the daemon itself are always run in-process.
+    if not argv or '-' in argv:
+        return False
+    for arg in argv:
+        if (arg in LOCAL_COMMANDS or
+                arg.split('=', 1)[0] in LOCAL_OPTIONS or
+                arg.startswith('-p') and arg[2:].isdigit()):
+            return False
+    # Directories are uploaded recursively.
+    return 'put' not in argv or not any(os.path.isdir(arg) for arg in argv)
+
+
+def main(argv=None):
+    """Entry point of the 'dropme' console script."""
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not os.environ.get(DISABLE_ENV) and _is_forwarded(argv):
+        exit_code = call(argv)
+        if exit_code is not None:
+            return exit_code
+    from . import app
+    return app.main(argv)
+
+
+class _SocketWriter(io.TextIOBase):
+    """Text stream sending everything written to it to a client."""
+
+    # Size of buffered text sent at once.
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, sock, name):
+        self._sock = sock
+        self._name = name
+        self._buffer = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.BUFFER_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            text = ''.join(self._buffer)
+            self._buffer = []
+            self._size = 0
+            _send(self._sock, {self._name: text})
+
+
+@contextlib.contextmanager
+def _environment(cwd, env):
+    """Switches the working directory and environment of the process."""
+
+    saved_cwd = os.getcwd()
+    saved_env = {name: os.environ.get(name) for name in env}
+    try:
+        os.chdir(cwd)
+        _update_environ(env)
+        yield
+    finally:
+        _update_environ(saved_env)
+        os.chdir(saved_cwd)
+
+
+@contextlib.contextmanager
+def _interrupt_on_disconnect(sock):
+    """Interrupts the main thread if a client closes its connection.
+
+    The client sends nothing after its request, so the end of the stream
+    means it has gone away, e.g. on Ctrl-C. SIGINT is sent to the main
+    thread, so the command is interrupted as it would be by Ctrl-C
+    in-process.
+    """
+
+    done = threading.Event()
+    lock = threading.Lock()
+    main_thread = threading.main_thread()
+
+    def watch():
+        while not done.is_set():
+            readable, _, _ = select.select([sock], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                data = b''
+            if not data:
+                with lock:
+                    if not done.is_set():
+                        # Unlike _thread.interrupt_main(), the signal also
+                        # interrupts blocking calls, e.g. reads of sockets.
+                        signal.pthread_kill(main_thread.ident, signal.SIGINT)
+                return
+
+    watcher = threading.Thread(target=watch, name='dropme-daemon-watch',
+                               daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        with lock:
+            done.set()
+        watcher.join()
+
+
+def _update_environ(env):
+    for name, value in env.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+        if request.get('stop'):
+            self.server.stopped = True
+            exit_code = 0
+        else:
+            try:
+                # Tells the client the command is started.
+                _send(self.connection, {'started': True})
+            except OSError:
+                # The client has given up waiting.
+                return
+            exit_code = self.server.run_command(self.connection, request)
+        # The client may have gone away, e.g. on Ctrl-C.
+        with contextlib.suppress(OSError):
+            _send(self.connection, {'exit': exit_code})
+
+
+class Server(socketserver.UnixStreamServer):
+    """Runs dropme commands sent to a Unix domain socket."""
+
+    request_queue_size = 64
+
+    def __init__(self, path, idle_timeout=None):
+        """
+        :param path: path of the socket
+        :param idle_timeout: time in seconds without commands after which
+                             the daemon exits, None to run until stopped
+        """
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._remove_stale_socket(path)
+        # The socket must not be accessible by other users.
+        umask = os.umask(0o177)
+        try:
+            super(Server, self).__init__(path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        self.path = path
+        self.timeout = idle_timeout
+        self.stopped = False
+        # Imported here so that clients of the daemon stay lightweight.
+        from . import app
+        self.app = app.DropboxClient()
+        # Loads commands and the SDK before the first command is run.
+        for _, entry_point in self.app.command_manager:
+            entry_point.load()
+
+    @staticmethod
+    def _remove_stale_socket(path):
+        if not os.path.exists(path):
+            return
+        sock = _connect(path)
+        if sock is not None:
+            sock.close()
+            raise error.ActionException("dropme daemon is already "
+                                        "running on '{0}'.".format(path))
+        os.unlink(path)
+
+    def handle_timeout(self):
+        self.stopped = True
+
+    def serve(self):
+        """Handles commands until the daemon is stopped or idle too long."""
+
+        try:
+            while not self.stopped:
+                self.handle_request()
+        finally:
+            self.server_close()
+
+    def server_close(self):
+        super(Server, self).server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    def run_command(self, sock, request):
+        """Runs a command and sends its output to a client.
+
+        The command is interrupted if the client disconnects.
+
+        :return: exit code of the command
+        """
+
+        # Not imported at the top to keep the client of the daemon fast.
+        import logging
+
+        stdout = _SocketWriter(sock, 'stdout')
+        stderr = _SocketWriter(sock, 'stderr')
+        root_logger = logging.getLogger('')
+        handlers = list(root_logger.handlers)
+        self.app.stdout, self.app.stderr = stdout, stderr
+        try:
+            with _environment(request['cwd'], request['env']), \
+                    contextlib.redirect_stdout(stdout), \
+                    contextlib.redirect_stderr(stderr):
+                try:
+                    with _interrupt_on_disconnect(sock):
+                        return self.app.run(request['argv'])
+                except KeyboardInterrupt:
+                    return INTERRUPTED_EXIT_CODE
+                except SystemExit as exc:
+                    if exc.code is None or isinstance(exc.code, int):
+                        return exc.code or 0
+                    stderr.write('{0}\n'.format(exc.code))
+                    return 1
+        finally:
+            # Handlers are added by the application on every run.
+            root_logger.handlers[:] = handlers
+            try:
+                stdout.flush()
+                stderr.flush()
+            except OSError:
+                pass
@@ -16,17 +16,18 @@ classifiers = [
     'Operating System :: POSIX :: Linux',
     'Programming Language :: Python',
     'Programming Language :: Python :: 3',
-    'Programming Language :: Python :: 3.5',
-    'Programming Language :: Python :: 3.6',
+    'Programming Language :: Python :: 3.7',
+    'Programming Language :: Python :: 3.8',
     'Topic :: Communications :: File Sharing',
 ]
 
 setup(
     name='dropme',
     version='1.1.0',
+    python_requires='>=3.7',
     install_requires=[
         'cliff>=2.10.0',
-        'dropbox>=8.5.0',
+        'dropbox>=11.0.0',
         'PyYAML>=3.1.0',
     ],
     description='CLI tool for managing Dropbox environment.',
@@ -37,17 +38,22 @@ setup(
     license='MIT',
     classifiers=classifiers,
     keywords='CLI Dropbox',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['benchmarks', 'tests', 'tests.*']),
     include_package_data=True,
     entry_points={
         'console_scripts': [
-            'dropme = dropme.app:main',
+            'dropme = dropme.daemon:main',
         ],
         'dropme': [
+            'batch=dropme.commands.batch:Batch',
             'cp=dropme.commands.files:FileFolderCopy',
+            'daemon=dropme.commands.daemon:Daemon',
             'df=dropme.commands.account:AccountOwnerSpaceUsageShow',
+            'du=dropme.commands.folder:FolderSpaceUsageList',
             'find=dropme.commands.files:FileFolderSearch',
             'get=dropme.commands.files:FileGet',
+            'hash=dropme.commands.files:FileHashList',
+            'index_sync=dropme.commands.index:IndexSync',
             'ls=dropme.commands.folder:FolderList',
             'mkdir=dropme.commands.folder:FolderCreate',
             'mv=dropme.commands.files:FileFolderMove',
@@ -56,6 +62,8 @@ setup(
             'revs=dropme.commands.files:FileRevisionsList',
             'rm=dropme.commands.files:FileFolderDelete',
             'status=dropme.commands.files:FileFolderStatusShow',
+            'sync=dropme.commands.sync:Sync',
+            'watch=dropme.commands.folder:FolderWatch',
             'whoami=dropme.commands.account:AccountOwnerInfoShow'
         ],
     },
@@ -0,0 +1,560 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+"""In-process stand-in for the Dropbox API used by functional tests.
+
+The server speaks the same wire format as the Dropbox API (arguments and
+results are (de)serialized with the SDK's own stone serializers), stores
+file content in a local directory and can inject latency, bandwidth caps,
+rate limiting and server errors:
+
+    with FakeDropbox(tmpdir.strpath) as server:
+        server.latency = 0.01
+        server.fail_next(429, retry_after=1)
+        dbx = server.get_client()
+        dbx.files_upload(b'data', '/foo/bar.txt')
+"""
+
+import collections
+import datetime
+import http.server
+import json
+import os
+import posixpath
+import re
+import threading
+import time
+
+import dropbox
+from dropbox import files
+from dropbox import stone_serializers
+from dropbox import users
+
+from dropme import client
+from dropme.common import hashing
+
+
+ROUTES = dict(
+    [('files/' + name, route) for name, route in files.ROUTES.items()] +
+    [('users/' + name, route) for name, route in users.ROUTES.items()])
+
+
+class RouteError(Exception):
+    """Raised by route handlers to return a route specific error."""
+
+    def __init__(self, tag, value=None):
+        super(RouteError, self).__init__(tag)
+        self.tag = tag
+        self.value = value
+
+
+def _lookup_not_found():
+    return files.LookupError('not_found')
+
+
+def _write_conflict():
+    return files.WriteError('conflict', files.WriteConflictError('file'))
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, don't wait for ACKs.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server.fake
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        route_name = self.path[len('/2/'):]
+        match = re.match(r'^(.*)_v(\d+)$', route_name)
+        key = '{0}:{1}'.format(*match.groups()) if match else route_name
+        server.requests.append(route_name)
+        server.throttle(len(body))
+        failure = server.pop_failure()
+        if failure is not None:
+            return self._send_failure(*failure)
+        route = ROUTES.get(key)
+        handler = getattr(server, 'route_' + re.sub(r'[/:]', '_', key), None)
+        if route is None or handler is None:
+            return self._send(400, b'Unknown route ' + route_name.encode(),
+                              'text/plain')
+        style = route.attrs.get('style') or 'rpc'
+        raw_arg = (body if style == 'rpc'
+                   else self.headers['Dropbox-API-Arg'].encode())
+        arg = stone_serializers.json_compat_obj_decode(
+            route.arg_type, json.loads(raw_arg.decode() or 'null'),
+            strict=False)
+        try:
+            with server.lock:
+                if style == 'upload':
+                    result = handler(arg, body)
+                elif style == 'download':
+                    result, content = handler(arg)
+                else:
+                    result = handler(arg)
+        except RouteError as exc:
+            error = route.error_type.definition(exc.tag, exc.value)
+            data = {'error': stone_serializers.json_compat_obj_encode(
+                route.error_type, error), 'error_summary': exc.tag + '/'}
+            return self._send(409, json.dumps(data).encode())
+        raw_result = json.dumps(stone_serializers.json_compat_obj_encode(
+            route.result_type, result))
+        if style != 'download':
+            return self._send(200, raw_result.encode())
+        status = 200
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) + 1 if match.group(2) else len(content)
+            content, status = content[start:end], 206
+        server.throttle(len(content))
+        self._send(status, content, 'application/octet-stream',
+                   {'Dropbox-API-Result': raw_result})
+
+    def _send_failure(self, status, retry_after):
+        headers = {}
+        if retry_after is not None:
+            headers['Retry-After'] = str(retry_after)
+        self._send(status, b'Injected failure', 'text/plain', headers)
+
+    def _send(self, status, content, content_type='application/json',
+              headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class FakeDropbox(object):
+    """Fake Dropbox API server running in a background thread."""
+
+    def __init__(self, storage_path, page_size=100):
+        """
+        :param storage_path: directory to store file content in
+        :param page_size: default number of entries in a listing page
+        """
+
+        self.storage_path = storage_path
+        self.page_size = page_size
+        # Delay of every request in seconds.
+        self.latency = 0
+        # Transfer rate of request and response bodies in bytes per second.
+        self.bandwidth = None
+        # Names of all handled routes in order.
+        self.requests = []
+        self.entries = {}
+        self.revisions = {}
+        self._failures = collections.deque()
+        self._sessions = {}
+        self._cursors = {}
+        self._jobs = {}
+        self._counter = 0
+        # Route handlers are run one at a time.
+        self.lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(*self._httpd.server_address)
+
+    def get_client(self, token='fake-token', **kwargs):
+        """Returns a dropme client sending requests to the server."""
+
+        kwargs.setdefault('session', dropbox.create_session())
+        dbx = client.Client(token, **kwargs)
+        dbx._get_route_url = lambda hostname, route_name: (
+            '{0}/2/{1}'.format(self.url, route_name))
+        return dbx
+
+    def fail_next(self, status=429, count=1, retry_after=None):
+        """Makes the next requests fail with a given HTTP status."""
+
+        self._failures.extend([(status, retry_after)] * count)
+
+    def pop_failure(self):
+        try:
+            return self._failures.popleft()
+        except IndexError:
+            return None
+
+    def throttle(self, size):
+        delay = self.latency
+        if self.bandwidth:
+            delay += size / self.bandwidth
+        if delay:
+            time.sleep(delay)
+
+    # Storage
+
+    def _next_id(self):
+        self._counter += 1
+        return self._counter
+
+    def _blob_path(self, name):
+        return os.path.join(self.storage_path, name)
+
+    def _get(self, path):
+        entry = self.entries.get(path.lower().rstrip('/'))
+        if entry is None:
+            raise RouteError('path', _lookup_not_found())
+        return entry
+
+    def _make_parents(self, path):
+        parent = posixpath.dirname(path)
+        while parent != '/' and parent.lower() not in self.entries:
+            self.entries[parent.lower()] = files.FolderMetadata(
+                name=posixpath.basename(parent), path_lower=parent.lower(),
+                path_display=parent, id='id:{0}'.format(self._next_id()))
+            parent = posixpath.dirname(parent)
+
+    def _get_free_path(self, path):
+        root, ext = posixpath.splitext(path)
+        number = 1
+        while path.lower() in self.entries:
+            path = '{0} ({1}){2}'.format(root, number, ext)
+            number += 1
+        return path
+
+    def put_file(self, path, content, mode=None, autorename=False):
+        """Stores a file and returns its metadata.
+
+        :raises RouteError: with a WriteError on conflict
+        """
+
+        existing = self.entries.get(path.lower())
+        overwrite = mode is not None and mode.is_overwrite()
+        if existing is not None and not (
+                overwrite and isinstance(existing, files.FileMetadata)):
+            if not autorename:
+                raise RouteError('path', _write_conflict())
+            path = self._get_free_path(path)
+        rev = '{0:015x}'.format(self._next_id())
+        with open(self._blob_path(rev), 'wb') as f:
+            f.write(content)
+        now = datetime.datetime.utcnow().replace(microsecond=0)
+        metadata = files.FileMetadata(
+            name=posixpath.basename(path), path_lower=path.lower(),
+            path_display=path, rev=rev, size=len(content),
+            content_hash=hashing.content_hash(self._blob_path(rev)),
+            id=existing.id if existing else 'id:{0}'.format(rev),
+            client_modified=now, server_modified=now)
+        self._make_parents(path)
+        self.entries[path.lower()] = metadata
+        self.revisions[rev] = metadata
+        return metadata
+
+    def read_file(self, path):
+        """Returns content of a file by its path or 'rev:<revision>'."""
+
+        if path.startswith('rev:'):
+            metadata = self.revisions.get(path[len('rev:'):])
+            if metadata is None:
+                raise RouteError('path', _lookup_not_found())
+        else:
+            metadata = self._get(path)
+            if not isinstance(metadata, files.FileMetadata):
+                raise RouteError('path', files.LookupError('not_file'))
+        with open(self._blob_path(metadata.rev), 'rb') as f:
+            return metadata, f.read()
+
+    def add_file_metadata(self, path, size=0):
+        """Adds an entry of a file without content, e.g. for listings."""
+
+        rev = '{0:015x}'.format(self._next_id())
+        now = datetime.datetime.utcnow().replace(microsecond=0)
+        self._make_parents(path)
+        self.entries[path.lower()] = files.FileMetadata(
+            name=posixpath.basename(path), path_lower=path.lower(),
+            path_display=path, rev=rev, size=size, id='id:{0}'.format(rev),
+            client_modified=now, server_modified=now)
+
+    def _iter_tree(self, path, recursive):
+        prefix = path.lower().rstrip('/') + '/'
+        for path_lower in sorted(self.entries):
+            if path_lower.startswith(prefix) and (
+                    recursive or '/' not in path_lower[len(prefix):]):
+                yield self.entries[path_lower]
+
+    def _delete(self, path):
+        metadata = self.entries.get(path.lower())
+        if metadata is None:
+            raise RouteError('path_lookup', _lookup_not_found())
+        for entry in list(self._iter_tree(path, recursive=True)):
+            del self.entries[entry.path_lower]
+        del self.entries[path.lower()]
+        return metadata
+
+    def _relocate(self, from_path, to_path, move):
+        metadata = self.entries.get(from_path.lower())
+        if metadata is None:
+            raise RouteError('from_lookup', _lookup_not_found())
+        if to_path.lower() in self.entries:
+            raise RouteError('to', _write_conflict())
+        sources = [metadata] + list(self._iter_tree(from_path, True))
+        for entry in sources:
+            new_path = to_path + entry.path_display[len(from_path):]
+            if isinstance(entry, files.FolderMetadata):
+                self._make_parents(new_path + '/')
+            else:
+                _, content = self.read_file(entry.path_lower)
+                self.put_file(new_path, content)
+        if move:
+            self._delete(from_path)
+        return self.entries[to_path.lower()]
+
+    def _add_job(self, result):
+        job_id = 'job-{0}'.format(self._next_id())
+        self._jobs[job_id] = result
+        return job_id
+
+    # Routes
+
+    def route_files_upload(self, arg, body):
+        return self.put_file(arg.path, body, arg.mode, arg.autorename)
+
+    def route_files_upload_session_start(self, arg, body):
+        session_id = 'session-{0}'.format(self._next_id())
+        concurrent = (arg.session_type is not None and
+                      arg.session_type.is_concurrent())
+        # Chunks of a concurrent session may come in any order.
+        self._sessions[session_id] = {'data': bytearray(body),
+                                      'closed': arg.close,
+                                      'parts': {} if concurrent else None}
+        return files.UploadSessionStartResult(session_id=session_id)
+
+    def _get_session(self, cursor):
+        session = self._sessions.get(cursor.session_id)
+        if session is None:
+            raise RouteError('not_found')
+        if session['parts'] is not None:
+            return session
+        if cursor.offset != len(session['data']):
+            raise RouteError('incorrect_offset',
+                             files.UploadSessionOffsetError(
+                                 correct_offset=len(session['data'])))
+        return session
+
+    def route_files_upload_session_append_2(self, arg, body):
+        session = self._get_session(arg.cursor)
+        if session['closed']:
+            raise RouteError('closed')
+        if session['parts'] is not None:
+            session['parts'][arg.cursor.offset] = body
+        else:
+            session['data'].extend(body)
+            session['closed'] = arg.close
+
+    def _finish_session(self, arg, body):
+        try:
+            session = self._get_session(arg.cursor)
+        except RouteError as exc:
+            raise RouteError('lookup_failed', files.UploadSessionLookupError(
+                exc.tag, exc.value))
+        if session['parts'] is not None:
+            parts = session['parts']
+            session['data'] = b''.join(parts[offset]
+                                       for offset in sorted(parts))
+        data = bytes(session['data']) + body
+        try:
+            metadata = self.put_file(arg.commit.path, data, arg.commit.mode,
+                                     arg.commit.autorename)
+        except RouteError as exc:
+            raise RouteError('path', exc.value)
+        del self._sessions[arg.cursor.session_id]
+        return metadata
+
+    def route_files_upload_session_finish(self, arg, body):
+        return self._finish_session(arg, body)
+
+    def route_files_upload_session_finish_batch(self, arg):
+        entries = []
+        for entry in arg.entries:
+            try:
+                entries.append(files.UploadSessionFinishBatchResultEntry(
+                    'success', self._finish_session(entry, b'')))
+            except RouteError as exc:
+                entries.append(files.UploadSessionFinishBatchResultEntry(
+                    'failure', files.UploadSessionFinishError(exc.tag,
+                                                              exc.value)))
+        job_id = self._add_job(files.UploadSessionFinishBatchJobStatus(
+            'complete', files.UploadSessionFinishBatchResult(entries)))
+        return files.UploadSessionFinishBatchLaunch('async_job_id', job_id)
+
+    def _check_job(self, arg):
+        job = self._jobs.get(arg.async_job_id)
+        if job is None:
+            raise RouteError('invalid_async_job_id')
+        return job
+
+    def route_files_upload_session_finish_batch_check(self, arg):
+        return self._check_job(arg)
+
+    def route_files_download(self, arg):
+        metadata, content = self.read_file(
+            'rev:{0}'.format(arg.rev) if arg.rev else arg.path)
+        return metadata, content
+
+    def route_files_get_metadata(self, arg):
+        if arg.path.startswith('rev:'):
+            return self.read_file(arg.path)[0]
+        return self._get(arg.path)
+
+    def _list_page(self, cursor_id):
+        cursor = self._cursors[cursor_id]
+        start = cursor['offset']
+        cursor['offset'] = end = start + cursor['limit']
+        return files.ListFolderResult(entries=cursor['entries'][start:end],
+                                      cursor=cursor_id,
+                                      has_more=end < len(cursor['entries']))
+
+    def route_files_list_folder(self, arg):
+        if arg.path:
+            entry = self._get(arg.path)
+            if isinstance(entry, files.FileMetadata):
+                raise RouteError('path', files.LookupError('not_folder'))
+        cursor_id = 'cursor-{0}'.format(self._next_id())
+        self._cursors[cursor_id] = {
+            'entries': list(self._iter_tree(arg.path, arg.recursive)),
+            'offset': 0, 'limit': arg.limit or self.page_size}
+        return self._list_page(cursor_id)
+
+    def route_files_list_folder_continue(self, arg):
+        if arg.cursor not in self._cursors:
+            raise RouteError('reset')
+        return self._list_page(arg.cursor)
+
+    def route_files_list_folder_get_latest_cursor(self, arg):
+        cursor_id = 'cursor-{0}'.format(self._next_id())
+        self._cursors[cursor_id] = {'entries': [], 'offset': 0,
+                                    'limit': self.page_size}
+        return files.ListFolderGetLatestCursorResult(cursor=cursor_id)
+
+    def route_files_search(self, arg):
+        matches = [files.SearchMatch(files.SearchMatchType('filename'), entry)
+                   for entry in self._iter_tree(arg.path, recursive=True)
+                   if arg.query.lower() in entry.name.lower()]
+        end = arg.start + arg.max_results
+        return files.SearchResult(matches=matches[arg.start:end],
+                                  more=len(matches) > end, start=end)
+
+    def route_files_create_folder_2(self, arg):
+        if arg.path.lower() in self.entries:
+            raise RouteError('path', files.WriteError(
+                'conflict', files.WriteConflictError('folder')))
+        self._make_parents(arg.path + '/')
+        return files.CreateFolderResult(metadata=self._get(arg.path))
+
+    def route_files_create_folder_batch(self, arg):
+        entries = []
+        for path in arg.paths:
+            try:
+                result = self.route_files_create_folder_2(
+                    files.CreateFolderArg(path, arg.autorename))
+                entries.append(files.CreateFolderBatchResultEntry(
+                    'success', files.CreateFolderEntryResult(
+                        result.metadata)))
+            except RouteError as exc:
+                entries.append(files.CreateFolderBatchResultEntry(
+                    'failure', files.CreateFolderEntryError(
+                        exc.tag, exc.value)))
+        result = files.CreateFolderBatchResult(entries)
+        if not arg.force_async:
+            return files.CreateFolderBatchLaunch('complete', result)
+        job_id = self._add_job(files.CreateFolderBatchJobStatus(
+            'complete', result))
+        return files.CreateFolderBatchLaunch('async_job_id', job_id)
+
+    def route_files_create_folder_batch_check(self, arg):
+        return self._check_job(arg)
+
+    def route_files_delete_2(self, arg):
+        return files.DeleteResult(metadata=self._delete(arg.path))
+
+    def route_files_copy_2(self, arg):
+        return files.RelocationResult(metadata=self._relocate(
+            arg.from_path, arg.to_path, move=False))
+
+    def route_files_move_2(self, arg):
+        return files.RelocationResult(metadata=self._relocate(
+            arg.from_path, arg.to_path, move=True))
+
+    def route_files_delete_batch(self, arg):
+        entries = []
+        for entry in arg.entries:
+            try:
+                entries.append(files.DeleteBatchResultEntry(
+                    'success', files.DeleteBatchResultData(
+                        self._delete(entry.path))))
+            except RouteError as exc:
+                entries.append(files.DeleteBatchResultEntry(
+                    'failure', files.DeleteError(exc.tag, exc.value)))
+        job_id = self._add_job(files.DeleteBatchJobStatus(
+            'complete', files.DeleteBatchResult(entries)))
+        return files.DeleteBatchLaunch('async_job_id', job_id)
+
+    def route_files_delete_batch_check(self, arg):
+        return self._check_job(arg)
+
+    def _relocate_batch(self, arg, move):
+        entries = []
+        for entry in arg.entries:
+            try:
+                entries.append(files.RelocationBatchResultEntry(
+                    'success', self._relocate(entry.from_path, entry.to_path,
+                                              move)))
+            except RouteError as exc:
+                entries.append(files.RelocationBatchResultEntry(
+                    'failure', files.RelocationBatchErrorEntry(
+                        'relocation_error',
+                        files.RelocationError(exc.tag, exc.value))))
+        job_id = self._add_job(files.RelocationBatchV2JobStatus(
+            'complete', files.RelocationBatchV2Result(entries)))
+        return files.RelocationBatchV2Launch('async_job_id', job_id)
+
+    def route_files_copy_batch_2(self, arg):
+        return self._relocate_batch(arg, move=False)
+
+    def route_files_move_batch_2(self, arg):
+        return self._relocate_batch(arg, move=True)
+
+    def route_files_copy_batch_check_2(self, arg):
+        return self._check_job(arg)
+
+    def route_files_move_batch_check_2(self, arg):
+        return self._check_job(arg)
+
+    def route_users_get_space_usage(self, arg):
+        used = sum(entry.size for entry in self.entries.values()
+                   if isinstance(entry, files.FileMetadata))
+        return users.SpaceUsage(used=used, allocation=users.SpaceAllocation(
+            'individual', users.IndividualSpaceAllocation(
+                allocated=2 * 1024 ** 3)))
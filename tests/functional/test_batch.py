@@ -0,0 +1,105 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import io
+import json
+
+import pytest
+
+from .fake_dropbox import FakeDropbox
+from tests.unit.cli.test_engine import BaseCLITest
+
+
+class TestBatch(BaseCLITest):
+    """
+    Tests of batch scripts run against a fake Dropbox API server.
+    """
+
+    @pytest.fixture
+    def server(self, mocker, tmpdir):
+        with FakeDropbox(tmpdir.mkdir('server').strpath) as server:
+            mocker.patch('dropme.client.get_client',
+                         return_value=server.get_client())
+            yield server
+
+    def run_script(self, tmpdir, capsys, script, expected_exit_code=0):
+        path = tmpdir.join('script.txt')
+        path.write(script)
+        assert self.exec_command('batch {0}'.format(path)) == \
+            expected_exit_code
+        out, _ = capsys.readouterr()
+        return [json.loads(line) for line in out.splitlines()]
+
+    def test_batch_requests(self, server, tmpdir, capsys):
+        server.put_file('/a.txt', b'a')
+        server.put_file('/b.txt', b'b')
+        server.put_file('/c.txt', b'c')
+        reports = self.run_script(tmpdir, capsys, '\n'.join([
+            '# Create folders',
+            'mkdir /x',
+            'mkdir /y',
+            '',
+            'cp /a.txt /x/a.txt',
+            'cp /b.txt /c.txt /y',
+            'rm /a.txt',
+            'rm /b.txt "/c.txt"',
+        ]))
+        assert [(report['line'], report['status']) for report in reports] \
+            == [(2, 0), (3, 0), (5, 0), (6, 0), (7, 0), (8, 0)]
+        assert server.requests.count('files/create_folder_batch') == 1
+        assert server.requests.count('files/copy_batch_v2') == 1
+        assert server.requests.count('files/delete_batch') == 1
+        assert sorted(server.entries) == ['/x', '/x/a.txt', '/y',
+                                          '/y/b.txt', '/y/c.txt']
+
+    def test_dependent_lines_not_combined(self, server, tmpdir, capsys):
+        server.put_file('/x/y.txt', b'y')
+        reports = self.run_script(tmpdir, capsys, '\n'.join([
+            'mkdir /a',
+            'mkdir /A/b',
+            'mkdir /e',
+            'mv /a/b /c',
+            'mv /c /d',
+            'rm /x/y.txt',
+            'rm /x',
+        ]))
+        assert [report['status'] for report in reports] == [0] * 7
+        assert server.requests.count('files/create_folder_batch') == 2
+        assert server.requests.count('files/move_batch_v2') == 2
+        assert server.requests.count('files/delete_batch') == 2
+        assert sorted(server.entries) == ['/a', '/d', '/e']
+
+    def test_failures_reported_per_line(self, server, tmpdir, capsys):
+        server.put_file('/a.txt', b'a')
+        reports = self.run_script(tmpdir, capsys, '\n'.join([
+            'rm /a.txt',
+            'rm /missing.txt',
+            'status /a.txt',
+            'frobnicate /a.txt',
+            'mkdir',
+        ]), expected_exit_code=1)
+        assert [report['status'] for report in reports] == [0, 1, 1, 2, 2]
+        assert "cannot process '/missing.txt'" in reports[1]['error']
+        assert 'Unknown command' in reports[3]['error']
+        assert 'required' in reports[4]['error']
+
+    def test_other_commands_run_concurrently(self, server, tmpdir, capsys):
+        for i in range(4):
+            tmpdir.join('{0}.txt'.format(i)).write(str(i))
+        server.latency = 0.2
+        script = '\n'.join('put {0} /d/{1}.txt'.format(
+            tmpdir.join('{0}.txt'.format(i)), i) for i in range(4))
+        reports = self.run_script(tmpdir, capsys,
+                                  script + '\nls /d -f value -c name\n')
+        assert [report['status'] for report in reports] == [0] * 5
+        assert reports[-1]['output'].split() == ['{0}.txt'.format(i)
+                                                 for i in range(4)]
+
+    def test_read_script_from_stdin(self, server, capsys, monkeypatch):
+        monkeypatch.setattr('sys.stdin', io.StringIO('mkdir /x\nmkdir /y\n'))
+        assert self.exec_command('batch -') == 0
+        out, _ = capsys.readouterr()
+        assert [json.loads(line)['status']
+                for line in out.splitlines()] == [0, 0]
+        assert sorted(server.entries) == ['/x', '/y']
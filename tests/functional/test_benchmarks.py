@@ -0,0 +1,19 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import json
+
+from benchmarks import suite
+
+
+def test_benchmarks_write_report(tmpdir, capsys):
+    output = tmpdir.join('report.json')
+    suite.main(['--file-size', '1', '--chunk-sizes', '1', '--workers', '2',
+                '--small-files', '3', '--entries', '5', '--repeat', '1',
+                '--output', output.strpath])
+    report = json.loads(output.read())
+    names = [result['name'] for result in report['results']]
+    assert names == ['put', 'get', 'get', 'put_small', 'ls', 'find',
+                     'startup', 'startup', 'startup']
+    assert all(result['rate'] > 0 for result in report['results'])
@@ -0,0 +1,78 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import io
+import os
+import threading
+
+import pytest
+
+from .fake_dropbox import FakeDropbox
+from dropme import daemon
+from tests.unit.cli.test_engine import BaseCLITest
+
+
+class TestDaemon(BaseCLITest):
+    """
+    Tests of commands run by dropme daemon against a fake Dropbox server.
+    """
+
+    @pytest.fixture
+    def server(self, mocker, tmpdir):
+        with FakeDropbox(tmpdir.mkdir('server').strpath) as server:
+            dbx = server.get_client()
+            dbx.metadata_ttl = 60
+            mocker.patch('dropme.client.get_client', return_value=dbx)
+            yield server
+
+    @pytest.fixture
+    def socket_path(self, server, tmpdir):
+        path = tmpdir.join('dropme.sock').strpath
+        daemon_server = daemon.Server(path)
+        thread = threading.Thread(target=daemon_server.serve)
+        thread.start()
+        yield path
+        daemon.stop(path)
+        thread.join()
+
+    @staticmethod
+    def call(socket_path, command):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        exit_code = daemon.call(command.split(), path=socket_path,
+                                stdout=stdout, stderr=stderr)
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    def test_run_commands(self, server, socket_path, tmpdir, monkeypatch):
+        tmpdir.join('a.txt').write(b'data', 'wb')
+        monkeypatch.chdir(tmpdir)
+        assert self.call(socket_path, 'put a.txt /dir/a.txt')[0] == 0
+        assert server.read_file('/dir/a.txt')[1] == b'data'
+        exit_code, out, _ = self.call(socket_path, 'ls /dir -f value')
+        assert exit_code == 0
+        assert out.split() == ['a.txt']
+        assert os.getcwd() == tmpdir.strpath
+
+    def test_failed_command(self, socket_path):
+        exit_code, _, err = self.call(socket_path, 'status /missing')
+        assert exit_code == 1
+        assert 'cannot fetch metadata' in err
+
+    def test_metadata_cached_until_changed(self, server, socket_path):
+        server.put_file('/a.txt', b'a')
+        for _ in range(3):
+            assert self.call(socket_path, 'status /a.txt')[0] == 0
+        assert server.requests.count('files/get_metadata') == 1
+        assert self.call(socket_path, 'rm /a.txt')[0] == 0
+        assert self.call(socket_path, 'status /a.txt')[0] == 1
+
+    def test_stop(self, server, tmpdir):
+        path = tmpdir.join('dropme.sock').strpath
+        daemon_server = daemon.Server(path, idle_timeout=10)
+        thread = threading.Thread(target=daemon_server.serve)
+        thread.start()
+        assert daemon.stop(path)
+        thread.join()
+        assert not os.path.exists(path)
+        assert not daemon.stop(path)
+        assert daemon.call(['ls', '/'], path=path) is None
@@ -0,0 +1,179 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import io
+import json
+import os
+import time
+
+import pytest
+from dropbox import files
+
+from .fake_dropbox import FakeDropbox
+from dropme.common import hashing
+from tests.unit.cli.test_engine import BaseCLITest
+
+
+class TestTransfers(BaseCLITest):
+    """
+    End to end tests of dropme commands against a fake Dropbox API server.
+    """
+
+    @pytest.fixture
+    def server(self, mocker, tmpdir):
+        with FakeDropbox(tmpdir.mkdir('server').strpath) as server:
+            mocker.patch('dropme.client.get_client',
+                         return_value=server.get_client())
+            yield server
+
+    @staticmethod
+    def _get_content(server, path):
+        return server.read_file(path)[1]
+
+    def test_upload_files_and_directories(self, server, tmpdir):
+        local = tmpdir.mkdir('local')
+        local.join('a.txt').write(b'a' * 10, 'wb')
+        local.mkdir('sub').join('b.txt').write(b'b' * 3000, 'wb')
+        local.join('c.txt').write(b'', 'wb')
+        self.exec_command('put {0} {1} {2} /backup --parallel 2'.format(
+            local.join('a.txt'), local.join('c.txt'), local.join('sub')))
+        assert self._get_content(server, '/backup/a.txt') == b'a' * 10
+        assert self._get_content(server, '/backup/c.txt') == b''
+        metadata = server.entries['/backup/sub/b.txt']
+        assert metadata.content_hash == hashing.content_hash(
+            local.join('sub', 'b.txt').strpath)
+
+    def test_upload_and_download_file_in_parts(self, server, tmpdir):
+        content = os.urandom(3 * 1024 * 1024 + 17)
+        src = tmpdir.join('src.bin')
+        src.write(content, 'wb')
+        self.exec_command('put {0} /big.bin --chunk-size 1'.format(src))
+        assert server.requests.count('files/upload_session/append_v2') == 2
+        assert self._get_content(server, '/big.bin') == content
+        dst = tmpdir.join('dst.bin')
+        self.exec_command('get /big.bin {0} --parallel 3 --chunk-size 1'
+                          ''.format(dst))
+        assert server.requests.count('files/download') == 4
+        assert dst.read_binary() == content
+        assert not tmpdir.join('dst.bin.part').exists()
+
+    @pytest.mark.parametrize('size, appends', [
+        (2 * 1024 * 1024, 1),
+        (2 * 1024 * 1024 + 17, 1),
+        (17, 0),
+    ])
+    def test_stream_stdin_and_stdout(self, server, mocker, capsysbinary,
+                                     size, appends):
+        content = os.urandom(size)
+        mocker.patch('sys.stdin', io.TextIOWrapper(io.BytesIO(content)))
+        self.exec_command('put - /dump.bin --chunk-size 1')
+        assert server.requests.count(
+            'files/upload_session/append_v2') == appends
+        assert self._get_content(server, '/dump.bin') == content
+        capsysbinary.readouterr()
+        self.exec_command('get /dump.bin -')
+        out, err = capsysbinary.readouterr()
+        assert out == content
+        assert b'successfully written to stdout' in err
+
+    def test_download_folder_recursively(self, server, tmpdir, capsys):
+        local = tmpdir.mkdir('local')
+        local.join('a.txt').write(b'a' * 10, 'wb')
+        local.mkdir('sub').join('b.txt').write(b'b' * 3000, 'wb')
+        local.join('sub', 'c.txt').write(b'', 'wb')
+        self.exec_command('put {0} {1} /project'.format(local.join('a.txt'),
+                                                        local.join('sub')))
+        self.exec_command('mkdir /project/empty')
+        server.page_size = 2
+        restored = tmpdir.join('restored')
+        self.exec_command('get -r /project {0} --parallel 2'.format(
+            restored))
+        out, _ = capsys.readouterr()
+        assert '3 file(s)' in out
+        assert server.requests.count('files/download') == 3
+        assert restored.join('a.txt').read_binary() == b'a' * 10
+        assert restored.join('sub', 'b.txt').read_binary() == b'b' * 3000
+        assert restored.join('sub', 'c.txt').read_binary() == b''
+        assert restored.join('empty').isdir()
+
+        restored.join('a.txt').write(b'changed', 'wb')
+        self.exec_command('get -r /project {0}'.format(restored))
+        out, _ = capsys.readouterr()
+        assert '2 identical file(s) were skipped' in out
+        assert server.requests.count('files/download') == 4
+        assert restored.join('a.txt').read_binary() == b'a' * 10
+
+    def test_list_folder_all_pages(self, server, capsys):
+        for i in range(5):
+            server.put_file('/foo/file{0}.txt'.format(i), b'data')
+        server.page_size = 2
+        self.exec_command('ls /foo -f value')
+        out, _ = capsys.readouterr()
+        assert out.split() == ['file{0}.txt'.format(i) for i in range(5)]
+        assert server.requests.count('files/list_folder/continue') == 2
+
+    def test_copy_move_and_delete_many(self, server):
+        for name in ('a', 'b', 'c'):
+            server.put_file('/src/{0}.txt'.format(name), name.encode())
+        self.exec_command('cp /src/a.txt /src/b.txt /copies')
+        self.exec_command('mv /src/c.txt /copies/c.txt')
+        assert self._get_content(server, '/copies/a.txt') == b'a'
+        assert self._get_content(server, '/copies/c.txt') == b'c'
+        assert '/src/c.txt' not in server.entries
+        self.exec_command('rm /copies/a.txt /copies/b.txt')
+        assert sorted(server.entries) == ['/copies', '/copies/c.txt',
+                                          '/src', '/src/a.txt', '/src/b.txt']
+
+    @pytest.mark.parametrize('status', [429, 503])
+    def test_retry_transient_errors(self, mocker, server, tmpdir, status):
+        mocker.patch('dropme.common.throttle.Throttle.BACKOFF_BASE', 0.01)
+        src = tmpdir.join('src.txt')
+        src.write(b'Some fake data', 'wb')
+        server.fail_next(status, count=2, retry_after=0)
+        self.exec_command('put {0} /dst.txt'.format(src))
+        assert server.requests == ['files/upload'] * 3
+        assert self._get_content(server, '/dst.txt') == b'Some fake data'
+
+    def test_sync_transfers_only_changed_files(self, server, tmpdir,
+                                               capsys):
+        local = tmpdir.mkdir('local')
+        local.join('a.txt').write(b'a', 'wb')
+        local.join('b.txt').write(b'b', 'wb')
+        self.exec_command('sync {0} /remote'.format(local))
+        local.join('b.txt').write(b'bb', 'wb')
+        capsys.readouterr()
+        self.exec_command('sync {0} /remote'.format(local))
+        out, _ = capsys.readouterr()
+        assert "upload: '{0}'".format(local.join('b.txt')) in out
+        assert '1 action(s) performed' in out
+        assert isinstance(server.entries['/remote/b.txt'],
+                          files.FileMetadata)
+        assert self._get_content(server, '/remote/b.txt') == b'bb'
+
+    def test_latency_and_bandwidth_cap(self, server, tmpdir):
+        server.latency = 0.05
+        server.bandwidth = 100 * 1024
+        server.put_file('/foo.bin', b'x' * 20 * 1024)
+        started = time.monotonic()
+        self.exec_command('get /foo.bin {0}'.format(tmpdir.join('foo.bin')))
+        assert time.monotonic() - started >= 0.25
+
+    def test_timing_and_trace(self, server, tmpdir, capsys):
+        src = tmpdir.join('src.bin')
+        src.write(b'x' * (3 * 1024 * 1024), 'wb')
+        trace = tmpdir.join('trace.jsonl')
+        server.fail_next(status=500)
+        self.exec_command('--timing --trace {0} put {1} /big.bin '
+                          '--chunk-size 1'.format(trace, src))
+        _, err = capsys.readouterr()
+        assert 'p95, ms' in err
+        assert 'files/upload_session/append_v2' in err
+        events = [json.loads(line) for line in trace.readlines()]
+        names = [event['name'] for event in events]
+        assert names.count('file.read') == 3
+        assert names.count('files/upload_session/finish') == 1
+        assert 'readahead.wait' in names
+        assert sum(event['args']['retries'] for event in events) == 1
+        assert sum(event['args']['bytes'] for event in events
+                   if event['name'] == 'file.read') == 3 * 1024 * 1024
@@ -2,12 +2,17 @@
 #    Copyright 2017 Vitalii Kulanov
 #
 
+import os
 import shlex
+import threading
+import time
 
 import pytest
 
 
 from dropme.app import main as main_mod
+from dropme import client
+from dropme.commands import files
 
 
 class BaseCLITest(object):
@@ -15,6 +20,18 @@ class BaseCLITest(object):
     Base class for testing CLI.
     """
 
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, monkeypatch, tmpdir):
+        cache_dir = tmpdir.mkdir('cache')
+        monkeypatch.setitem(os.environ, 'XDG_CACHE_HOME', cache_dir.strpath)
+        return cache_dir
+
+    @pytest.fixture(autouse=True)
+    def reset_client(self):
+        client.reset()
+        yield
+        client.reset()
+
     @pytest.fixture
     def mock_client(self, mocker):
         m_client = mocker.patch('dropme.client.get_client')
@@ -40,6 +57,28 @@ class TestBaseCommand(BaseCLITest):
     def test_run_command_w_token_as_parameter(self, mocker):
         token = '4145225aaFKL0dDlKY0323bcc8c37'
         args = 'whoami --token {0}'.format(token)
-        m_dropbox = mocker.patch('dropme.client.dropbox.Dropbox')
+        m_dropbox = mocker.patch('dropme.client.Client')
         self.exec_command(args)
-        m_dropbox.assert_called_once_with(token)
+        m_dropbox.assert_called_once_with(token,
+                                          throttle=client.get_throttle(),
+                                          session=client.get_session(),
+                                          metadata_ttl=None)
+
+    def test_hash_cache_created_once_by_threads(self, mocker):
+        def create():
+            time.sleep(0.05)
+            return mocker.Mock()
+
+        m_hash_cache = mocker.patch('dropme.common.hashing.HashCache',
+                                    side_effect=create)
+        command = files.FileGet(None, None)
+        caches = []
+        threads = [threading.Thread(
+            target=lambda: caches.append(command.hash_cache))
+            for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert m_hash_cache.call_count == 1
+        assert len(set(map(id, caches))) == 1
@@ -2,6 +2,7 @@
 #    Copyright 2017 Vitalii Kulanov
 #
 
+import json
 import os
 
 from datetime import datetime
@@ -12,6 +13,8 @@ from dropbox import exceptions
 
 from .test_engine import BaseCLITest
 from dropme import error
+from dropme.common import hashing
+from dropme.common import journal
 from dropme.common import utils
 
 
@@ -75,6 +78,240 @@ class TestFilesCommand(BaseCLITest):
                                                         mocker.ANY)],
             any_order=True)
 
+    def test_file_upload_w_auto_chunk_size(self, mock_client, mocker,
+                                           tmpdir):
+        file_content = b'Some fake data to be uploaded in adaptive chunks'
+        m_sizer = mocker.patch('dropme.commands.files.chunking.ChunkSizer')
+        m_sizer.return_value.size = 10
+        m_sizer.return_value.observe.return_value = 6
+        fake_file = tmpdir.join('fake_large_file.bin')
+        fake_file.write(file_content)
+        m_session_start = mock_client.files_upload_session_start.return_value
+        m_session_start.session_id = '4jFsLN63sa840dsw3'
+        mock_client.files_upload_session_finish.return_value = \
+            files.FileMetadata(path_display='/' + fake_file.basename,
+                               size=len(file_content))
+
+        args = 'put {0} --chunk-size auto --read-ahead 0'.format(
+            fake_file.strpath)
+        self.exec_command(args)
+
+        mock_client.files_upload_session_start.assert_called_once_with(
+            file_content[:10])
+        calls = mock_client.files_upload_session_append_v2.call_args_list
+        assert [len(c[0][0]) for c in calls] == [10, 6, 6, 6, 6]
+        mock_client.files_upload_session_finish.assert_called_once_with(
+            file_content[-4:], mocker.ANY, mocker.ANY)
+        observed = m_sizer.return_value.observe.call_args_list
+        assert [c[0][0] for c in observed] == [10, 6, 6, 6, 6]
+        m_sizer.return_value.save.assert_called_once_with()
+
+    def test_file_upload_w_invalid_chunk_size_fail(self, tmpdir, capsys):
+        fake_file = tmpdir.join('fake.bin')
+        fake_file.write(b'fake')
+        with pytest.raises(SystemExit):
+            self.exec_command('put {0} --chunk-size fast'.format(
+                fake_file.strpath))
+        _, err = capsys.readouterr()
+        assert "invalid chunk size: 'fast'" in err
+
+    def test_file_upload_in_parallel(self, mock_client, mocker, tmpdir):
+        chunk_size = 10
+        file_content = b'Some fake data to be uploaded concurrently'
+        mocker.patch('dropme.commands.files.utils.to_megabytes',
+                     return_value=chunk_size)
+        mocker.patch('dropme.commands.files.FilePut.'
+                     'CONCURRENT_CHUNK_ALIGNMENT', chunk_size)
+        fake_file = tmpdir.join('fake_large_file.bin')
+        fake_file.write(file_content)
+        file_size = len(file_content)
+
+        m_session_start = mock_client.files_upload_session_start.return_value
+        m_session_start.session_id = '4jFsLN63sa840dsw3'
+        fake_resp = files.FileMetadata(path_display='/' + fake_file.basename,
+                                       size=file_size)
+        mock_client.files_upload_session_finish.return_value = fake_resp
+
+        args = 'put {0} --chunk-size {1} --parallel 3'.format(
+            fake_file.strpath, chunk_size)
+        self.exec_command(args)
+
+        mock_client.files_upload_session_start.assert_called_once_with(
+            b'', session_type=files.UploadSessionType.concurrent)
+        calls = mock_client.files_upload_session_append_v2.call_args_list
+        chunks = sorted((c[0][1].offset, c[0][0], c[1]['close'])
+                        for c in calls)
+        assert [c[0] for c in chunks] == list(range(0, file_size, chunk_size))
+        assert b''.join(c[1] for c in chunks) == file_content
+        assert [c[2] for c in chunks] == [False] * (len(chunks) - 1) + [True]
+        commit_cursor = mock_client.files_upload_session_finish.call_args[0][1]
+        assert commit_cursor.offset == file_size
+
+    @pytest.mark.parametrize('chunk_size, expected', [
+        (14, 10), (20, 20), (7, 10)])
+    def test_file_upload_in_parallel_aligns_chunks_down(
+            self, mock_client, mocker, tmpdir, chunk_size, expected):
+        file_content = b'Some fake data to be uploaded concurrently'
+        mocker.patch('dropme.commands.files.utils.to_megabytes',
+                     return_value=chunk_size)
+        mocker.patch('dropme.commands.files.FilePut.'
+                     'CONCURRENT_CHUNK_ALIGNMENT', 10)
+        fake_file = tmpdir.join('fake_large_file.bin')
+        fake_file.write(file_content)
+        m_session_start = mock_client.files_upload_session_start.return_value
+        m_session_start.session_id = '4jFsLN63sa840dsw3'
+        mock_client.files_upload_session_finish.return_value = \
+            files.FileMetadata(path_display='/' + fake_file.basename,
+                               size=len(file_content))
+
+        self.exec_command('put {0} --chunk-size {1} --parallel 2'.format(
+            fake_file.strpath, chunk_size))
+
+        calls = mock_client.files_upload_session_append_v2.call_args_list
+        assert sorted(c[0][1].offset for c in calls) == list(
+            range(0, len(file_content), expected))
+
+    def test_file_upload_resume_from_journal(self, mock_client, mocker,
+                                             tmpdir):
+        chunk_size = 10
+        file_content = b'Some fake data to be uploaded by chunks'
+        mocker.patch('dropme.commands.files.utils.to_megabytes',
+                     return_value=chunk_size)
+        fake_file = tmpdir.join('fake_large_file.bin')
+        fake_file.write(file_content)
+        dst_path = '/' + fake_file.basename
+        journal.UploadJournal().update(fake_file.strpath, dst_path,
+                                       '4jFsLN63sa840dsw3', 20)
+        mock_client.files_upload_session_finish.return_value = \
+            files.FileMetadata(path_display=dst_path, size=len(file_content))
+
+        args = 'put {0} --chunk-size {1} --resume'.format(fake_file.strpath,
+                                                          chunk_size)
+        self.exec_command(args)
+
+        assert not mock_client.files_upload_session_start.called
+        append_call = mock_client.files_upload_session_append_v2.call_args
+        assert append_call[0][0] == file_content[20:30]
+        assert append_call[0][1].session_id == '4jFsLN63sa840dsw3'
+        mock_client.files_upload_session_finish.assert_called_once_with(
+            file_content[30:], mocker.ANY, mocker.ANY)
+        assert journal.UploadJournal().get(fake_file.strpath,
+                                           dst_path) is None
+
+    def test_file_upload_w_incorrect_offset(self, mock_client, mocker,
+                                            tmpdir):
+        chunk_size = 10
+        file_content = b'Some fake data to be uploaded by chunks'
+        mocker.patch('dropme.commands.files.utils.to_megabytes',
+                     return_value=chunk_size)
+        fake_file = tmpdir.join('fake_large_file.bin')
+        fake_file.write(file_content)
+        m_session_start = mock_client.files_upload_session_start.return_value
+        m_session_start.session_id = '4jFsLN63sa840dsw3'
+        offsets = []
+
+        def append(data, cursor):
+            offsets.append(cursor.offset)
+            if len(offsets) == 1:
+                raise exceptions.ApiError(
+                    request_id='ed9755c09d6f856ba81491ef2ec4a230',
+                    error=files.UploadSessionAppendError.incorrect_offset(
+                        files.UploadSessionOffsetError(correct_offset=5)),
+                    user_message_locale='',
+                    user_message_text='')
+
+        mock_client.files_upload_session_append_v2.side_effect = append
+        mock_client.files_upload_session_finish.return_value = \
+            files.FileMetadata(path_display='/' + fake_file.basename,
+                               size=len(file_content))
+
+        args = 'put {0} --chunk-size {1}'.format(fake_file.strpath,
+                                                 chunk_size)
+        self.exec_command(args)
+
+        assert offsets == [10, 5, 15, 25]
+        mock_client.files_upload_session_finish.assert_called_once_with(
+            file_content[35:], mocker.ANY, mocker.ANY)
+
+    def test_upload_multiple_files_and_directories(self, mock_client, mocker,
+                                                   tmpdir):
+        mocker.patch('dropme.commands.files.FilePut.BATCH_POLL_INTERVAL', 0)
+        mocker.patch('dropme.commands.files.FilePut.FINISH_BATCH_SIZE', 2)
+        tmpdir.join('dir', 'sub', 'a.txt').write('a', ensure=True)
+        tmpdir.join('dir', 'b.txt').write('bb')
+        tmpdir.join('c.txt').write('ccc')
+
+        m_session_start = mock_client.files_upload_session_start.return_value
+        m_session_start.session_id = '4jFsLN63sa840dsw3'
+        jobs = {}
+
+        def launch(entries):
+            job_id = 'job-{0}'.format(len(jobs))
+            jobs[job_id] = files.UploadSessionFinishBatchResult(entries=[
+                files.UploadSessionFinishBatchResultEntry.success(
+                    files.FileMetadata(path_display=e.commit.path, size=1))
+                for e in entries])
+            return files.UploadSessionFinishBatchLaunch.async_job_id(job_id)
+
+        def check(job_id):
+            return files.UploadSessionFinishBatchJobStatus.complete(
+                jobs[job_id])
+
+        mock_client.files_upload_session_finish_batch.side_effect = launch
+        mock_client.files_upload_session_finish_batch_check.side_effect = check
+
+        args = 'put {0} {1} /backup --parallel 2'.format(
+            tmpdir.join('dir').strpath, tmpdir.join('c.txt').strpath)
+        self.exec_command(args)
+
+        assert mock_client.files_upload_session_start.call_count == 3
+        mock_client.files_upload_session_start.assert_any_call(
+            b'bb', close=True)
+        launches = mock_client.files_upload_session_finish_batch.call_args_list
+        committed = sorted(e.commit.path for c in launches for e in c[0][0])
+        assert committed == ['/backup/c.txt', '/backup/dir/b.txt',
+                             '/backup/dir/sub/a.txt']
+        assert mock_client.files_upload_session_finish_batch.call_count == 2
+        assert (mock_client.files_upload_session_finish_batch_check.
+                call_count == 2)
+
+    def test_upload_identical_file_skipped(self, mock_client, tmpdir):
+        fake_file = tmpdir.join('fake.bin')
+        fake_file.write(b'Some fake data')
+        mock_client.files_get_metadata.return_value = files.FileMetadata(
+            path_display='/fake.bin', size=fake_file.size(),
+            content_hash=hashing.content_hash(fake_file.strpath))
+        self.exec_command('put {0} --skip-identical'.format(fake_file))
+        mock_client.files_get_metadata.assert_called_once_with('/fake.bin')
+        mock_client.files_upload.assert_not_called()
+
+    def test_upload_closes_hash_cache(self, mock_client, mocker, tmpdir):
+        fake_file = tmpdir.join('fake.bin')
+        fake_file.write(b'Some fake data')
+        mock_client.files_get_metadata.return_value = files.FileMetadata(
+            path_display='/fake.bin', size=fake_file.size(),
+            content_hash='0' * 64)
+        m_hash_cache = mocker.patch('dropme.common.hashing.HashCache')
+        self.exec_command('put {0} --skip-identical'.format(fake_file))
+        m_hash_cache.return_value.close.assert_called_once_with()
+
+    @pytest.mark.parametrize('command', ['put', 'get'])
+    def test_help_does_not_create_cache(self, cache_dir, command):
+        self.exec_command('help {0}'.format(command))
+        assert cache_dir.listdir() == []
+
+    def test_upload_changed_file_not_skipped(self, mock_client, tmpdir):
+        fake_file = tmpdir.join('fake.bin')
+        fake_file.write(b'Some fake data')
+        mock_client.files_get_metadata.return_value = files.FileMetadata(
+            path_display='/fake.bin', size=fake_file.size(),
+            content_hash='0' * 64)
+        mock_client.files_upload.return_value = files.FileMetadata(
+            path_display='/fake.bin', size=fake_file.size())
+        self.exec_command('put {0} --skip-identical'.format(fake_file))
+        mock_client.files_upload.assert_called_once_with(
+            b'Some fake data', '/fake.bin', autorename=False)
+
     def test_upload_non_existing_file_fail(self, mocker, capsys):
         mocker.patch('dropme.client.get_client')
         mocker.patch('dropme.commands.files.os.path.lexists',
@@ -86,6 +323,17 @@ class TestFilesCommand(BaseCLITest):
         out, err = capsys.readouterr()
         assert "File '{0}' does not exist".format(fake_file) in err
 
+    @pytest.mark.parametrize('args', ['put -', 'put - {0} /dst'])
+    def test_upload_stdin_wo_single_source_fail(self, mock_client, tmpdir,
+                                                capsys, args):
+        fake_file = tmpdir.join('fake_small_file.bin')
+        fake_file.write(b'fake')
+        with pytest.raises(SystemExit):
+            self.exec_command(args.format(fake_file.strpath))
+        _, err = capsys.readouterr()
+        assert "'-' (stdin) must be the only source" in err
+        assert not mock_client.files_upload.called
+
     def test_upload_file_insufficient_space_fail(self, mock_client, tmpdir):
         fake_file = tmpdir.join('fake_small_file.bin')
         fake_file.write('')
@@ -122,6 +370,39 @@ class TestFilesCommand(BaseCLITest):
         self.exec_command(args)
         mock_client.files_delete_v2.assert_called_once_with(path)
 
+    def test_delete_many_files_and_folders(self, mocker, mock_client, tmpdir):
+        mocker.patch('dropme.commands.files.FileFolderDelete.'
+                     'BATCH_POLL_INTERVAL', 0)
+        mocker.patch('dropme.commands.files.FileFolderDelete.BATCH_SIZE', 2)
+        list_file = tmpdir.join('paths.txt')
+        list_file.write('/bar/some.log\n/baz\n')
+        success = files.DeleteBatchResultEntry.success(
+            files.DeleteBatchResultData(files.FileMetadata(
+                name='some.log', path_display='/bar/some.log')))
+        failure = files.DeleteBatchResultEntry.failure(
+            files.DeleteError('path_lookup',
+                              files.LookupError('not_found', None)))
+        mock_client.files_delete_batch.side_effect = [
+            files.DeleteBatchLaunch.async_job_id('job-1'),
+            files.DeleteBatchLaunch.complete(
+                files.DeleteBatchResult([success]))]
+        mock_client.files_delete_batch_check.side_effect = [
+            files.DeleteBatchJobStatus('in_progress'),
+            files.DeleteBatchJobStatus.complete(
+                files.DeleteBatchResult([success, failure]))]
+
+        args = 'rm foo @{0}'.format(list_file.strpath)
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command(args)
+
+        batches = [[e.path for e in c[0][0]] for c in
+                   mock_client.files_delete_batch.call_args_list]
+        assert batches == [['/foo', '/bar/some.log'], ['/baz']]
+        mock_client.files_delete_batch_check.assert_called_with('job-1')
+        assert mock_client.files_delete_batch_check.call_count == 2
+        assert "rm: 1 of 3 path(s) could not be deleted." in str(
+            excinfo.value)
+
     def test_delete_w_non_specified_path_fail(self, mocker, capsys):
         mocker.patch('dropme.client.get_client')
         args = 'rm'
@@ -174,6 +455,108 @@ class TestFilesCommand(BaseCLITest):
         mock_client.files_download_to_file.assert_called_once_with(
             dst_path, path, rev=rev)
 
+    @staticmethod
+    def _fake_ranged_download(mocker, content):
+        def download(path, extra_headers=None):
+            start, end = extra_headers['Range'][len('bytes='):].split('-')
+            response = mocker.Mock(status_code=206)
+            response.iter_content.return_value = [
+                content[int(start):int(end) + 1]]
+            return None, response
+        return download
+
+    def test_download_file_in_parallel(self, mocker, mock_client, tmpdir):
+        chunk_size = 10
+        content = b'Some fake data to be downloaded by ranges'
+        mocker.patch('dropme.commands.files.utils.to_megabytes',
+                     return_value=chunk_size)
+        dst_path = tmpdir.join('bar.file').strpath
+        mock_client.files_get_metadata.return_value = files.FileMetadata(
+            name='bar.file', path_display='/foo/bar.file', rev='e320133f1',
+            size=len(content))
+        mock_client.files_download.side_effect = self._fake_ranged_download(
+            mocker, content)
+
+        args = 'get /foo/bar.file {0} --parallel 3 --chunk-size {1}'.format(
+            dst_path, chunk_size)
+        self.exec_command(args)
+
+        mock_client.files_get_metadata.assert_called_once_with(
+            '/foo/bar.file')
+        assert mock_client.files_download.call_count == 5
+        mock_client.files_download.assert_any_call(
+            'rev:e320133f1', extra_headers={'Range': 'bytes=40-40'})
+        with open(dst_path, 'rb') as f:
+            assert f.read() == content
+        assert not os.path.exists(dst_path + '.part')
+        assert not os.path.exists(dst_path + '.part.json')
+
+    def test_download_file_in_parallel_w_wrong_hash_fail(
+            self, mocker, mock_client, tmpdir):
+        content = b'Some fake data to be downloaded by ranges'
+        mocker.patch('dropme.commands.files.utils.to_megabytes',
+                     return_value=10)
+        dst_path = tmpdir.join('bar.file').strpath
+        mock_client.files_get_metadata.return_value = files.FileMetadata(
+            name='bar.file', path_display='/foo/bar.file', rev='e320133f1',
+            size=len(content), content_hash='0' * 64)
+        mock_client.files_download.side_effect = self._fake_ranged_download(
+            mocker, content)
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('get /foo/bar.file {0} --parallel 3 '
+                              '--chunk-size 10'.format(dst_path))
+        assert 'Content hash of the downloaded data does not match' in str(
+            excinfo.value)
+        assert tmpdir.listdir('bar.file*') == []
+
+    def test_download_folder_in_parallel_fail(self, mock_client):
+        mock_client.files_get_metadata.return_value = files.FolderMetadata(
+            name='foo', path_display='/foo')
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('get /foo --parallel 3')
+        assert "'/foo' is not a file" in str(excinfo.value)
+        mock_client.files_download.assert_not_called()
+
+    def test_download_file_in_parallel_resume(self, mocker, mock_client,
+                                              tmpdir):
+        chunk_size = 10
+        content = b'Some fake data to be downloaded by ranges'
+        mocker.patch('dropme.commands.files.utils.to_megabytes',
+                     return_value=chunk_size)
+        dst_path = tmpdir.join('bar.file').strpath
+        tmpdir.join('bar.file.part').write(
+            content[:20] + b'\0' * (len(content) - 20), 'wb')
+        tmpdir.join('bar.file.part.json').write(json.dumps(
+            {'rev': 'e320133f1', 'size': len(content),
+             'chunk_size': chunk_size, 'done': [0, 10]}))
+        mock_client.files_get_metadata.return_value = files.FileMetadata(
+            name='bar.file', path_display='/foo/bar.file', rev='e320133f1',
+            size=len(content))
+        mock_client.files_download.side_effect = self._fake_ranged_download(
+            mocker, content)
+
+        args = 'get /foo/bar.file {0} --parallel 2 --revision {1}'.format(
+            dst_path, 'e320133f1')
+        self.exec_command(args)
+
+        mock_client.files_get_metadata.assert_called_once_with(
+            'rev:e320133f1')
+        assert mock_client.files_download.call_count == 3
+        with open(dst_path, 'rb') as f:
+            assert f.read() == content
+
+    def test_download_identical_file_skipped(self, mock_client, tmpdir):
+        fake_file = tmpdir.join('bar.file')
+        fake_file.write(b'Some fake data')
+        mock_client.files_get_metadata.return_value = files.FileMetadata(
+            path_display='/foo/bar.file', size=fake_file.size(),
+            content_hash=hashing.content_hash(fake_file.strpath))
+        self.exec_command('get /foo/bar.file {0} --skip-identical'.format(
+            fake_file))
+        mock_client.files_get_metadata.assert_called_once_with(
+            '/foo/bar.file')
+        mock_client.files_download_to_file.assert_not_called()
+
     def test_download_w_non_specified_path_fail(self, mocker, capsys):
         mocker.patch('dropme.client.get_client')
         args = 'get'
@@ -202,6 +585,72 @@ class TestFilesCommand(BaseCLITest):
         assert "An error occurred while downloading '{0}'".format(
             path) in str(excinfo.value)
 
+    def test_download_folder_w_failed_file(self, mock_client, tmpdir):
+        mock_client.files_list_folder.return_value = files.ListFolderResult(
+            entries=[files.FileMetadata(
+                name='fake.log', path_lower='/foo/fake.log',
+                path_display='/foo/fake.log', rev='015f00000', size=3,
+                content_hash='0' * 64)],
+            cursor='cursor', has_more=False)
+        mock_client.files_download_to_file.side_effect = exceptions.ApiError(
+            request_id='ed9755c09d6f856ba81491ef2ec4a230',
+            error=files.DownloadError(
+                'path', files.LookupError('not_found', None)),
+            user_message_locale='',
+            user_message_text=''
+        )
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('get -r /foo {0}'.format(tmpdir))
+        mock_client.files_list_folder.assert_called_once_with(
+            '/foo', recursive=True)
+        mock_client.files_download_to_file.assert_called_once_with(
+            tmpdir.join('fake.log').strpath, '/foo/fake.log', rev='015f00000')
+        assert '1 file(s) failed to download' in str(excinfo.value)
+
+    def test_download_folder_streams_listing(self, mocker, mock_client,
+                                             tmpdir):
+        tmpdir.join('b.txt').write(b'bb')
+        mock_client.files_list_folder.return_value = files.ListFolderResult(
+            entries=[files.FileMetadata(
+                name='a.txt', path_lower='/foo/sub/a.txt',
+                path_display='/foo/sub/a.txt', rev='015f00000', size=3,
+                content_hash='0' * 64)],
+            cursor='cursor-1', has_more=True)
+        mock_client.files_list_folder_continue.return_value = \
+            files.ListFolderResult(entries=[files.FileMetadata(
+                name='b.txt', path_lower='/foo/b.txt',
+                path_display='/foo/b.txt', rev='015f00001', size=2,
+                content_hash=hashing.content_hash(
+                    tmpdir.join('b.txt').strpath))],
+                cursor='cursor-2', has_more=False)
+
+        def download(local_path, path, rev):
+            with open(local_path, 'wb') as f:
+                f.write(b'aaa')
+            return files.FileMetadata(path_display=path, size=3)
+
+        mock_client.files_download_to_file.side_effect = download
+        m_progress = mocker.patch('dropme.commands.files._progress')
+        pb = m_progress.return_value
+        pb.total = 0
+        self.exec_command('get -r /foo {0}'.format(tmpdir))
+        # The parent directory is created without a folder entry.
+        mock_client.files_download_to_file.assert_called_once_with(
+            tmpdir.join('sub', 'a.txt').strpath, '/foo/sub/a.txt',
+            rev='015f00000')
+        m_progress.assert_called_once_with(
+            total=0, unit="B", unit_scale=True, desc='Downloading',
+            miniters=1, ncols=80, mininterval=1)
+        # The skipped file is dropped from the total, not counted.
+        pb.update.assert_called_once_with(3)
+        assert pb.total == 3
+
+    def test_download_folder_w_revision_fail(self, mock_client):
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('get -r /foo --revision 015f')
+        assert '--revision cannot be used' in str(excinfo.value)
+        mock_client.files_list_folder.assert_not_called()
+
     @pytest.mark.parametrize(
         'path, include_media_info, include_deleted, include_has_members, '
         'response',
@@ -289,6 +738,30 @@ class TestFilesCommand(BaseCLITest):
             allow_ownership_transfer=True if '--allow-ownership-transfer'
                                              in arguments else False)
 
+    @pytest.mark.parametrize('command, method', [
+        ('cp', 'files_copy_batch_v2'),
+        ('mv', 'files_move_batch_v2')
+    ])
+    def test_copy_or_move_many_files_and_folders(self, mock_client, command,
+                                                 method):
+        getattr(mock_client, method).return_value = \
+            files.RelocationBatchV2Launch.complete(
+                files.RelocationBatchV2Result([
+                    files.RelocationBatchResultEntry.success(
+                        files.FileMetadata(name='a.txt',
+                                           path_display='/dst/a.txt')),
+                    files.RelocationBatchResultEntry.success(
+                        files.FolderMetadata(name='bar',
+                                             path_display='/dst/bar'))]))
+        args = '{0} /a.txt foo/bar /dst --auto-rename'.format(command)
+        self.exec_command(args)
+        entries = getattr(mock_client, method).call_args[0][0]
+        assert [(e.from_path, e.to_path) for e in entries] == [
+            ('/a.txt', '/dst/a.txt'), ('/foo/bar', '/dst/bar')]
+        assert getattr(mock_client, method).call_args[1]['autorename']
+        assert not mock_client.files_copy_v2.called
+        assert not mock_client.files_move_v2.called
+
     def test_copy_file_or_folder_non_existing_source_fail(self, mock_client):
         from_path = '/non/existing/path/fake.log'
         to_path = '/foo/bar/fake.log'
@@ -572,3 +1045,22 @@ class TestFilesCommand(BaseCLITest):
         out, err = capsys.readouterr()
         m = "error: the following arguments are required: path, -r/--revision"
         assert m in err
+
+    def test_hash_local_files(self, mocker, tmpdir):
+        mocker.patch('dropme.client.get_client')
+        m_print = mocker.patch('cliff.formatters.table.TableFormatter.'
+                               'emit_list')
+        tmpdir.join('a.bin').write(b'foo')
+        tmpdir.mkdir('sub').join('b.bin').write(b'bar')
+        self.exec_command('hash {0} --parallel 1'.format(tmpdir))
+        rows = list(m_print.call_args[0][1])
+        assert rows == [
+            [hashing.content_hash(path), path] for path in (
+                tmpdir.join('a.bin').strpath,
+                tmpdir.join('sub', 'b.bin').strpath)]
+
+    def test_hash_non_existing_path_fail(self, mocker, tmpdir):
+        mocker.patch('dropme.client.get_client')
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('hash {0}'.format(tmpdir.join('missing')))
+        assert "hash: cannot access" in str(excinfo.value)
@@ -2,6 +2,7 @@
 #    Copyright 2017 Vitalii Kulanov
 #
 
+import json
 import os
 
 from datetime import datetime
@@ -12,6 +13,7 @@ from dropbox import exceptions
 
 from .test_engine import BaseCLITest
 from dropme import error
+from dropme.commands import folder
 
 
 class TestFolderCommand(BaseCLITest):
@@ -22,12 +24,16 @@ class TestFolderCommand(BaseCLITest):
     @pytest.mark.parametrize('path, args, response', [
         ('root.folder', '', files.ListFolderResult(
             entries=[files.FolderMetadata(name='fake-folder-1'),
-                     files.FileMetadata(name='fake-file-1')])),
+                     files.FileMetadata(name='fake-file-1')],
+            cursor='ZtkX9_EHj3x7PMkVuFIhwKYXEpwpLwyxp9vMKomUhllil9q7eWiAu',
+            has_more=False)),
         ('/foo/bar', '--long-listing', files.ListFolderResult(
             entries=[files.FolderMetadata(name='fake-folder-1'),
                      files.FileMetadata(name='fake-file-1', size=1234,
                                         server_modified=datetime(2017, 10, 29,
-                                                                 11, 12, 54))])
+                                                                 11, 12, 54))],
+            cursor='ZtkX9_EHj3x7PMkVuFIhwKYXEpwpLwyxp9vMKomUhllil9q7eWiAu',
+            has_more=False)
          )
     ])
     def test_files_and_folders_list(self, mock_client, path, args, response):
@@ -37,6 +43,21 @@ class TestFolderCommand(BaseCLITest):
         self.exec_command(args)
         mock_client.files_list_folder.assert_called_once_with(path)
 
+    def test_files_and_folders_list_all_pages(self, mock_client, capsys):
+        cursor = 'ZtkX9_EHj3x7PMkVuFIhwKYXEpwpLwyxp9vMKomUhllil9q7eWiAu'
+        mock_client.files_list_folder.return_value = files.ListFolderResult(
+            entries=[files.FileMetadata(name='fake-file-1')],
+            cursor=cursor, has_more=True)
+        mock_client.files_list_folder_continue.return_value = \
+            files.ListFolderResult(
+                entries=[files.FileMetadata(name='fake-file-2')],
+                cursor=cursor, has_more=False)
+        self.exec_command('ls /foo --limit 1 -f value')
+        mock_client.files_list_folder.assert_called_once_with('/foo', limit=1)
+        mock_client.files_list_folder_continue.assert_called_once_with(cursor)
+        out, err = capsys.readouterr()
+        assert out.split() == ['fake-file-1', 'fake-file-2']
+
     def test_files_and_folders_list_non_existing_path_fail(self, mock_client):
         path = 'non_existing_folder_path'
         args = 'ls {0}'.format(path)
@@ -92,3 +113,82 @@ class TestFolderCommand(BaseCLITest):
             self.exec_command(args)
         out, err = capsys.readouterr()
         assert "error: the following arguments are required: path" in err
+
+    @pytest.mark.parametrize('root, max_depth, expected', [
+        ('', None, {'/': 7, '/a': 6, '/a/b': 4}),
+        ('', 0, {'/': 7}),
+        ('/a', None, {'/a': 6, '/a/b': 4}),
+    ])
+    def test_space_usage_aggregate(self, root, max_depth, expected):
+        items = [('/a/b/f1', 4), ('/a/f2', 2), ('/f3', 1)]
+        if root:
+            items = [i for i in items if i[0].startswith(root + '/')]
+        sizes, counts = folder.FolderSpaceUsageList.aggregate(
+            items, root, max_depth)
+        assert sizes == expected
+
+    def test_space_usage_list(self, mock_client, capsys):
+        cursor = 'ZtkX9_EHj3x7PMkVuFIhwKYXEpwpLwyxp9vMKomUhllil9q7eWiAu'
+        mock_client.files_list_folder.return_value = files.ListFolderResult(
+            entries=[files.FolderMetadata(name='bar',
+                                          path_display='/foo/bar'),
+                     files.FileMetadata(name='a', path_display='/foo/bar/a',
+                                        size=2048)],
+            cursor=cursor, has_more=True)
+        mock_client.files_list_folder_continue.return_value = \
+            files.ListFolderResult(
+                entries=[files.FileMetadata(name='b', path_display='/foo/b',
+                                            size=1024)],
+                cursor=cursor, has_more=False)
+        self.exec_command('du foo --top 1 -f csv')
+        mock_client.files_list_folder.assert_called_once_with(
+            '/foo', recursive=True)
+        mock_client.files_list_folder_continue.assert_called_once_with(cursor)
+        out, err = capsys.readouterr()
+        assert out.splitlines()[1:] == ['"3.0 KB",2,"/foo"']
+
+    def test_space_usage_list_non_existing_path_fail(self, mock_client):
+        mock_client.files_list_folder.side_effect = exceptions.ApiError(
+            request_id='ed9755c09d6f856ba81491ef2ec4a230',
+            error=files.ListFolderError(
+                'path', files.LookupError('not_found', None)),
+            user_message_locale='',
+            user_message_text=''
+        )
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('du /non/existing')
+        assert "du: cannot access '/non/existing'" in str(excinfo.value)
+
+    def test_watch_folder(self, mocker, mock_client, capsys):
+        m_sleep = mocker.patch('dropme.commands.folder.time.sleep')
+        mock_client.files_list_folder_get_latest_cursor.return_value = \
+            files.ListFolderGetLatestCursorResult(cursor='cursor-1')
+        mock_client.files_list_folder_longpoll.side_effect = [
+            files.ListFolderLongpollResult(changes=False, backoff=5),
+            files.ListFolderLongpollResult(changes=True)]
+        mock_client.files_list_folder_continue.return_value = \
+            files.ListFolderResult(
+                entries=[files.DeletedMetadata(name='old.txt',
+                                               path_display='/foo/old.txt')],
+                cursor='cursor-2', has_more=False)
+        self.exec_command('watch /foo --recursive --once --timeout 60')
+        m_latest_cursor = mock_client.files_list_folder_get_latest_cursor
+        m_latest_cursor.assert_called_once_with('/foo', recursive=True)
+        mock_client.files_list_folder_longpoll.assert_called_with(
+            'cursor-1', timeout=60)
+        m_sleep.assert_called_once_with(5)
+        out, err = capsys.readouterr()
+        assert [json.loads(line) for line in out.splitlines()] == [
+            {'type': 'deleted', 'name': 'old.txt', 'path': '/foo/old.txt'}]
+
+    def test_watch_folder_non_existing_path_fail(self, mock_client):
+        mock_client.files_list_folder_get_latest_cursor.side_effect = \
+            exceptions.ApiError(
+                request_id='ed9755c09d6f856ba81491ef2ec4a230',
+                error=files.ListFolderError(
+                    'path', files.LookupError('not_found', None)),
+                user_message_locale='',
+                user_message_text='')
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('watch /non/existing')
+        assert "watch: cannot watch '/non/existing'" in str(excinfo.value)
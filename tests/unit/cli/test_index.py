@@ -0,0 +1,88 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+from datetime import datetime
+
+import pytest
+from dropbox import exceptions
+from dropbox import files
+
+from .test_engine import BaseCLITest
+from dropme import error
+from dropme.common import index
+
+
+class TestIndexCommand(BaseCLITest):
+    """
+    Tests for dropme metadata index related commands.
+    """
+
+    @pytest.fixture
+    def indexed(self):
+        metadata_index = index.MetadataIndex()
+        metadata_index.apply(files.ListFolderResult(
+            entries=[files.FolderMetadata(name='foo', path_lower='/foo',
+                                          path_display='/foo', id='id:1'),
+                     files.FileMetadata(name='bar.txt', id='id:2',
+                                        path_lower='/foo/bar.txt',
+                                        path_display='/foo/bar.txt',
+                                        size=19, rev='a1c10ce0dd78',
+                                        client_modified=datetime(2017, 10,
+                                                                 29, 11, 12),
+                                        server_modified=datetime(2017, 10,
+                                                                 29, 11, 12))],
+            cursor='cursor-1', has_more=False))
+        metadata_index.close()
+
+    def test_index_sync(self, mock_client):
+        mock_client.files_list_folder.return_value = files.ListFolderResult(
+            entries=[files.FolderMetadata(name='foo', path_lower='/foo',
+                                          path_display='/foo', id='id:1')],
+            cursor='cursor-1', has_more=False)
+        self.exec_command('index sync')
+        mock_client.files_list_folder.assert_called_once_with(
+            '', recursive=True)
+        assert index.MetadataIndex().cursor == 'cursor-1'
+
+    def test_index_sync_fail(self, mock_client):
+        mock_client.files_list_folder.side_effect = exceptions.ApiError(
+            request_id='ed9755c09d6f856ba81491ef2ec4a230',
+            error=files.ListFolderError('other', None),
+            user_message_locale='',
+            user_message_text=''
+        )
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('index sync')
+        assert "index: cannot synchronize" in str(excinfo.value)
+
+    def test_list_folder_cached(self, mock_client, indexed, capsys):
+        self.exec_command('ls /foo --cached -f value')
+        assert not mock_client.files_list_folder.called
+        out, err = capsys.readouterr()
+        assert out.split() == ['bar.txt']
+
+    @pytest.mark.parametrize('path', ['', '/'])
+    def test_list_root_folder_cached(self, mock_client, indexed, capsys,
+                                     path):
+        self.exec_command('ls {0} --cached -f value'.format(path))
+        assert not mock_client.files_list_folder.called
+        out, err = capsys.readouterr()
+        assert out.split() == ['foo/']
+
+    def test_list_folder_cached_wo_index_fail(self, mock_client):
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('ls --cached')
+        assert "metadata index is empty" in str(excinfo.value)
+
+    def test_show_status_cached(self, mock_client, indexed, capsys):
+        self.exec_command('status /FOO/bar.txt --cached -f value -c path')
+        assert not mock_client.files_get_metadata.called
+        out, err = capsys.readouterr()
+        assert out.strip() == '/foo/bar.txt'
+
+    def test_show_status_cached_non_existing_path_fail(self, mock_client,
+                                                       indexed):
+        with pytest.raises(error.ActionException) as excinfo:
+            self.exec_command('status /non/existing --cached')
+        assert "not found in the metadata index" in str(excinfo.value)
@@ -0,0 +1,86 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import pytest
+from dropbox import files
+
+from .test_engine import BaseCLITest
+from dropme.common import hashing
+
+
+class TestSyncCommand(BaseCLITest):
+    """
+    Tests for dropme sync command.
+    """
+
+    @pytest.fixture
+    def local_dir(self, tmpdir):
+        local_dir = tmpdir.mkdir('local')
+        local_dir.join('same.txt').write('same')
+        local_dir.join('sub', 'changed.txt').write('local', ensure=True)
+        local_dir.join('new.txt').write('new')
+        return local_dir
+
+    @pytest.fixture
+    def remote(self, mock_client, local_dir):
+        same_hash = hashing.content_hash(local_dir.join('same.txt').strpath)
+        mock_client.files_list_folder.return_value = files.ListFolderResult(
+            entries=[
+                files.FileMetadata(name='same.txt', path_lower='/dst/same.txt',
+                                   path_display='/Dst/same.txt', size=4,
+                                   content_hash=same_hash),
+                files.FileMetadata(name='changed.txt',
+                                   path_lower='/dst/sub/changed.txt',
+                                   path_display='/Dst/sub/changed.txt',
+                                   size=5, content_hash='0' * 64),
+                files.FileMetadata(name='old.txt', path_lower='/dst/old.txt',
+                                   path_display='/Dst/old.txt', size=3,
+                                   content_hash='1' * 64)],
+            cursor='cursor-1', has_more=False)
+
+    def test_sync_upload(self, mock_client, local_dir, remote):
+        self.exec_command('sync {0} /dst --delete'.format(local_dir.strpath))
+        mock_client.files_list_folder.assert_called_once_with(
+            '/dst', recursive=True)
+        uploaded = sorted(c[0][1] for c in
+                          mock_client.files_upload.call_args_list)
+        assert uploaded == ['/dst/new.txt', '/dst/sub/changed.txt']
+        mock_client.files_upload.assert_any_call(
+            b'new', '/dst/new.txt', autorename=False,
+            mode=files.WriteMode.overwrite)
+        mock_client.files_delete_v2.assert_called_once_with('/Dst/old.txt')
+
+    def test_sync_upload_large_file_in_session(self, mock_client,
+                                               local_dir, remote):
+        local_dir.join('new.txt').write_binary(b'x' * (3 * 1024 * 1024))
+        m_session_start = mock_client.files_upload_session_start.return_value
+        m_session_start.session_id = '4jFsLN63sa840dsw3'
+        self.exec_command('sync {0} /dst --chunk-size 1'.format(
+            local_dir.strpath))
+        assert mock_client.files_upload_session_append_v2.call_count == 1
+        mock_client.files_upload_session_finish.assert_called_once_with(
+            b'x' * 1024 * 1024, files.UploadSessionCursor(
+                session_id='4jFsLN63sa840dsw3', offset=2 * 1024 * 1024),
+            files.CommitInfo(path='/dst/new.txt', autorename=False,
+                             mode=files.WriteMode.overwrite))
+
+    def test_sync_upload_dry_run(self, mock_client, local_dir, remote,
+                                 capsys):
+        self.exec_command('sync {0} /dst --dry-run'.format(local_dir.strpath))
+        assert not mock_client.files_upload.called
+        assert not mock_client.files_delete_v2.called
+        out, err = capsys.readouterr()
+        assert "2 action(s) planned." in out
+
+    def test_sync_download(self, mock_client, local_dir, remote):
+        self.exec_command('sync {0} /dst --download --delete'.format(
+            local_dir.strpath))
+        downloads = sorted(c[0] for c in
+                           mock_client.files_download_to_file.call_args_list)
+        assert downloads == [
+            (local_dir.join('old.txt').strpath, '/Dst/old.txt'),
+            (local_dir.join('sub', 'changed.txt').strpath,
+             '/Dst/sub/changed.txt')]
+        assert not local_dir.join('new.txt').exists()
+        assert local_dir.join('same.txt').exists()
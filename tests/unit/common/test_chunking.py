@@ -0,0 +1,89 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import json
+import threading
+
+import pytest
+
+from dropme.common import chunking
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def sizes_path(tmpdir):
+    return tmpdir.join('chunk_sizes.json')
+
+
+def test_default_size(sizes_path):
+    sizer = chunking.ChunkSizer(sizes_path.strpath, host='fake-host')
+    assert sizer.size == chunking.ChunkSizer.DEFAULT_CHUNK_SIZE
+
+
+def test_size_grows_on_fast_link(sizes_path):
+    sizer = chunking.ChunkSizer(sizes_path.strpath, host='fake-host')
+    # 8 MB in 0.5 seconds, the target is 4 seconds, so at most twice
+    # the size per request.
+    assert sizer.observe(8 * MB, 0.5) == 16 * MB
+    assert sizer.observe(16 * MB, 1.0) == 32 * MB
+    assert sizer.observe(32 * MB, 2.0) == 64 * MB
+    assert sizer.observe(64 * MB, 4.0) == 64 * MB
+
+
+def test_size_shrinks_on_slow_link(sizes_path):
+    sizer = chunking.ChunkSizer(sizes_path.strpath, host='fake-host')
+    assert sizer.observe(8 * MB, 32.0) == 4 * MB
+    assert sizer.observe(4 * MB, 16.0) == chunking.ChunkSizer.MIN_CHUNK_SIZE
+
+
+def test_size_stays_within_api_limit(sizes_path):
+    sizer = chunking.ChunkSizer(sizes_path.strpath, host='fake-host')
+    for _ in range(10):
+        sizer.observe(sizer.size, 0.1)
+    assert sizer.size == chunking.ChunkSizer.MAX_CHUNK_SIZE
+
+
+def test_size_ignores_empty_requests(sizes_path):
+    sizer = chunking.ChunkSizer(sizes_path.strpath, host='fake-host')
+    assert sizer.observe(0, 1.0) == sizer.size
+    assert sizer.throughput is None
+
+
+def test_size_is_stored_per_host(sizes_path):
+    sizes_path.write(json.dumps({'other-host': 4 * MB}))
+    sizer = chunking.ChunkSizer(sizes_path.strpath, host='fake-host')
+    sizer.observe(8 * MB, 0.5)
+    sizer.save()
+    assert json.loads(sizes_path.read()) == {'other-host': 4 * MB,
+                                             'fake-host': 16 * MB}
+    assert chunking.ChunkSizer(sizes_path.strpath,
+                               host='fake-host').size == 16 * MB
+
+
+def test_save_concurrently(sizes_path):
+    sizers = [chunking.ChunkSizer(sizes_path.strpath,
+                                  host='host-{0}'.format(i))
+              for i in range(8)]
+    threads = [threading.Thread(target=sizer.save) for sizer in sizers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(json.loads(sizes_path.read())) == sorted(
+        sizer.host for sizer in sizers)
+    assert not sizes_path.dirpath().listdir('*.tmp')
+
+
+def test_save_fail_ignored(tmpdir):
+    sizer = chunking.ChunkSizer(tmpdir.join('missing', 'sizes.json').strpath,
+                                host='fake-host')
+    sizer.save()
+    assert not tmpdir.join('missing').exists()
+
+
+def test_size_w_corrupted_file(sizes_path):
+    sizes_path.write('not json')
+    sizer = chunking.ChunkSizer(sizes_path.strpath, host='fake-host')
+    assert sizer.size == chunking.ChunkSizer.DEFAULT_CHUNK_SIZE
@@ -0,0 +1,157 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import asyncio
+import os
+
+import pytest
+from dropbox import files
+
+from dropme.common import engine
+
+
+@pytest.fixture
+def m_client(mocker):
+    return mocker.Mock()
+
+
+def test_map_unordered_limits_items_in_progress(m_client):
+    state = {'running': 0, 'max_running': 0}
+
+    async def double(item):
+        state['running'] += 1
+        state['max_running'] = max(state['max_running'], state['running'])
+        await asyncio.sleep(0)
+        state['running'] -= 1
+        return item * 2
+
+    with engine.TransferEngine(m_client, concurrency=2) as transfer:
+        results = list(transfer.iterate(
+            transfer.map_unordered(double, range(20), limit=3)))
+    assert sorted(results) == [i * 2 for i in range(20)]
+    assert state['max_running'] == 3
+
+
+def test_map_unordered_takes_async_iterable(m_client):
+    taken = []
+
+    async def items():
+        for i in range(10):
+            taken.append(i)
+            yield i
+
+    async def double(item):
+        # No more than 'limit' items are taken ahead of finished ones.
+        assert len(taken) <= item + 2
+        await asyncio.sleep(0)
+        return item * 2
+
+    with engine.TransferEngine(m_client, concurrency=1) as transfer:
+        results = list(transfer.iterate(
+            transfer.map_unordered(double, items(), limit=2)))
+    assert sorted(results) == [i * 2 for i in range(10)]
+
+
+def test_call_runs_in_worker_thread(m_client):
+    with engine.TransferEngine(m_client) as transfer:
+        assert transfer.run(transfer.call(pow, 2, 10)) == 1024
+
+
+def test_iter_folder_fetches_all_pages(m_client):
+    pages = [files.ListFolderResult(entries=[files.FolderMetadata(
+        name=str(i))], cursor=str(i), has_more=i < 2) for i in range(3)]
+    m_client.files_list_folder_continue.side_effect = pages[1:]
+    with engine.TransferEngine(m_client, concurrency=1) as transfer:
+        names = [entry.name for entry in
+                 transfer.iterate(transfer.iter_folder(pages[0]))]
+    assert names == ['0', '1', '2']
+    assert [c[0][0] for c in
+            m_client.files_list_folder_continue.call_args_list] == ['0', '1']
+
+
+def test_upload_to_session(m_client, tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    m_client.files_upload_session_start.return_value = \
+        files.UploadSessionStartResult(session_id='session-id')
+    with engine.TransferEngine(m_client) as transfer:
+        cursor = transfer.run(transfer.upload_to_session(fake_file.strpath,
+                                                         4))
+    assert (cursor.session_id, cursor.offset) == ('session-id', 10)
+    m_client.files_upload_session_start.assert_called_once_with(
+        b'0123', close=False)
+    calls = m_client.files_upload_session_append_v2.call_args_list
+    assert [(c[0][0], c[1]['close']) for c in calls] == [
+        (b'4567', False), (b'89', True)]
+
+
+def test_upload_to_session_limits_buffered_chunks(mocker, m_client, tmpdir):
+    state = {'held': 0, 'max_held': 0}
+    read = engine.fileio.ChunkReader.read
+
+    def hold(reader, *args):
+        state['held'] += 1
+        state['max_held'] = max(state['max_held'], state['held'])
+        return read(reader, *args)
+
+    def send(*args, **kwargs):
+        state['held'] -= 1
+        return files.UploadSessionStartResult(session_id='session-id')
+
+    mocker.patch.object(engine.fileio.ChunkReader, 'read', hold)
+    m_client.files_upload_session_start.side_effect = send
+    m_client.files_upload_session_append_v2.side_effect = send
+    paths = []
+    for i in range(8):
+        fake_file = tmpdir.join('fake{0}.bin'.format(i))
+        fake_file.write(b'0123456789')
+        paths.append(fake_file.strpath)
+    with engine.TransferEngine(m_client, concurrency=2) as transfer:
+        list(transfer.iterate(transfer.map_unordered(
+            lambda path: transfer.upload_to_session(path, 2), paths)))
+    assert m_client.files_upload_session_append_v2.call_count == 32
+    assert state['max_held'] <= 2
+
+
+def test_download_range(mocker, m_client, tmpdir):
+    response = mocker.Mock(status_code=206)
+    response.iter_content.return_value = [b'456', b'7']
+    m_client.files_download.return_value = (None, response)
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123____89')
+    callback = mocker.Mock()
+    fd = os.open(fake_file.strpath, os.O_RDWR)
+    try:
+        with engine.TransferEngine(m_client) as transfer:
+            assert transfer.run(transfer.download_range(
+                'rev:abc', fd, 4, 4, callback)) == 4
+    finally:
+        os.close(fd)
+    assert fake_file.read_binary() == b'0123456789'
+    m_client.files_download.assert_called_once_with(
+        'rev:abc', extra_headers={'Range': 'bytes=4-7'})
+    assert [c[0][0] for c in callback.call_args_list] == [3, 1]
+    response.close.assert_called_once_with()
+
+
+@pytest.mark.parametrize('status_code, blocks, message', [
+    (200, [b'0123456789'], 'HTTP status 200'),
+    (206, [b'45'], 'got 2 bytes only'),
+    (206, [b'456', b'78'], 'more data than requested'),
+])
+def test_download_range_w_wrong_response_fail(mocker, m_client, tmpdir,
+                                              status_code, blocks, message):
+    response = mocker.Mock(status_code=status_code)
+    response.iter_content.return_value = blocks
+    m_client.files_download.return_value = (None, response)
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123____89')
+    fd = os.open(fake_file.strpath, os.O_RDWR)
+    try:
+        with engine.TransferEngine(m_client) as transfer:
+            with pytest.raises(IOError, match=message):
+                transfer.run(transfer.download_range('rev:abc', fd, 4, 4))
+    finally:
+        os.close(fd)
+    assert len(fake_file.read_binary()) == 10
@@ -0,0 +1,104 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import os
+import time
+
+import pytest
+
+from dropme.common import fileio
+from dropme.common import tracing
+
+
+def test_chunk_reader(tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    with fileio.ChunkReader(fake_file.strpath) as reader:
+        assert reader.size == 10
+        assert reader.read(4, 4) == b'4567'
+        assert reader.read(8, 4) == b'89'
+        assert reader.read(6) == b'6789'
+        assert reader.read(10, 4) == b''
+        reader.release(0, 10)
+    assert reader.fd is None
+
+
+def test_chunk_reader_traces_reads(tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    tracer = tracing.enable()
+    try:
+        with fileio.ChunkReader(fake_file.strpath) as reader:
+            reader.read(0, 4)
+    finally:
+        tracing.disable()
+    assert [(s.name, s.bytes) for s in tracer.spans] == [('file.read', 4)]
+
+
+def test_chunk_reader_advises_kernel(mocker, tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    m_advise = mocker.patch.object(os, 'posix_fadvise', create=True)
+    with fileio.ChunkReader(fake_file.strpath) as reader:
+        reader.read(0, 4)
+        reader.release(0, 4)
+    assert m_advise.call_args_list == [
+        mocker.call(mocker.ANY, 0, 0, os.POSIX_FADV_SEQUENTIAL),
+        mocker.call(mocker.ANY, 0, 4, os.POSIX_FADV_DONTNEED)]
+
+
+def test_chunk_reader_wo_fadvise(mocker, tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    mocker.patch.object(os, 'posix_fadvise', create=True,
+                        side_effect=OSError)
+    with fileio.ChunkReader(fake_file.strpath) as reader:
+        reader.release(0, 4)
+        assert reader.read(0, 4) == b'0123'
+
+
+def test_read_ahead(tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    with fileio.ChunkReader(fake_file.strpath) as reader, \
+            fileio.ReadAhead(reader, 4) as chunks:
+        assert [chunks.read(offset) for offset in (0, 4, 8, 10)] == [
+            b'0123', b'4567', b'89', b'']
+        # Reading ahead restarts from another offset, e.g. on retries.
+        assert chunks.read(2) == b'2345'
+        assert chunks.read(6) == b'6789'
+    assert chunks._thread is None
+
+
+def test_read_ahead_prefetches_chunks(mocker, tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    with fileio.ChunkReader(fake_file.strpath) as reader:
+        m_read = mocker.patch.object(reader, 'read', wraps=reader.read)
+        with fileio.ReadAhead(reader, 2, depth=2) as chunks:
+            assert chunks.read(0) == b'01'
+            # Two chunks are queued and the next one waits to be queued.
+            while m_read.call_count < 4:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            assert m_read.call_count == 4
+
+
+def test_read_ahead_wo_depth(tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    with fileio.ChunkReader(fake_file.strpath) as reader, \
+            fileio.ReadAhead(reader, 4, depth=0) as chunks:
+        assert chunks.read(4) == b'4567'
+        assert chunks._thread is None
+
+
+def test_read_ahead_raises_read_errors(mocker, tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'0123456789')
+    with fileio.ChunkReader(fake_file.strpath) as reader:
+        mocker.patch.object(reader, 'read', side_effect=OSError('EIO'))
+        with fileio.ReadAhead(reader, 4) as chunks:
+            with pytest.raises(OSError, match='EIO'):
+                chunks.read(0)
@@ -0,0 +1,65 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import hashlib
+
+import pytest
+
+from dropme.common import hashing
+
+
+@pytest.mark.parametrize('data, block_size', [
+    (b'', 4),
+    (b'abc', 4),
+    (b'abcd', 4),
+    (b'abcdefghij', 4),
+])
+def test_content_hash(tmpdir, data, block_size):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(data, 'wb')
+    blocks = [data[i:i + block_size] for i in range(0, len(data), block_size)]
+    expected = hashlib.sha256(b''.join(
+        hashlib.sha256(block).digest() for block in blocks)).hexdigest()
+    assert hashing.content_hash(fake_file.strpath, block_size) == expected
+
+
+def test_content_hash_of_empty_file(tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'', 'wb')
+    assert hashing.content_hash(fake_file.strpath) == (
+        'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855')
+
+
+def test_hash_cache_reuses_hash_of_unchanged_file(mocker, tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'Some fake data', 'wb')
+    cache = hashing.HashCache(tmpdir.join('hashes.sqlite').strpath)
+    expected = hashing.content_hash(fake_file.strpath)
+    assert cache.get_content_hash(fake_file.strpath) == expected
+    m_hash = mocker.patch('dropme.common.hashing.content_hash')
+    assert cache.get_content_hash(fake_file.strpath) == expected
+    m_hash.assert_not_called()
+
+
+def test_hash_cache_invalidated_by_file_change(tmpdir):
+    fake_file = tmpdir.join('fake.bin')
+    fake_file.write(b'Some fake data', 'wb')
+    cache = hashing.HashCache(tmpdir.join('hashes.sqlite').strpath)
+    cache.get_content_hash(fake_file.strpath)
+    fake_file.write(b'Some other fake data', 'wb')
+    assert cache.get_content_hash(fake_file.strpath) == (
+        hashing.content_hash(fake_file.strpath))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_hash_cache_get_content_hashes(tmpdir, workers):
+    paths = []
+    for i in range(3):
+        fake_file = tmpdir.join('fake{0}.bin'.format(i))
+        fake_file.write(b'data' * i, 'wb')
+        paths.append(fake_file.strpath)
+    cache = hashing.HashCache(tmpdir.join('hashes.sqlite').strpath)
+    cache.get_content_hash(paths[0])
+    hashes = cache.get_content_hashes(paths, workers=workers)
+    assert hashes == {path: hashing.content_hash(path) for path in paths}
@@ -0,0 +1,101 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+from datetime import datetime
+
+import pytest
+from dropbox import exceptions
+from dropbox import files
+
+from dropme.common import index
+
+
+def _file(path, size=10):
+    return files.FileMetadata(
+        name=path.rsplit('/', 1)[-1], id='id:' + path, path_lower=path.lower(),
+        path_display=path, size=size, rev='a1c10ce0dd78',
+        content_hash='20978837' * 8,
+        client_modified=datetime(2017, 10, 29, 11, 12, 54),
+        server_modified=datetime(2017, 10, 29, 11, 12, 54))
+
+
+def _folder(path):
+    return files.FolderMetadata(name=path.rsplit('/', 1)[-1], id='id:' + path,
+                                path_lower=path.lower(), path_display=path)
+
+
+@pytest.fixture
+def metadata_index(tmpdir):
+    m_index = index.MetadataIndex(tmpdir.join('index.sqlite').strpath)
+    yield m_index
+    m_index.close()
+
+
+def test_metadata_index_initial_sync(mocker, metadata_index):
+    m_client = mocker.Mock()
+    m_client.files_list_folder.return_value = files.ListFolderResult(
+        entries=[_folder('/Foo'), _file('/Foo/bar.txt')],
+        cursor='cursor-1', has_more=True)
+    m_client.files_list_folder_continue.return_value = files.ListFolderResult(
+        entries=[_file('/baz.txt', 3)], cursor='cursor-2', has_more=False)
+
+    assert metadata_index.is_empty()
+    assert metadata_index.sync(m_client) == 3
+
+    m_client.files_list_folder.assert_called_once_with('', recursive=True)
+    assert metadata_index.cursor == 'cursor-2'
+    names = [e.name for e in metadata_index.iter_folder('')]
+    assert names == ['Foo', 'baz.txt']
+    entry = metadata_index.get_metadata('/foo/BAR.txt')
+    assert isinstance(entry, files.FileMetadata)
+    assert entry.path_display == '/Foo/bar.txt'
+    assert entry.server_modified == datetime(2017, 10, 29, 11, 12, 54)
+
+
+def test_metadata_index_incremental_sync(mocker, metadata_index):
+    m_client = mocker.Mock()
+    metadata_index.apply(files.ListFolderResult(
+        entries=[_folder('/Foo'), _file('/Foo/bar.txt'), _file('/Foo_x')],
+        cursor='cursor-1', has_more=False))
+    m_client.files_list_folder_continue.return_value = files.ListFolderResult(
+        entries=[files.DeletedMetadata(name='Foo', path_lower='/foo'),
+                 _file('/new.txt')],
+        cursor='cursor-2', has_more=False)
+
+    assert metadata_index.sync(m_client) == 2
+
+    m_client.files_list_folder_continue.assert_called_once_with('cursor-1')
+    assert not m_client.files_list_folder.called
+    assert metadata_index.get_metadata('/foo/bar.txt') is None
+    names = [e.name for e in metadata_index.iter_folder('/')]
+    assert names == ['Foo_x', 'new.txt']
+
+
+def test_metadata_index_sync_w_reset_cursor(mocker, metadata_index):
+    m_client = mocker.Mock()
+    metadata_index.apply(files.ListFolderResult(
+        entries=[_file('/old.txt')], cursor='cursor-1', has_more=False))
+    m_client.files_list_folder_continue.side_effect = exceptions.ApiError(
+        request_id='ed9755c09d6f856ba81491ef2ec4a230',
+        error=files.ListFolderContinueError.reset,
+        user_message_locale='',
+        user_message_text='')
+    m_client.files_list_folder.return_value = files.ListFolderResult(
+        entries=[_file('/new.txt')], cursor='cursor-2', has_more=False)
+
+    assert metadata_index.sync(m_client) == 1
+
+    assert metadata_index.get_metadata('/old.txt') is None
+    assert metadata_index.get_metadata('/new.txt').name == 'new.txt'
+
+
+def test_metadata_index_iter_file_sizes(metadata_index):
+    metadata_index.apply(files.ListFolderResult(
+        entries=[_folder('/Foo'), _file('/Foo/bar.txt', 5),
+                 _file('/Foo_x', 3), _file('/baz.txt', 1)],
+        cursor='cursor-1', has_more=False))
+    assert list(metadata_index.iter_file_sizes('/foo')) == [
+        ('/Foo/bar.txt', 5)]
+    assert sorted(metadata_index.iter_file_sizes('')) == [
+        ('/Foo/bar.txt', 5), ('/Foo_x', 3), ('/baz.txt', 1)]
@@ -0,0 +1,66 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import concurrent.futures
+import os
+
+from dropme.common import journal
+
+
+def test_upload_journal_update_and_get(tmpdir):
+    fake_file = tmpdir.join('fake_file.bin')
+    fake_file.write('Some fake data')
+    journal_path = tmpdir.join('uploads.json').strpath
+    upload_journal = journal.UploadJournal(journal_path)
+    upload_journal.update(fake_file.strpath, '/foo/bar.bin', 'AAA1', 10)
+
+    entry = journal.UploadJournal(journal_path).get(fake_file.strpath,
+                                                    '/foo/bar.bin')
+    assert entry['session_id'] == 'AAA1'
+    assert entry['offset'] == 10
+    assert entry['destination'] == '/foo/bar.bin'
+    assert upload_journal.get(fake_file.strpath, '/foo/other.bin') is None
+
+
+def test_upload_journal_ignores_changed_file(tmpdir):
+    fake_file = tmpdir.join('fake_file.bin')
+    fake_file.write('Some fake data')
+    upload_journal = journal.UploadJournal(tmpdir.join('j.json').strpath)
+    upload_journal.update(fake_file.strpath, '/bar.bin', 'AAA1', 10)
+    fake_file.write('Some other fake data')
+    assert upload_journal.get(fake_file.strpath, '/bar.bin') is None
+
+
+def test_upload_journal_remove(tmpdir):
+    fake_file = tmpdir.join('fake_file.bin')
+    fake_file.write('Some fake data')
+    journal_path = tmpdir.join('uploads.json').strpath
+    upload_journal = journal.UploadJournal(journal_path)
+    upload_journal.update(fake_file.strpath, '/bar.bin', 'AAA1', 10)
+    upload_journal.remove(fake_file.strpath, '/bar.bin')
+    assert journal.UploadJournal(journal_path).get(fake_file.strpath,
+                                                   '/bar.bin') is None
+
+
+def test_upload_journal_concurrent_writers(tmpdir):
+    journal_path = tmpdir.join('uploads.json').strpath
+    fake_files = []
+    for i in range(4):
+        fake_file = tmpdir.join('fake_file{0}.bin'.format(i))
+        fake_file.write('Some fake data')
+        fake_files.append(fake_file.strpath)
+
+    def upload(file_src):
+        upload_journal = journal.UploadJournal(journal_path)
+        for offset in range(20):
+            upload_journal.update(file_src, '/bar.bin', 'AAA1', offset)
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        list(executor.map(upload, fake_files))
+    upload_journal = journal.UploadJournal(journal_path)
+    assert [upload_journal.get(file_src, '/bar.bin')['offset']
+            for file_src in fake_files] == [19] * 4
+    assert sorted(os.listdir(tmpdir.strpath)) == sorted(
+        [os.path.basename(path) for path in fake_files] +
+        ['uploads.json', 'uploads.json.lock'])
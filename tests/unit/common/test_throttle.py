@@ -0,0 +1,89 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import pytest
+import requests
+from dropbox import exceptions
+
+from dropme.common import throttle
+
+
+@pytest.fixture
+def m_sleep(mocker):
+    return mocker.patch('dropme.common.throttle.time.sleep')
+
+
+def test_token_bucket_unlimited():
+    bucket = throttle.TokenBucket()
+    assert [bucket.get_delay() for _ in range(100)] == [0] * 100
+
+
+def test_token_bucket_limits_rate(mocker):
+    mocker.patch('dropme.common.throttle.time.monotonic', return_value=10.0)
+    bucket = throttle.TokenBucket(rate=2)
+    assert bucket.get_delay() == 0
+    assert bucket.get_delay() == 0
+    assert bucket.get_delay() == pytest.approx(0.5)
+    assert bucket.get_delay() == pytest.approx(1.0)
+
+
+def test_token_bucket_pause(mocker):
+    mocker.patch('dropme.common.throttle.time.monotonic', return_value=10.0)
+    bucket = throttle.TokenBucket()
+    bucket.pause(3)
+    bucket.pause(1)
+    assert bucket.get_delay() == pytest.approx(3)
+
+
+def test_aimd_limiter():
+    limiter = throttle.AIMDLimiter(8)
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    limiter.on_throttle()
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 1
+    for _ in range(1 + 2 + 3):
+        limiter.on_success()
+    assert limiter.limit == 4
+
+
+def test_throttle_retries_rate_limit_after_requested_delay(mocker, m_sleep):
+    mocker.patch('dropme.common.throttle.random.uniform', return_value=0)
+    t = throttle.Throttle(max_concurrency=4)
+    m_pause = mocker.spy(t.bucket, 'pause')
+    func = mocker.Mock(side_effect=[
+        exceptions.RateLimitError('request-id', backoff=2), 'result'])
+    assert t.call(func, 'arg', key='value') == 'result'
+    assert func.call_count == 2
+    func.assert_called_with('arg', key='value')
+    m_pause.assert_called_once_with(2)
+    assert t.limiter.limit == 2
+
+
+@pytest.mark.parametrize('exc', [
+    exceptions.InternalServerError('request-id', 503, 'Unavailable'),
+    requests.exceptions.ConnectionError('Connection reset'),
+])
+def test_throttle_retries_transient_errors(mocker, m_sleep, exc):
+    func = mocker.Mock(side_effect=[exc, exc, 'result'])
+    assert throttle.Throttle().call(func) == 'result'
+    assert m_sleep.call_count == 2
+
+
+def test_throttle_gives_up_after_max_retries(mocker, m_sleep):
+    func = mocker.Mock(side_effect=exceptions.InternalServerError(
+        'request-id', 500, 'Internal error'))
+    with pytest.raises(exceptions.InternalServerError):
+        throttle.Throttle(max_retries=2).call(func)
+    assert func.call_count == 3
+
+
+def test_throttle_does_not_retry_api_errors(mocker, m_sleep):
+    func = mocker.Mock(side_effect=exceptions.ApiError(
+        'request-id', 'path/not_found', None, None))
+    with pytest.raises(exceptions.ApiError):
+        throttle.Throttle().call(func)
+    assert func.call_count == 1
+    m_sleep.assert_not_called()
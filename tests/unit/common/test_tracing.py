@@ -0,0 +1,83 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import json
+
+import pytest
+
+from dropme.common import tracing
+
+
+@pytest.fixture
+def tracer():
+    tracer = tracing.enable()
+    yield tracer
+    tracing.disable()
+
+
+def test_span_wo_tracer():
+    with tracing.span('files/upload') as span:
+        assert span is None
+
+
+def test_span(tracer):
+    with tracing.span('files/upload', 10) as span:
+        tracing.add_retry()
+        tracing.add_retry()
+    assert tracer.spans == [span]
+    assert (span.name, span.bytes, span.retries, span.status) == \
+        ('files/upload', 10, 2, 'ok')
+    assert span.duration > 0
+
+
+def test_span_w_error(tracer):
+    with pytest.raises(ValueError):
+        with tracing.span('files/upload'):
+            raise ValueError
+    assert tracer.spans[0].status == 'ValueError'
+
+
+def test_nested_spans_count_own_retries(tracer):
+    with tracing.span('outer'):
+        with tracing.span('inner'):
+            tracing.add_retry()
+        tracing.add_retry()
+        tracing.add_retry()
+    assert [(span.name, span.retries) for span in tracer.spans] == \
+        [('inner', 1), ('outer', 2)]
+
+
+def test_summary(tracer):
+    for duration in range(1, 101):
+        tracing.record('files/download', 0, duration / 1000.0, 10)
+    tracing.record('file.write', 0, 1.0)
+    summary = tracer.get_summary()
+    assert [row['name'] for row in summary] == ['files/download',
+                                                'file.write']
+    row = summary[0]
+    assert (row['count'], row['bytes']) == (100, 1000)
+    assert (row['p50'], row['p95'], row['p99']) == (0.05, 0.095, 0.099)
+
+
+@pytest.mark.parametrize('values, percent, expected', [
+    ([], 50, 0.0),
+    ([1], 99, 1),
+    ([1, 2], 50, 1),
+    ([1, 2, 3, 4], 75, 3),
+])
+def test_percentile(values, percent, expected):
+    assert tracing.percentile(values, percent) == expected
+
+
+def test_trace_file(tmpdir):
+    path = tmpdir.join('trace.jsonl')
+    tracing.enable(path.strpath)
+    with tracing.span('files/upload', 5):
+        pass
+    tracing.disable()
+    events = [json.loads(line) for line in path.readlines()]
+    assert len(events) == 1
+    assert events[0]['name'] == 'files/upload'
+    assert events[0]['ph'] == 'X'
+    assert events[0]['args'] == {'bytes': 5, 'retries': 0, 'status': 'ok'}
@@ -71,6 +71,22 @@ def test_get_display_data_multi_w_non_existing_sort_by_field():
     ) == [[12, 17], [11, 5]]
 
 
+@pytest.mark.parametrize('size, seconds, expected_result', [
+    (0, 1, '0 B/s'),
+    (2048, 2, '1.0 KB/s'),
+    (3405000, 0, '3.25 MB/s'),
+])
+def test_convert_rate(size, seconds, expected_result):
+    assert utils.convert_rate(size, seconds) == expected_result
+
+
+def test_iter_display_data_multi():
+    data = iter([{'a': 1, 'b': 2}, {'a': 3}])
+    result = utils.iter_display_data_multi(('a', 'b'), data)
+    assert next(result) == [1, 2]
+    assert list(result) == [[3, None]]
+
+
 @pytest.mark.parametrize('example_path, expected_result', [
     ('/foo/bar', '/foo/bar'),
     ('dummy/path', '/dummy/path'),
@@ -78,3 +94,27 @@ def test_get_display_data_multi_w_non_existing_sort_by_field():
 ])
 def test_normalize_path(example_path, expected_result):
     assert utils.normalize_path(example_path) == expected_result
+
+
+def test_get_cache_path(monkeypatch, tmpdir):
+    monkeypatch.setenv('XDG_CACHE_HOME', tmpdir.strpath)
+    path = utils.get_cache_path('fake.json')
+    assert path == tmpdir.join('dropme', 'fake.json').strpath
+    assert tmpdir.join('dropme').isdir()
+
+
+def test_walk_files(tmpdir):
+    tmpdir.join('a', 'b', 'c.txt').write('c', ensure=True)
+    tmpdir.join('a', 'd.txt').write('d')
+    tmpdir.join('e').mkdir()
+    assert sorted(utils.walk_files(tmpdir.strpath)) == [
+        tmpdir.join('a', 'b', 'c.txt').strpath,
+        tmpdir.join('a', 'd.txt').strpath]
+
+
+def test_lazy_import(mocker):
+    m_import = mocker.patch('importlib.import_module')
+    module = utils.lazy_import('fake.module')
+    assert not m_import.called
+    assert module.attr is m_import.return_value.attr
+    m_import.assert_called_once_with('fake.module')
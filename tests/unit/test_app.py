@@ -0,0 +1,43 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import subprocess
+import sys
+
+import pytest
+
+from dropme import app
+
+
+def test_version(capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        app.main(['--version'])
+    assert exc_info.value.code == 0
+    out, _ = capsys.readouterr()
+    assert out.split() == [app.DropboxClient().parser.prog,
+                           app.get_version()]
+
+
+def test_commands_loaded_from_entry_points():
+    commands = dict(app.DropboxClient().command_manager)
+    assert 'whoami' in commands
+    assert commands['whoami'].load().__name__ == 'AccountOwnerInfoShow'
+
+
+def test_help_does_not_import_sdk():
+    # Runs in a new interpreter as the SDK is already imported by tests.
+    script = '\n'.join([
+        'import sys',
+        'from dropme import app',
+        'for _, ep in app.DropboxClient().command_manager:',
+        '    ep.load()',
+        'try:',
+        '    app.main(["--help"])',
+        'except SystemExit:',
+        '    pass',
+        'print(" ".join(name for name in ("dropbox", "tqdm")',
+        '               if name in sys.modules))',
+    ])
+    output = subprocess.check_output([sys.executable, '-c', script])
+    assert output.decode().splitlines()[-1] == ''
@@ -3,27 +3,164 @@
 #
 
 import os
+from unittest import mock
 
 import pytest
 import yaml
 
 from dropme import client
 from dropme import error
+from dropme.common import throttle
+from dropme.common import tracing
+
+
+def _route(name, version=1):
+    route = mock.Mock(version=version)
+    route.name = name
+    return route
+
+
+@pytest.fixture(autouse=True)
+def reset_client():
+    client.reset()
+    yield
+    client.reset()
 
 
 def test_get_client_w_token(mocker):
     token = '4145225aaFKL0dDlKY0323bcc8c37'
-    m_dropbox = mocker.patch('dropme.client.dropbox.Dropbox')
+    m_dropbox = mocker.patch('dropme.client.Client')
     client.get_client(token=token)
-    m_dropbox.assert_called_once_with(token)
+    m_dropbox.assert_called_once_with(token, throttle=client.get_throttle(),
+                                      session=client.get_session(),
+                                      metadata_ttl=None)
+
+
+def test_get_client_cached_per_token(mocker):
+    m_dropbox = mocker.patch('dropme.client.Client')
+    m_dropbox.side_effect = lambda *args, **kwargs: mocker.Mock()
+    first = client.get_client(token='token1')
+    assert client.get_client(token='token1') is first
+    assert client.get_client(token='token2') is not first
+    assert m_dropbox.call_count == 2
+    sessions = {c[1]['session'] for c in m_dropbox.call_args_list}
+    assert sessions == {client.get_session()}
+
+
+@pytest.mark.parametrize('settings, max_connections, connection', [
+    ({}, client.DEFAULT_MAX_CONNECTIONS, 'keep-alive'),
+    ({'max_connections': 32, 'keep_alive': False}, 32, 'close'),
+])
+def test_get_session_from_settings(mocker, settings, max_connections,
+                                   connection):
+    mocker.patch('dropme.client.get_settings', return_value=settings)
+    m_create = mocker.spy(client.dropbox, 'create_session')
+    session = client.get_session()
+    assert client.get_session() is session
+    m_create.assert_called_once_with(max_connections=max_connections)
+    assert session.headers.get('Connection') == connection
+
+
+def test_get_session_wo_settings(mocker):
+    mocker.patch('dropme.client.get_settings',
+                 side_effect=error.ConfigNotFoundException('not found'))
+    m_create = mocker.spy(client.dropbox, 'create_session')
+    client.get_session()
+    m_create.assert_called_once_with(
+        max_connections=client.DEFAULT_MAX_CONNECTIONS)
 
 
 def test_get_client_w_token_from_environment_variable(mocker, monkeypatch):
     token = '4145225aaFKL0dDlKY0323bcc8c37'
     monkeypatch.setitem(os.environ, 'DBX_AUTH_TOKEN', token)
-    m_dropbox = mocker.patch('dropme.client.dropbox.Dropbox')
+    m_dropbox = mocker.patch('dropme.client.Client')
     client.get_client()
-    m_dropbox.assert_called_once_with(token)
+    m_dropbox.assert_called_once_with(token, throttle=client.get_throttle(),
+                                      session=client.get_session(),
+                                      metadata_ttl=None)
+
+
+def test_get_client_shares_throttle():
+    dbx = client.get_client(token='4145225aaFKL0dDlKY0323bcc8c37')
+    assert isinstance(dbx, client.Client)
+    assert dbx.throttle is client.get_throttle()
+
+
+def test_client_requests_go_through_throttle(mocker):
+    m_request = mocker.patch('dropme.client.dropbox.Dropbox.request',
+                             return_value='result')
+    m_throttle = mocker.Mock()
+    m_throttle.call.side_effect = lambda func, *args, **kwargs: func(
+        *args, **kwargs)
+    dbx = client.Client('token', throttle=m_throttle)
+    route = _route('upload')
+    assert dbx.request(route, 'files', None, None) == 'result'
+    m_request.assert_called_once_with(route, 'files', None, None)
+    assert m_throttle.call.call_count == 1
+
+
+def test_client_requests_traced(mocker):
+    mocker.patch('dropme.client.dropbox.Dropbox.request',
+                 return_value='result')
+    dbx = client.Client('token', throttle=throttle.Throttle())
+    tracer = tracing.enable()
+    try:
+        dbx.request(_route('upload'), 'files', None, b'data')
+        dbx.request(_route('copy', version=2), 'files', None, None)
+    finally:
+        tracing.disable()
+    assert [(span.name, span.bytes, span.status)
+            for span in tracer.spans] == [('files/upload', 4, 'ok'),
+                                          ('files/copy_v2', 0, 'ok')]
+
+
+def test_client_caches_metadata(mocker):
+    m_request = mocker.patch('dropme.client.dropbox.Dropbox.request',
+                             side_effect=lambda *args: object())
+    dbx = client.Client('token', throttle=throttle.Throttle(),
+                        metadata_ttl=60)
+    first = dbx.request(_route('get_metadata'), 'files', '/a', None)
+    assert dbx.request(_route('get_metadata'), 'files', '/a', None) is first
+    assert dbx.request(_route('get_metadata'), 'files', '/b', None) \
+        is not first
+    dbx.request(_route('list_folder'), 'files', '/', None)
+    assert dbx.request(_route('get_metadata'), 'files', '/a', None) is first
+    assert m_request.call_count == 3
+
+
+def test_client_drops_metadata_on_changes(mocker):
+    m_request = mocker.patch('dropme.client.dropbox.Dropbox.request',
+                             side_effect=lambda *args: object())
+    dbx = client.Client('token', throttle=throttle.Throttle(),
+                        metadata_ttl=60)
+    first = dbx.request(_route('get_metadata'), 'files', '/a', None)
+    dbx.request(_route('delete'), 'files', '/a', None)
+    assert dbx.request(_route('get_metadata'), 'files', '/a', None) \
+        is not first
+    assert m_request.call_count == 3
+
+
+def test_client_metadata_expires(mocker):
+    m_request = mocker.patch('dropme.client.dropbox.Dropbox.request',
+                             side_effect=lambda *args: object())
+    m_time = mocker.patch('dropme.client.time.monotonic', return_value=100)
+    dbx = client.Client('token', throttle=throttle.Throttle(),
+                        metadata_ttl=5)
+    first = dbx.request(_route('get_metadata'), 'files', '/a', None)
+    m_time.return_value = 104
+    assert dbx.request(_route('get_metadata'), 'files', '/a', None) is first
+    m_time.return_value = 106
+    assert dbx.request(_route('get_metadata'), 'files', '/a', None) \
+        is not first
+    assert m_request.call_count == 2
+
+
+def test_set_metadata_ttl():
+    dbx = client.get_client(token='token1')
+    assert dbx.metadata_ttl is None
+    client.set_metadata_ttl(10)
+    assert dbx.metadata_ttl == 10
+    assert client.get_client(token='token2').metadata_ttl == 10
 
 
 def test_get_client_wo_token_fail(mocker):
@@ -0,0 +1,129 @@
+#
+#    Copyright 2017 Vitalii Kulanov
+#
+
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from dropme import daemon
+
+
+@pytest.fixture(autouse=True)
+def socket_path(monkeypatch, tmpdir):
+    monkeypatch.setitem(os.environ, 'XDG_RUNTIME_DIR', tmpdir.strpath)
+    monkeypatch.delitem(os.environ, daemon.DISABLE_ENV, raising=False)
+    return tmpdir.join('dropme.sock').strpath
+
+
+def test_get_socket_path(socket_path):
+    assert daemon.get_socket_path() == socket_path
+
+
+def test_get_socket_path_wo_runtime_dir(monkeypatch, tmpdir):
+    monkeypatch.delitem(os.environ, 'XDG_RUNTIME_DIR')
+    monkeypatch.setitem(os.environ, 'XDG_CACHE_HOME', tmpdir.strpath)
+    assert daemon.get_socket_path() == tmpdir.join('dropme',
+                                                   'dropme.sock').strpath
+    assert not tmpdir.join('dropme').exists()
+
+
+def test_call_wo_daemon():
+    assert daemon.call(['ls', '/']) is None
+
+
+@pytest.mark.parametrize('argv, forwarded', [
+    (['ls', '/'], True),
+    (['--token', 'token', 'whoami'], True),
+    ([], False),
+    (['daemon', '--stop'], False),
+    (['batch', '-'], False),
+    (['batch', 'commands.txt'], False),
+    (['sync', 'local', '/remote'], False),
+    (['watch', '/'], False),
+    (['get', '-r', '/foo'], False),
+    (['get', '/foo', '--parallel=4'], False),
+    (['put', 'foo', '-p4'], False),
+    (['put', '.', '/foo'], False),
+])
+def test_main(mocker, argv, forwarded):
+    m_call = mocker.patch('dropme.daemon.call', return_value=3)
+    m_main = mocker.patch('dropme.app.main')
+    exit_code = daemon.main(argv)
+    if forwarded:
+        m_call.assert_called_once_with(argv)
+        assert exit_code == 3
+        assert not m_main.called
+    else:
+        assert not m_call.called
+        m_main.assert_called_once_with(argv)
+
+
+def test_main_falls_back_wo_daemon(mocker):
+    mocker.patch('dropme.daemon.call', return_value=None)
+    m_main = mocker.patch('dropme.app.main', return_value=0)
+    assert daemon.main(['ls', '/']) == 0
+    m_main.assert_called_once_with(['ls', '/'])
+
+
+def test_main_does_not_create_cache_dir(mocker, monkeypatch, tmpdir):
+    monkeypatch.delitem(os.environ, 'XDG_RUNTIME_DIR')
+    monkeypatch.setitem(os.environ, 'XDG_CACHE_HOME',
+                        tmpdir.join('cache').strpath)
+    mocker.patch('dropme.app.main', return_value=0)
+    assert daemon.main(['--help']) == 0
+    assert not tmpdir.join('cache').exists()
+
+
+def test_main_w_daemon_disabled(mocker, monkeypatch):
+    monkeypatch.setitem(os.environ, daemon.DISABLE_ENV, '1')
+    m_call = mocker.patch('dropme.daemon.call')
+    mocker.patch('dropme.app.main', return_value=0)
+    assert daemon.main(['ls', '/']) == 0
+    assert not m_call.called
+
+
+@pytest.fixture
+def listener(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(socket_path)
+    sock.listen(1)
+    yield sock
+    sock.close()
+
+
+def test_call(listener, mocker):
+    def serve():
+        conn, _ = listener.accept()
+        with conn, conn.makefile('rb') as request:
+            assert json.loads(request.readline().decode())['argv'] == ['ls']
+            for message in ({'started': True}, {'stdout': 'foo\n'},
+                            {'stderr': 'bar\n'}, {'exit': 2}):
+                conn.sendall(json.dumps(message).encode() + b'\n')
+
+    server = threading.Thread(target=serve)
+    server.start()
+    stdout, stderr = mocker.Mock(), mocker.Mock()
+    assert daemon.call(['ls'], stdout=stdout, stderr=stderr) == 2
+    server.join()
+    stdout.write.assert_called_once_with('foo\n')
+    stderr.write.assert_called_once_with('bar\n')
+
+
+def test_call_w_busy_daemon(listener):
+    # The daemon never accepts the connection, e.g. as it runs a command.
+    started = time.monotonic()
+    assert daemon.call(['ls', '/'], timeout=0.2) is None
+    assert time.monotonic() - started < 5
+
+
+def test_interrupt_on_disconnect():
+    sock, peer = socket.socketpair()
+    with sock, pytest.raises(KeyboardInterrupt):
+        with daemon._interrupt_on_disconnect(sock):
+            peer.close()
+            time.sleep(5)